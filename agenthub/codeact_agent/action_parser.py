@@ -20,6 +20,12 @@ class CodeActResponseParser(ResponseParser):
     - AgentFinishAction() - end the interaction
     """
 
+    stop_sequences = [
+        '</execute_bash>',
+        '</execute_ipython>',
+        '</execute_browse>',
+    ]
+
     def __init__(self):
         # Need pay attention to the item order in self.action_parsers
         super().__init__()
@@ -36,11 +42,17 @@ class CodeActResponseParser(ResponseParser):
         return self.parse_action(action_str)
 
     def parse_response(self, response) -> str:
-        action = response.choices[0].message.content
+        # a streamed response is already the accumulated text
+        action: str | None
+        if isinstance(response, str):
+            action = response
+        else:
+            action = response.choices[0].message.content
         if action is None:
             return ''
         for lang in ['bash', 'ipython', 'browse']:
-            if f'<execute_{lang}>' in action and f'</execute_{lang}>' not in action:
+            # the opening tag may have attributes, e.g. <execute_bash background>
+            if f'<execute_{lang}' in action and f'</execute_{lang}>' not in action:
                 action += f'</execute_{lang}>'
         return action
 
@@ -75,7 +87,7 @@ class CodeActActionParserFinish(ActionParser):
 
 class CodeActActionParserCmdRun(ActionParser):
     """Parser action:
-    - CmdRunAction(command) - bash command to run
+    - CmdRunAction(command) - bash command to run, in the background with <execute_bash background>
     - AgentFinishAction() - end the interaction
     """
 
@@ -86,7 +98,7 @@ class CodeActActionParserCmdRun(ActionParser):
 
     def check_condition(self, action_str: str) -> bool:
         self.bash_command = re.search(
-            r'<execute_bash>(.*?)</execute_bash>', action_str, re.DOTALL
+            r'<execute_bash( background)?>(.*?)</execute_bash>', action_str, re.DOTALL
         )
         return self.bash_command is not None
 
@@ -96,10 +108,14 @@ class CodeActActionParserCmdRun(ActionParser):
         ), 'self.bash_command should not be None when parse is called'
         thought = action_str.replace(self.bash_command.group(0), '').strip()
         # a command was found
-        command_group = self.bash_command.group(1).strip()
+        command_group = self.bash_command.group(2).strip()
         if command_group.strip() == 'exit':
             return AgentFinishAction(thought=thought)
-        return CmdRunAction(command=command_group, thought=thought)
+        return CmdRunAction(
+            command=command_group,
+            thought=thought,
+            background=self.bash_command.group(1) is not None,
+        )
 
 
 class CodeActActionParserIPythonRunCell(ActionParser):
@@ -21,6 +21,7 @@ Important, however: do not run interactive commands. You do not have access to s
 Also, you need to handle commands that may run indefinitely and not return a result. For such cases, you should redirect the output to a file and run the command in the background to avoid blocking the execution.
 For example, to run a Python script that might run indefinitely without returning immediately, you can use the following format: <execute_bash> python3 app.py > server.log 2>&1 & </execute_bash>
 Also, if a command execution result saying like: Command: "npm start" timed out. Sending SIGINT to the process, you should also retry with running the command in the background.
+A command that only reads or builds, like a test run or a search, can run in a separate shell next to the other commands: <execute_bash background> pytest tests/ </execute_bash>. That shell does not keep the changes a command makes to the working directory or the environment.
 """
 
 BROWSING_PREFIX = """The assistant can browse the Internet with <execute_browse> and </execute_browse>.
@@ -14,6 +14,7 @@ from opendevin.events.action import (
     IPythonRunCellAction,
     MessageAction,
 )
+from opendevin.events.event import Event
 from opendevin.events.observation import (
     CmdOutputObservation,
     IPythonRunCellObservation,
@@ -21,6 +22,7 @@ from opendevin.events.observation import (
 from opendevin.events.observation.observation import Observation
 from opendevin.events.serialization.event import truncate_content
 from opendevin.llm.llm import LLM
+from opendevin.memory.message_builder import REMINDER_TOKENS, IncrementalMessageBuilder
 from opendevin.runtime.plugins import (
     AgentSkillsRequirement,
     JupyterRequirement,
@@ -71,6 +73,10 @@ class CodeActSWEAgent(Agent):
         - llm (LLM): The llm to be used by this agent
         """
         super().__init__(llm)
+        self.message_builder = IncrementalMessageBuilder(
+            self.get_message,
+            token_counter=lambda message: self.llm.get_token_count([message]),
+        )
         self.reset()
 
     def action_to_str(self, action: Action) -> str:
@@ -123,6 +129,7 @@ class CodeActSWEAgent(Agent):
     def reset(self) -> None:
         """Resets the CodeAct Agent."""
         super().reset()
+        self.message_builder.reset()
 
     def step(self, state: State) -> Action:
         """Performs one step using the CodeAct Agent.
@@ -137,60 +144,87 @@ class CodeActSWEAgent(Agent):
         - MessageAction(content) - Message action to run (e.g. ask for clarification)
         - AgentFinishAction() - end the interaction
         """
+        completion_args = self._get_completion_args(state)
+        if completion_args is None:
+            return AgentFinishAction()
+        response = self.llm.completion(**completion_args)
+        return self.response_parser.parse(response)
+
+    async def astep(self, state: State) -> Action:
+        """Performs one step like `step`, streaming the LLM response if enabled.
+
+        With streaming, the response is parsed as it arrives, and the request ends as soon
+        as the action is complete, without relying on the provider to honor the stop words.
+        """
+        if not self.llm.config.streaming:
+            return await super().astep(state)
+
+        completion_args = self._get_completion_args(state)
+        if completion_args is None:
+            return AgentFinishAction()
+        return await self.response_parser.parse_stream(
+            self.llm.async_streaming_completion(stream=True, **completion_args)
+        )
+
+    def _get_completion_args(self, state: State) -> dict | None:
+        """Returns the arguments of the LLM completion for the next step, or None if the user asked to exit."""
         # if we're done, go back
         latest_user_message = state.history.get_last_user_message()
         if latest_user_message and latest_user_message.strip() == '/exit':
-            return AgentFinishAction()
+            return None
 
         # prepare what we want to send to the LLM
         messages: list[dict[str, str]] = self._get_messages(state)
+        return {
+            'messages': messages,
+            'stop': list(self.response_parser.stop_sequences),
+            'temperature': 0.0,
+        }
+
+    def get_message(self, event: Event) -> dict[str, str] | None:
+        """Convert a history event into a message for the LLM, or None to skip it."""
+        if isinstance(event, Action):
+            return self.get_action_message(event)
+        elif isinstance(event, Observation):
+            return self.get_observation_message(event)
+        raise ValueError(f'Unknown event type: {type(event)}')
 
-        response = self.llm.completion(
-            messages=messages,
-            stop=[
-                '</execute_ipython>',
-                '</execute_bash>',
+    def _get_messages(self, state: State) -> list[dict[str, str]]:
+        # the history is trimmed only to the input limit of a known model, not to the
+        # fallback for unknown ones, leaving room for the reminder added below
+        input_token_limit = self.llm.input_token_limit
+        # only the events added since the previous step are converted
+        messages = self.message_builder.build(
+            state.history,
+            prefix=[
+                {'role': 'system', 'content': self.system_message},
+                {'role': 'user', 'content': self.in_context_example},
             ],
-            temperature=0.0,
+            extra_key=(self.llm.config.max_message_chars,),
+            max_tokens=(
+                input_token_limit - REMINDER_TOKENS
+                if input_token_limit is not None
+                else None
+            ),
         )
 
-        return self.response_parser.parse(response)
-
-    def _get_messages(self, state: State) -> list[dict[str, str]]:
-        messages = [
-            {'role': 'system', 'content': self.system_message},
-            {'role': 'user', 'content': self.in_context_example},
-        ]
-
-        for event in state.history.get_events():
-            # create a regular message from an event
-            if isinstance(event, Action):
-                message = self.get_action_message(event)
-            elif isinstance(event, Observation):
-                message = self.get_observation_message(event)
-            else:
-                raise ValueError(f'Unknown event type: {type(event)}')
-
-            # add regular message
-            if message:
-                # handle error if the message is the SAME role as the previous message
-                # litellm.exceptions.BadRequestError: litellm.BadRequestError: OpenAIException - Error code: 400 - {'detail': 'Only supports u/a/u/a/u...'}
-                # there should not have two consecutive messages from the same role
-                if messages and messages[-1]['role'] == message['role']:
-                    messages[-1]['content'] += '\n\n' + message['content']
-                else:
-                    messages.append(message)
-
         # the latest user message is important:
         # we want to remind the agent of the environment constraints
-        latest_user_message = next(
-            (m for m in reversed(messages) if m['role'] == 'user'), None
+        latest_user_index = next(
+            (
+                i
+                for i in range(len(messages) - 1, -1, -1)
+                if messages[i]['role'] == 'user'
+            ),
+            None,
         )
 
-        # add a reminder to the prompt
-        if latest_user_message:
+        # add a reminder to the prompt (on a copy, the builder keeps the original)
+        if latest_user_index is not None:
+            latest_user_message = dict(messages[latest_user_index])
             latest_user_message['content'] += (
                 f'\n\nENVIRONMENT REMINDER: You have {state.max_iterations - state.iteration} turns left to complete the task.'
             )
+            messages[latest_user_index] = latest_user_message
 
         return messages
@@ -16,6 +16,11 @@ class CodeActSWEResponseParser(ResponseParser):
     - AgentFinishAction() - end the interaction
     """
 
+    stop_sequences = [
+        '</execute_bash>',
+        '</execute_ipython>',
+    ]
+
     def __init__(self):
         # Need pay attention to the item order in self.action_parsers
         super().__init__()
@@ -31,7 +36,12 @@ class CodeActSWEResponseParser(ResponseParser):
         return self.parse_action(action_str)
 
     def parse_response(self, response) -> str:
-        action = response.choices[0].message.content
+        # a streamed response is already the accumulated text
+        action: str | None
+        if isinstance(response, str):
+            action = response
+        else:
+            action = response.choices[0].message.content
         if action is None:
             return ''
         for lang in ['bash', 'ipython']:
@@ -13,7 +13,7 @@ function Browser(): JSX.Element {
   );
 
   const imgSrc =
-    screenshotSrc && screenshotSrc.startsWith("data:image/png;base64,")
+    screenshotSrc && screenshotSrc.startsWith("data:image/")
       ? screenshotSrc
       : `data:image/png;base64,${screenshotSrc || ""}`;
 
@@ -87,7 +87,6 @@ class Session {
       let data = null;
       try {
         data = JSON.parse(e.data);
-        Session._history.push(data);
       } catch (err) {
         // TODO: report the error
         toast.error(
@@ -96,16 +95,15 @@ class Session {
         );
         return;
       }
-      if (data.error && data.error_code === 401) {
-        Session._latest_event_id = -1;
-        clearToken();
-      } else if (data.token) {
-        setToken(data.token);
+      if (data.replay) {
+        // events missed while disconnected, in frames
+        data.replay.events.forEach(Session._handleMessage);
+        Session._latest_event_id = Math.max(
+          Session._latest_event_id,
+          data.replay.cursor - 1,
+        );
       } else {
-        if (data.id !== undefined) {
-          Session._latest_event_id = data.id;
-        }
-        handleAssistantMessage(data);
+        Session._handleMessage(data);
       }
     };
 
@@ -126,6 +124,22 @@ class Session {
     };
   }
 
+  /* eslint-disable-next-line @typescript-eslint/no-explicit-any */
+  private static _handleMessage(data: any): void {
+    Session._history.push(data);
+    if (data.error && data.error_code === 401) {
+      Session._latest_event_id = -1;
+      clearToken();
+    } else if (data.token) {
+      setToken(data.token);
+    } else {
+      if (data.id !== undefined) {
+        Session._latest_event_id = data.id;
+      }
+      handleAssistantMessage(data);
+    }
+  }
+
   static isConnected(): boolean {
     return (
       Session._socket !== null && Session._socket.readyState === WebSocket.OPEN
@@ -2,6 +2,9 @@ enum ActionType {
   // Initializes the agent. Only sent by client.
   INIT = "initialize",
 
+  // Replays events of the session. Only sent by client.
+  REPLAY = "replay",
+
   // Represents a message from the user or agent.
   MESSAGE = "message",
 
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from contextlib import aclosing
+from typing import AsyncGenerator
 
 from opendevin.events.action import Action
 
@@ -8,6 +10,9 @@ class ResponseParser(ABC):
     parsing the action from the response from the LLM.
     """
 
+    # strings that complete an action, e.g. closing tags; nothing after them is needed
+    stop_sequences: list[str] = []
+
     def __init__(
         self,
     ):
@@ -50,6 +55,52 @@ class ResponseParser(ABC):
         """
         pass
 
+    def find_action_end(self, text: str, start: int = 0) -> int:
+        """Finds where the action in a (partial) response ends.
+
+        Parameters:
+        - text (str): The response text received so far.
+        - start (int): The position to start searching from.
+
+        Returns:
+        - end (int): The position right after the first stop sequence, or -1 if none was received yet.
+        """
+        ends = [
+            index + len(stop)
+            for stop in self.stop_sequences
+            if (index := text.find(stop, start)) != -1
+        ]
+        return min(ends, default=-1)
+
+    async def parse_stream(self, chunks: AsyncGenerator) -> Action:
+        """Parses the action from a streamed response from the LLM.
+
+        The chunks are consumed as they arrive, and reading stops as soon as a stop
+        sequence is received: the stream is closed then, which ends the request, and the
+        rest of the response is not waited for.
+
+        Parameters:
+        - chunks (AsyncGenerator): The streamed completion chunks from the LLM.
+
+        Returns:
+        - action (Action): The action parsed from the response.
+        """
+        overlap = max((len(stop) for stop in self.stop_sequences), default=0)
+        text = ''
+        async with aclosing(chunks):
+            async for chunk in chunks:
+                delta = chunk['choices'][0]['delta'].get('content')
+                if not delta:
+                    continue
+                # a stop sequence may be split across chunks, so look back a little
+                start = max(0, len(text) - overlap + 1)
+                text += delta
+                end = self.find_action_end(text, start)
+                if end != -1:
+                    text = text[:end]
+                    break
+        return self.parse(text)
+
 
 class ActionParser(ABC):
     """This abstract base class is a general interface for an action parser dedicated to
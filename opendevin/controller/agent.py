@@ -49,6 +49,15 @@ class Agent(ABC):
         """
         pass
 
+    async def astep(self, state: 'State') -> 'Action':
+        """Async version of `step`, used by the controller.
+
+        By default, `step` runs in the event loop: the history and the event stream it
+        reads are not safe to read while other tasks add events. Subclasses can override
+        this to await the LLM instead of blocking on it, e.g. to stream the response.
+        """
+        return self.step(state)
+
     def reset(self) -> None:
         """Resets the agent's execution status and clears the history. This method can be used
         to prepare the agent for restarting the instruction or cleaning up before destruction.
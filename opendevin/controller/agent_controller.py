@@ -1,8 +1,10 @@
 import asyncio
+import time
 import traceback
 from typing import Optional, Type
 
 from opendevin.controller.agent import Agent
+from opendevin.controller.state.checkpoint import StateCheckpointer
 from opendevin.controller.state.state import State, TrafficControlState
 from opendevin.controller.stuck import StuckDetector
 from opendevin.core.config import LLMConfig
@@ -12,6 +14,7 @@ from opendevin.core.exceptions import (
     LLMResponseError,
 )
 from opendevin.core.logger import opendevin_logger as logger
+from opendevin.core.metrics import LatencyHistogram
 from opendevin.core.schema import AgentState
 from opendevin.events import EventSource, EventStream, EventStreamSubscriber
 from opendevin.events.action import (
@@ -43,6 +46,9 @@ TRAFFIC_CONTROL_REMINDER = (
     "Please click on resume button if you'd like to continue, or start a new task."
 )
 
+# the step loop waits for a wakeup, but re-checks at least this often (in seconds)
+STEP_LOOP_MAX_WAIT = 1.0
+
 
 class AgentController:
     id: str
@@ -56,6 +62,10 @@ class AgentController:
     parent: 'AgentController | None' = None
     delegate: 'AgentController | None' = None
     _pending_action: Action | None = None
+    # when the pending action's observation arrived, for the step turnaround latency
+    _pending_action_done_at: float | None = None
+    # the last action of the agent, until on_event has handled it (it may change the state)
+    _unhandled_action_id: int | None = None
 
     def __init__(
         self,
@@ -69,6 +79,7 @@ class AgentController:
         initial_state: State | None = None,
         is_delegate: bool = False,
         headless_mode: bool = True,
+        checkpointer: StateCheckpointer | None = None,
     ):
         """Initializes a new instance of the AgentController class.
 
@@ -83,11 +94,17 @@ class AgentController:
             initial_state: The initial state of the controller.
             is_delegate: Whether this controller is a delegate.
             headless_mode: Whether the agent is run in headless mode.
+            checkpointer: Saves the state after every step and change of the agent state, if given.
         """
         self._step_lock = asyncio.Lock()
+        # set whenever something happens that may let the agent take its next step
+        self._wakeup = asyncio.Event()
+        # time from an observation to the agent's next step
+        self.step_latency = LatencyHistogram()
         self.id = sid
         self.agent = agent
         self.headless_mode = headless_mode
+        self.checkpointer = checkpointer
 
         # subscribe to the event stream
         self.event_stream = event_stream
@@ -113,6 +130,10 @@ class AgentController:
     async def close(self):
         if self.agent_task is not None:
             self.agent_task.cancel()
+        if self.step_latency.count:
+            logger.info(
+                f'[Agent Controller {self.id}] Step turnaround: {self.step_latency}'
+            )
         await self.set_agent_state_to(AgentState.STOPPED)
         self.event_stream.unsubscribe(EventStreamSubscriber.AGENT_CONTROLLER)
 
@@ -136,11 +157,51 @@ class AgentController:
             self.state.last_error += f': {exception}'
         self.event_stream.add_event(ErrorObservation(message), EventSource.AGENT)
 
+    async def _checkpoint(self):
+        """Saves what changed in the state since the last checkpoint."""
+        if self.checkpointer is None:
+            return
+        try:
+            await self.checkpointer.asave(self.state)
+        except Exception as e:
+            logger.error(
+                f'[Agent Controller {self.id}] Failed to checkpoint state: {e}'
+            )
+
+    def _notify_step(self):
+        """Wakes up the step loop, which drives the delegates too."""
+        self._wakeup.set()
+        if self.parent is not None:
+            self.parent._notify_step()
+
+    def _can_step(self) -> bool:
+        """Whether the next call to _step has something to do."""
+        if self.get_agent_state() != AgentState.RUNNING:
+            return False
+        if self._unhandled_action_id is not None:
+            return False
+        if self.delegate is not None:
+            return self.delegate._can_step() or self.delegate.get_agent_state() in (
+                AgentState.ERROR,
+                AgentState.FINISHED,
+                AgentState.REJECTED,
+            )
+        return self._pending_action is None
+
     async def _start_step_loop(self):
         logger.info(f'[Agent Controller {self.id}] Starting step loop...')
         while True:
             try:
+                # anything that happens from here on wakes up the wait below
+                self._wakeup.clear()
                 await self._step()
+                if not self._can_step():
+                    try:
+                        await asyncio.wait_for(
+                            self._wakeup.wait(), timeout=STEP_LOOP_MAX_WAIT
+                        )
+                    except asyncio.TimeoutError:
+                        pass
             except asyncio.CancelledError:
                 logger.info('AgentController task was cancelled')
                 break
@@ -154,9 +215,15 @@ class AgentController:
                 await self.set_agent_state_to(AgentState.ERROR)
                 break
 
-            await asyncio.sleep(0.1)
-
     async def on_event(self, event: Event):
+        try:
+            await self._handle_event(event)
+        finally:
+            if event.id == self._unhandled_action_id:
+                self._unhandled_action_id = None
+            self._notify_step()
+
+    async def _handle_event(self, event: Event):
         if isinstance(event, ChangeAgentStateAction):
             await self.set_agent_state_to(event.agent_state)  # type: ignore
         elif isinstance(event, MessageAction):
@@ -170,6 +237,7 @@ class AgentController:
             elif event.source == EventSource.AGENT and event.wait_for_response:
                 await self.set_agent_state_to(AgentState.AWAITING_USER_INPUT)
         elif isinstance(event, AgentDelegateAction):
+            self.state.history.on_event(event)
             await self.start_delegate(event)
         elif isinstance(event, AddTaskAction):
             self.state.root_task.add_subtask(event.parent, event.goal, event.subtasks)
@@ -193,6 +261,7 @@ class AgentController:
                 return
             if self._pending_action and self._pending_action.id == event.cause:
                 self._pending_action = None
+                self._pending_action_done_at = time.monotonic()
                 if self.state.agent_state == AgentState.USER_CONFIRMED:
                     await self.set_agent_state_to(AgentState.RUNNING)
                 if self.state.agent_state == AgentState.USER_REJECTED:
@@ -227,6 +296,7 @@ class AgentController:
             self.state.traffic_control_state = TrafficControlState.PAUSED
 
         self.state.agent_state = new_state
+        self._notify_step()
         if new_state == AgentState.STOPPED or new_state == AgentState.ERROR:
             self.reset_task()
 
@@ -246,6 +316,10 @@ class AgentController:
             AgentStateChangedObservation('', self.state.agent_state), EventSource.AGENT
         )
 
+        # a stopped session is resumed from the state it was in before
+        if new_state != AgentState.STOPPED:
+            await self._checkpoint()
+
         if new_state == AgentState.INIT and self.state.resume_state:
             await self.set_agent_state_to(self.state.resume_state)
             self.state.resume_state = None
@@ -281,18 +355,17 @@ class AgentController:
             initial_state=state,
             is_delegate=True,
         )
+        self.delegate.parent = self
         await self.delegate.set_agent_state_to(AgentState.RUNNING)
 
     async def _step(self) -> None:
         if self.get_agent_state() != AgentState.RUNNING:
-            await asyncio.sleep(1)
             return
 
         if self._pending_action:
             logger.debug(
                 f'[Agent Controller {self.id}] waiting for pending action: {self._pending_action}'
             )
-            await asyncio.sleep(1)
             return
 
         if self.delegate is not None:
@@ -394,10 +467,14 @@ class AgentController:
                         await self.set_agent_state_to(AgentState.PAUSED)
                     return
 
+        if self._pending_action_done_at is not None:
+            self.step_latency.observe(time.monotonic() - self._pending_action_done_at)
+            self._pending_action_done_at = None
+
         self.update_state_before_step()
         action: Action = NullAction()
         try:
-            action = self.agent.step(self.state)
+            action = await self.agent.astep(self.state)
             if action is None:
                 raise LLMNoActionError('No action was returned')
         except (LLMMalformedActionError, LLMNoActionError, LLMResponseError) as e:
@@ -421,6 +498,7 @@ class AgentController:
             ):
                 await self.set_agent_state_to(AgentState.AWAITING_USER_CONFIRMATION)
             self.event_stream.add_event(action, EventSource.AGENT)
+            self._unhandled_action_id = action.id
 
         await self.update_state_after_step()
         logger.info(action, extra={'msg_type': 'ACTION'})
@@ -428,6 +506,8 @@ class AgentController:
         if self._is_stuck():
             await self.report_error('Agent got stuck in a loop')
             await self.set_agent_state_to(AgentState.ERROR)
+        else:
+            await self._checkpoint()
 
     def get_state(self):
         return self.state
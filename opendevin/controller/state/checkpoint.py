@@ -0,0 +1,361 @@
+"""Checkpoints of the State of a session.
+
+A checkpoint is a versioned JSON document of the fields of the State, at
+sessions/{sid}/state/checkpoint.json. While the agent runs, the fields that changed since
+the last save are appended to sessions/{sid}/state/deltas.jsonl, one line per save,
+with the id of the latest event the state has seen (its watermark). The costs of the
+metrics, which only grow, are saved as the costs added since the last save. So a save
+costs about the size of what changed, however long the session is.
+
+In stores that don't append natively (S3, memory), where an append rewrites the whole
+file, each delta is a file of its own in sessions/{sid}/state/deltas/ instead.
+
+While the agent runs, the state is saved with `asave`, which writes in a worker thread.
+
+Every `delta_limit` deltas, the checkpoint is written again and the deltas are dropped.
+Each checkpoint has a new generation, and only the deltas of its generation are applied
+to it, so a crash between writing a checkpoint and dropping the deltas is harmless, as is
+a partial delta at the end of the file.
+"""
+
+import asyncio
+import functools
+import json
+import uuid
+import weakref
+from dataclasses import dataclass
+from typing import Callable
+
+from opendevin.controller.state.state import State, TrafficControlState
+from opendevin.controller.state.task import RootTask, Task
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.core.metrics import Metrics
+from opendevin.core.schema import AgentState
+from opendevin.storage.files import FileStore
+
+FORMAT_VERSION = 1
+DELTA_LIMIT = 100
+
+# the fields saved as they are
+_PLAIN_FIELDS = (
+    'iteration',
+    'local_iteration',
+    'max_iterations',
+    'confirmation_mode',
+    'inputs',
+    'outputs',
+    'last_error',
+    'delegate_level',
+    'almost_stuck',
+)
+_METRICS_FIELDS = ('metrics', 'local_metrics')
+
+
+def _encode_task(task: Task) -> dict:
+    return {
+        'goal': task.goal,
+        'state': task.state,
+        'subtasks': [_encode_task(subtask) for subtask in task.subtasks],
+    }
+
+
+def _decode_subtasks(parent: Task, subtasks: list[dict]) -> None:
+    for data in subtasks:
+        # the id of a task is its position in its parent
+        task = Task(parent, data['goal'])
+        parent.subtasks.append(task)
+        task.state = data['state']
+        _decode_subtasks(task, data['subtasks'])
+
+
+def _encode_metrics(metrics: Metrics) -> dict:
+    return {
+        'accumulated_cost': metrics.accumulated_cost,
+        'costs': metrics.costs,
+        'cache_hits': metrics.cache_hits,
+        'cached_cost': metrics.cached_cost,
+    }
+
+
+def _decode_metrics(data: dict) -> Metrics:
+    metrics = Metrics()
+    metrics._accumulated_cost = data['accumulated_cost']
+    metrics._costs = list(data['costs'])
+    metrics._cache_hits = data['cache_hits']
+    metrics._cached_cost = data['cached_cost']
+    return metrics
+
+
+def _to_json(name: str, value):
+    """Returns the value, or a copy of it where what isn't JSON is replaced by its repr."""
+    try:
+        json.dumps(value, sort_keys=True)
+        return value
+    except (TypeError, ValueError):
+        logger.warning(
+            f'The state field {name} is not JSON: saving its other values as strings'
+        )
+        # the keys become strings, too
+        return json.loads(json.dumps(value, default=repr))
+
+
+def encode_state(state: State) -> dict:
+    """Returns the fields of the state, as JSON values. The history is saved as its range of events.
+
+    Values that aren't JSON (e.g. in the inputs and outputs) are saved as their repr.
+    """
+    fields = {name: _to_json(name, getattr(state, name)) for name in _PLAIN_FIELDS}
+    fields['root_task'] = _encode_task(state.root_task)
+    fields['agent_state'] = state.agent_state.value
+    fields['resume_state'] = (
+        state.resume_state.value if state.resume_state is not None else None
+    )
+    fields['traffic_control_state'] = state.traffic_control_state.value
+    for name in _METRICS_FIELDS:
+        fields[name] = _encode_metrics(getattr(state, name))
+    fields['start_id'] = state.history.start_id
+    fields['end_id'] = state.history.end_id
+    return fields
+
+
+def decode_state(fields: dict) -> State:
+    state = State(**{name: fields[name] for name in _PLAIN_FIELDS})
+    state.root_task = RootTask()
+    state.root_task.state = fields['root_task']['state']
+    _decode_subtasks(state.root_task, fields['root_task']['subtasks'])
+    state.agent_state = AgentState(fields['agent_state'])
+    if fields['resume_state'] is not None:
+        state.resume_state = AgentState(fields['resume_state'])
+    state.traffic_control_state = TrafficControlState(fields['traffic_control_state'])
+    for name in _METRICS_FIELDS:
+        setattr(state, name, _decode_metrics(fields[name]))
+    state.start_id = state.history.start_id = fields['start_id']
+    state.end_id = state.history.end_id = fields['end_id']
+    return state
+
+
+@dataclass
+class _Save:
+    """The writes of a save, and what the checkpointer has saved once they are done."""
+
+    writes: list[Callable[[], None]]
+    full: bool
+    generation: str
+    saved: dict[str, str]
+    saved_costs: dict[str, tuple[int, float | None]]
+    watermark: int
+
+
+# the saves of a session are written one at a time, in order; a lock is dropped once no
+# save holds or waits for it
+_session_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _session_lock(sid: str) -> asyncio.Lock:
+    lock = _session_locks.get(sid)
+    if lock is None:
+        lock = asyncio.Lock()
+        _session_locks[sid] = lock
+    return lock
+
+
+class StateCheckpointer:
+    """Saves the State of a session as a checkpoint, followed by deltas.
+
+    An instance keeps what it saved last, to write only what changed since: a session
+    should have one checkpointer at a time.
+    """
+
+    def __init__(self, sid: str, file_store: FileStore, delta_limit: int = DELTA_LIMIT):
+        self.sid = sid
+        self.file_store = file_store
+        self.delta_limit = delta_limit
+        self._generation: str | None = None
+        self._deltas = 0
+        # what was saved last: the JSON of each field (without the costs), the number of
+        # costs and the last cost of each metrics, and the watermark
+        self._saved: dict[str, str] = {}
+        self._saved_costs: dict[str, tuple[int, float | None]] = {}
+        self._watermark = -1
+        self.full_saves = 0
+        self.delta_saves = 0
+
+    @property
+    def checkpoint_path(self) -> str:
+        return f'sessions/{self.sid}/state/checkpoint.json'
+
+    @property
+    def deltas_path(self) -> str:
+        return f'sessions/{self.sid}/state/deltas.jsonl'
+
+    @property
+    def deltas_dir(self) -> str:
+        return f'sessions/{self.sid}/state/deltas/'
+
+    @staticmethod
+    def exists(sid: str, file_store: FileStore) -> bool:
+        try:
+            file_store.read(f'sessions/{sid}/state/checkpoint.json')
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _costs_were_replaced(self, name: str, costs: list[float]) -> bool:
+        count, last = self._saved_costs[name]
+        return len(costs) < count or (count > 0 and costs[count - 1] != last)
+
+    def save(self, state: State, full: bool = False) -> None:
+        """Saves the fields of the state that changed since the last save.
+
+        The state is saved in full the first time, every delta_limit saves, if full is
+        set, or if costs were removed from its metrics.
+        """
+        save = self._prepare(state, full)
+        if save is not None:
+            self._apply(save)
+
+    async def asave(self, state: State, full: bool = False) -> None:
+        """Like save, but the file store is written in a worker thread, so that the event
+        loop keeps running. The state is read in the loop.
+        """
+        async with _session_lock(self.sid):
+            save = self._prepare(state, full)
+            if save is not None:
+                await asyncio.to_thread(self._apply, save)
+
+    def _prepare(self, state: State, full: bool) -> _Save | None:
+        """Returns the writes saving what changed in the state, or None if nothing did."""
+        fields = encode_state(state)
+        # the id of the latest event the state has seen
+        watermark = state.history.get_latest_event_id()
+        costs = {name: fields[name].pop('costs') for name in _METRICS_FIELDS}
+        encoded = {
+            name: json.dumps(value, sort_keys=True) for name, value in fields.items()
+        }
+        saved_costs = {
+            name: (len(costs[name]), costs[name][-1] if costs[name] else None)
+            for name in costs
+        }
+
+        if (
+            full
+            or self._generation is None
+            or self._deltas >= self.delta_limit
+            or any(self._costs_were_replaced(name, costs[name]) for name in costs)
+        ):
+            for name in _METRICS_FIELDS:
+                fields[name]['costs'] = costs[name]
+            generation = uuid.uuid4().hex
+            checkpoint = {
+                'version': FORMAT_VERSION,
+                'generation': generation,
+                'watermark': watermark,
+                'state': fields,
+            }
+            writes: list[Callable[[], None]] = [
+                functools.partial(
+                    self.file_store.write, self.checkpoint_path, json.dumps(checkpoint)
+                )
+            ]
+            # the deltas of the previous generation are ignored, if this fails; they
+            # are dropped if there may be some, from this checkpointer or an earlier one
+            if self._deltas > 0 or self.full_saves == 0:
+                writes.append(
+                    functools.partial(self.file_store.delete, self.deltas_path)
+                )
+                writes.append(
+                    functools.partial(self.file_store.delete, self.deltas_dir)
+                )
+            return _Save(writes, True, generation, encoded, saved_costs, watermark)
+
+        changes = {
+            name: fields[name]
+            for name in fields
+            if encoded[name] != self._saved.get(name)
+        }
+        new_costs = {
+            name: costs[name][self._saved_costs[name][0] :]
+            for name in costs
+            if len(costs[name]) > self._saved_costs[name][0]
+        }
+        if not changes and not new_costs and watermark == self._watermark:
+            return None
+        delta = json.dumps(
+            {
+                'generation': self._generation,
+                'watermark': watermark,
+                'changes': changes,
+                'costs': new_costs,
+            }
+        )
+        if self.file_store.supports_append:
+            write = functools.partial(
+                self.file_store.append, self.deltas_path, delta + '\n'
+            )
+        else:
+            # an append would read and rewrite the whole deltas file (e.g. on S3): each
+            # delta is a file of its own instead
+            write = functools.partial(
+                self.file_store.write,
+                f'{self.deltas_dir}{self._deltas:06d}.json',
+                delta,
+            )
+        return _Save([write], False, self._generation, encoded, saved_costs, watermark)
+
+    def _apply(self, save: _Save) -> None:
+        for write in save.writes:
+            write()
+        if save.full:
+            self._deltas = 0
+            self.full_saves += 1
+        else:
+            self._deltas += 1
+            self.delta_saves += 1
+        self._generation = save.generation
+        self._saved = save.saved
+        self._saved_costs = save.saved_costs
+        self._watermark = save.watermark
+
+    def load(self) -> tuple[State, int]:
+        """Returns the saved state, and its watermark.
+
+        Raises FileNotFoundError if the session has no checkpoint.
+        """
+        checkpoint = json.loads(self.file_store.read(self.checkpoint_path))
+        if checkpoint.get('version') != FORMAT_VERSION:
+            raise ValueError(
+                f'Unsupported state checkpoint version for session {self.sid}: {checkpoint.get("version")}'
+            )
+        fields = checkpoint['state']
+        watermark = checkpoint['watermark']
+        try:
+            deltas = self.file_store.read(self.deltas_path).split('\n')
+        except FileNotFoundError:
+            deltas = []
+        try:
+            delta_files = sorted(self.file_store.list(self.deltas_dir))
+        except FileNotFoundError:
+            delta_files = []
+        deltas.extend(self.file_store.read_many(delta_files).values())
+        for line in deltas:
+            if not line:
+                continue
+            try:
+                delta = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(
+                    f'Dropping partial state delta at the end of {self.deltas_path}'
+                )
+                break
+            if delta['generation'] != checkpoint['generation']:
+                continue
+            for name, value in delta['changes'].items():
+                if name in _METRICS_FIELDS:
+                    value['costs'] = fields[name]['costs']
+                fields[name] = value
+            for name, new_costs in delta['costs'].items():
+                fields[name]['costs'].extend(new_costs)
+            watermark = delta['watermark']
+        return decode_state(fields), watermark
@@ -11,6 +11,7 @@ from opendevin.events.action import (
     MessageAction,
 )
 from opendevin.events.action.agent import AgentFinishAction
+from opendevin.events.event import EventSource
 from opendevin.memory.history import ShortTermHistory
 from opendevin.storage.files import FileStore
 
@@ -108,21 +109,43 @@ class State:
     almost_stuck: int = 0
 
     def save_to_session(self, sid: str, file_store: FileStore):
-        pickled = pickle.dumps(self)
+        # imported here: the checkpoints import the State
+        from opendevin.controller.state.checkpoint import StateCheckpointer
+
         logger.debug(f'Saving state to session {sid}:{self.agent_state}')
-        encoded = base64.b64encode(pickled).decode('utf-8')
         try:
-            file_store.write(f'sessions/{sid}/agent_state.pkl', encoded)
+            StateCheckpointer(sid, file_store).save(self, full=True)
         except Exception as e:
             logger.error(f'Failed to save state to session: {e}')
             raise e
 
+    async def asave_to_session(self, sid: str, file_store: FileStore):
+        """Saves the state once the events written before it are in the store, and returns once it is."""
+        # imported here: the checkpoints import the State
+        from opendevin.controller.state.checkpoint import StateCheckpointer
+
+        await file_store.aflush()
+        logger.debug(f'Saving state to session {sid}:{self.agent_state}')
+        try:
+            await StateCheckpointer(sid, file_store).asave(self, full=True)
+        except Exception as e:
+            logger.error(f'Failed to save state to session: {e}')
+            raise e
+        await file_store.aflush()
+
     @staticmethod
     def restore_from_session(sid: str, file_store: FileStore) -> 'State':
+        from opendevin.controller.state.checkpoint import StateCheckpointer
+
         try:
-            encoded = file_store.read(f'sessions/{sid}/agent_state.pkl')
-            pickled = base64.b64decode(encoded)
-            state = pickle.loads(pickled)
+            if StateCheckpointer.exists(sid, file_store):
+                state, watermark = StateCheckpointer(sid, file_store).load()
+                logger.debug(f'Restored state of session {sid} as of event {watermark}')
+            else:
+                # sessions saved before the checkpoints
+                encoded = file_store.read(f'sessions/{sid}/agent_state.pkl')
+                pickled = base64.b64decode(encoded)
+                state = pickle.loads(pickled)
         except Exception as e:
             logger.error(f'Failed to restore state from session: {e}')
             raise e
@@ -168,12 +191,33 @@ class State:
 
     def get_current_user_intent(self):
         """Returns the latest user message that appears after a FinishAction, or the first (the task) if nothing was finished yet."""
-        last_user_message = None
-        for event in self.history.get_events(reverse=True):
-            if isinstance(event, MessageAction) and event.source == 'user':
-                last_user_message = event.content
-            elif isinstance(event, AgentFinishAction):
-                if last_user_message is not None:
-                    return last_user_message
-
-        return last_user_message
+        # from the latest finish backwards, the first user message after a finish
+        for finish_action in self.history.get_events_by_type(
+            (AgentFinishAction,), reverse=True
+        ):
+            user_message = next(
+                iter(
+                    self.history.get_events_by_type(
+                        (MessageAction,),
+                        source=EventSource.USER,
+                        start_id=finish_action.id + 1,
+                    )
+                ),
+                None,
+            )
+            if isinstance(user_message, MessageAction):
+                return user_message.content
+
+        first_user_message = next(
+            iter(
+                self.history.get_events_by_type(
+                    (MessageAction,), source=EventSource.USER
+                )
+            ),
+            None,
+        )
+        return (
+            first_user_message.content
+            if isinstance(first_user_message, MessageAction)
+            else None
+        )
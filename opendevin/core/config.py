@@ -46,12 +46,15 @@ class LLMConfig:
         temperature: The temperature for the API.
         top_p: The top p for the API.
         custom_llm_provider: The custom LLM provider to use. This is undocumented in opendevin, and normally not used. It is documented on the litellm side.
-        max_input_tokens: The maximum number of input tokens. Note that this is currently unused, and the value at runtime is actually the total tokens in OpenAI (e.g. 128,000 tokens for GPT-4).
+        max_input_tokens: The maximum number of input tokens. Agents that support it leave out the oldest history to stay within it. If not set, the model's limit is used (e.g. 128,000 tokens for GPT-4o).
         max_output_tokens: The maximum number of output tokens. This is sent to the LLM.
         input_cost_per_token: The cost per input token. This will available in logs for the user to check.
         output_cost_per_token: The cost per output token. This will available in logs for the user to check.
         ollama_base_url: The base URL for the OLLAMA API.
         drop_params: Drop any unmapped (unsupported) params without causing an exception.
+        completion_cache: Whether to reuse the response of an identical earlier completion request instead of sending it again. Useful for evaluation reruns.
+        completion_cache_file: The SQLite file where cached completions are persisted, shared by all processes using it. If not set, completions are only cached in memory.
+        streaming: Whether agents that support it stream the completions, and stop reading the response as soon as the action in it is complete.
     """
 
     model: str = 'gpt-4o'
@@ -79,6 +82,9 @@ class LLMConfig:
     output_cost_per_token: float | None = None
     ollama_base_url: str | None = None
     drop_params: bool | None = None
+    completion_cache: bool = False
+    completion_cache_file: str | None = None
+    streaming: bool = False
 
     def defaults_to_dict(self) -> dict:
         """Serialize fields to a dict for the frontend, including type hints, defaults, and whether it's optional."""
@@ -154,6 +160,14 @@ class SandboxConfig(metaclass=Singleton):
         initialize_plugins: Whether to initialize plugins.
         update_source_code: Whether to update the source code in the EventStreamRuntime.
             Used for development of EventStreamRuntime.
+        shell_pool_size: The number of extra shells the EventStreamRuntime starts in the
+            sandbox, to run background commands next to the main shell. 0 disables them.
+        warm_pool_size: The number of runtime containers the EventStreamRuntime keeps
+            started, with their plugins initialized, to hand out to new sessions. 0
+            disables the pool.
+        browser_host_contexts: The maximum number of browser contexts the ServerRuntime
+            sessions lease from a browser process they share, instead of starting a
+            browser each. 0 disables the shared browser.
     """
 
     box_type: str = 'ssh'
@@ -170,6 +184,9 @@ class SandboxConfig(metaclass=Singleton):
     use_host_network: bool = False
     initialize_plugins: bool = True
     update_source_code: bool = False
+    shell_pool_size: int = 0
+    warm_pool_size: int = 0
+    browser_host_contexts: int = 0
 
     def defaults_to_dict(self) -> dict:
         """Serialize fields to a dict for the frontend, including type hints, defaults, and whether it's optional."""
@@ -208,6 +225,11 @@ class AppConfig(metaclass=Singleton):
         runtime: The runtime environment.
         file_store: The file store to use.
         file_store_path: The path to the file store.
+        file_store_write_behind: Whether writes to the file store (local or s3) are buffered in memory and flushed in batches, in the background. The session state is flushed when it is saved.
+        event_log: The storage layout for session events. Options are: files (one JSON file per event), segmented (append-only JSONL segments with a sparse offset index, in file stores that append natively, i.e. local; other stores use files).
+        browser_observations: How browser observations are stored and sent to clients. Options are: full (as returned by the browser), compact (the DOM, the accessibility tree and the element properties in a content-addressed blob store, referenced by the events, and lossy screenshots).
+        browser_screenshot_format: The screenshot format of compact browser observations. Options are: jpeg, webp, png.
+        browser_screenshot_quality: The screenshot quality of compact browser observations, from 1 to 100 (jpeg and webp).
         workspace_base: The base path for the workspace. Defaults to ./workspace as an absolute path.
         workspace_mount_path: The path to mount the workspace. This is set to the workspace base by default.
         workspace_mount_path_in_sandbox: The path to mount the workspace in the sandbox. Defaults to /workspace.
@@ -233,6 +255,11 @@ class AppConfig(metaclass=Singleton):
     runtime: str = 'server'
     file_store: str = 'memory'
     file_store_path: str = '/tmp/file_store'
+    file_store_write_behind: bool = False
+    event_log: str = 'files'
+    browser_observations: str = 'full'
+    browser_screenshot_format: str = 'jpeg'
+    browser_screenshot_quality: int = 75
     workspace_base: str = os.path.join(os.getcwd(), 'workspace')
     workspace_mount_path: str = (
         UndefinedString.UNDEFINED  # this path should always be set when config is fully loaded
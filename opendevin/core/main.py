@@ -6,6 +6,7 @@ from typing import Callable, Type
 import agenthub  # noqa F401 (we import this to get the agents registered)
 from opendevin.controller import AgentController
 from opendevin.controller.agent import Agent
+from opendevin.controller.state.checkpoint import StateCheckpointer
 from opendevin.controller.state.state import State
 from opendevin.core.config import (
     AppConfig,
@@ -17,10 +18,12 @@ from opendevin.core.logger import opendevin_logger as logger
 from opendevin.core.schema import AgentState
 from opendevin.events import EventSource, EventStream, EventStreamSubscriber
 from opendevin.events.action import MessageAction
+from opendevin.events.compaction import get_observation_compactor
 from opendevin.events.event import Event
 from opendevin.events.observation import AgentStateChangedObservation
 from opendevin.llm.llm import LLM
 from opendevin.runtime import get_runtime_cls
+from opendevin.runtime.browser.browser_env import BrowserEnv
 from opendevin.runtime.sandbox import Sandbox
 from opendevin.runtime.server.runtime import ServerRuntime
 from opendevin.storage import get_file_store
@@ -75,9 +78,16 @@ async def run_controller(
     )
 
     # set up the event stream
-    file_store = get_file_store(config.file_store, config.file_store_path)
+    file_store = get_file_store(
+        config.file_store, config.file_store_path, config.file_store_write_behind
+    )
     cli_session = 'main' + ('_' + sid if sid else '')
-    event_stream = EventStream(cli_session, file_store)
+    event_stream = EventStream(
+        cli_session,
+        file_store,
+        config.event_log,
+        compactor=get_observation_compactor(config),
+    )
 
     # restore cli session if enabled
     initial_state = None
@@ -97,6 +107,9 @@ async def run_controller(
         event_stream=event_stream,
         initial_state=initial_state,
         headless_mode=headless_mode,
+        checkpointer=StateCheckpointer(cli_session, file_store)
+        if config.enable_cli_session
+        else None,
     )
 
     # runtime and tools
@@ -115,13 +128,14 @@ async def run_controller(
     )
     await runtime.ainit()
     if isinstance(runtime, ServerRuntime):
-        runtime.init_runtime_tools(
+        await runtime.init_runtime_tools(
             controller.agent.runtime_tools,
             runtime_tools_config=runtime_tools_config,
         )
         # browser eval specific
         # NOTE: This will be deprecated when we move to the new runtime
-        if runtime.browser and runtime.browser.eval_dir:
+        # (a leased context of the shared browser is never an evaluation browser)
+        if isinstance(runtime.browser, BrowserEnv) and runtime.browser.eval_dir:
             logger.info(f'Evaluation directory: {runtime.browser.eval_dir}')
             with open(
                 os.path.join(runtime.browser.eval_dir, 'goal.txt'),
@@ -145,8 +159,19 @@ async def run_controller(
         # init with the provided task
         event_stream.add_event(MessageAction(content=task_str), EventSource.USER)
 
+    end_states = [
+        AgentState.FINISHED,
+        AgentState.REJECTED,
+        AgentState.ERROR,
+        AgentState.PAUSED,
+        AgentState.STOPPED,
+    ]
+    agent_done = asyncio.Event()
+
     async def on_event(event: Event):
         if isinstance(event, AgentStateChangedObservation):
+            if event.agent_state in end_states:
+                agent_done.set()
             if event.agent_state == AgentState.AWAITING_USER_INPUT:
                 if exit_on_message:
                     message = '/exit'
@@ -158,19 +183,18 @@ async def run_controller(
                 event_stream.add_event(action, EventSource.USER)
 
     event_stream.subscribe(EventStreamSubscriber.MAIN, on_event)
-    while controller.state.agent_state not in [
-        AgentState.FINISHED,
-        AgentState.REJECTED,
-        AgentState.ERROR,
-        AgentState.PAUSED,
-        AgentState.STOPPED,
-    ]:
-        await asyncio.sleep(1)  # Give back control for a tick, so the agent can run
+    while controller.state.agent_state not in end_states:
+        # wait for the agent to be done, re-checking the state once in a while
+        agent_done.clear()
+        try:
+            await asyncio.wait_for(agent_done.wait(), timeout=1)
+        except asyncio.TimeoutError:
+            pass
 
     # save session when we're about to close
     if config.enable_cli_session:
         end_state = controller.get_state()
-        end_state.save_to_session(cli_session, file_store)
+        await end_state.asave_to_session(cli_session, file_store)
 
     # close when done
     await controller.close()
@@ -1,9 +1,18 @@
+from bisect import bisect_left
+
+
 class Metrics:
     """Metrics class can record various metrics during running and evaluation.
     Currently, we define the following metrics:
         accumulated_cost: the total cost (USD $) of the current LLM.
+        cache_hits: the number of completions served from the completion cache.
+        cached_cost: the cost (USD $) the cached completions were originally billed; it is not part of accumulated_cost.
     """
 
+    # class defaults, so that metrics pickled before these existed still load
+    _cache_hits: int = 0
+    _cached_cost: float = 0.0
+
     def __init__(self) -> None:
         self._accumulated_cost: float = 0.0
         self._costs: list[float] = []
@@ -28,13 +37,32 @@ class Metrics:
         self._accumulated_cost += value
         self._costs.append(value)
 
+    @property
+    def cache_hits(self) -> int:
+        return self._cache_hits
+
+    @property
+    def cached_cost(self) -> float:
+        return self._cached_cost
+
+    def add_cache_hit(self, saved_cost: float) -> None:
+        self._cache_hits += 1
+        self._cached_cost += saved_cost
+
     def merge(self, other: 'Metrics') -> None:
         self._accumulated_cost += other.accumulated_cost
         self._costs += other._costs
+        self._cache_hits += other.cache_hits
+        self._cached_cost += other.cached_cost
 
     def get(self):
         """Return the metrics in a dictionary."""
-        return {'accumulated_cost': self._accumulated_cost, 'costs': self._costs}
+        return {
+            'accumulated_cost': self._accumulated_cost,
+            'costs': self._costs,
+            'cache_hits': self._cache_hits,
+            'cached_cost': self._cached_cost,
+        }
 
     def log(self):
         """Log the metrics."""
@@ -46,3 +74,60 @@ class Metrics:
 
     def __repr__(self):
         return f'Metrics({self.get()}'
+
+
+class LatencyHistogram:
+    """LatencyHistogram counts latencies (in seconds) in fixed buckets.
+
+    It is cheap enough to record on every step, and gives approximate percentiles.
+    """
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        # the last count is for the latencies above the largest bucket
+        self._counts: list[int] = [0] * (len(buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._sum / self._count if self._count else 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._count += 1
+        self._sum += value
+        self._max = max(self._max, value)
+
+    def quantile(self, q: float) -> float:
+        """Returns the upper bound of the bucket the q-quantile falls in."""
+        if not self._count:
+            return 0.0
+        rank = q * self._count
+        seen = 0
+        for bound, count in zip(self.buckets, self._counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self._max
+
+    def get(self):
+        """Return the histogram in a dictionary."""
+        return {
+            'count': self._count,
+            'mean': self.mean,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': self._max,
+            'buckets': dict(zip([*self.buckets, float('inf')], self._counts)),
+        }
+
+    def __repr__(self):
+        return f'LatencyHistogram({self.get()})'
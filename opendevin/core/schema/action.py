@@ -8,6 +8,10 @@ class ActionTypeSchema(BaseModel):
     """Initializes the agent. Only sent by client.
     """
 
+    REPLAY: str = Field(default='replay')
+    """Replays events of the session to the client. Only sent by client.
+    """
+
     MESSAGE: str = Field(default='message')
     """Represents a message.
     """
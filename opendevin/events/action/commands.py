@@ -10,6 +10,9 @@ from .action import Action, ActionConfirmationStatus
 class CmdRunAction(Action):
     command: str
     thought: str = ''
+    # independent of the other commands: it may run in a separate shell, which doesn't
+    # share the working directory or environment changes of the main one
+    background: bool = False
     action: str = ActionType.RUN
     runnable: ClassVar[bool] = True
     is_confirmed: ActionConfirmationStatus = ActionConfirmationStatus.CONFIRMED
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import threading
+from typing import Any
+
+from opendevin.storage import FileStore
+
+# the serialized form of a reference, in place of the value in an event's JSON
+BLOB_KEY = '$blob'
+
+
+class BlobStore:
+    """Content-addressed storage for the large values of one session's events.
+
+    Values are stored as JSON under sessions/{sid}/blobs/{sha256}.json, so that a value
+    repeated across events (e.g. the DOM of a page that didn't change between two
+    browser actions) is stored once, and events only carry its key.
+    """
+
+    sid: str
+    writes: int
+    dedup_hits: int
+    _file_store: FileStore
+    _known: set[str]
+    _lock: threading.Lock
+
+    def __init__(self, sid: str, file_store: FileStore):
+        self.sid = sid
+        self._file_store = file_store
+        self._known = set()
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.dedup_hits = 0
+
+    def _get_filename(self, key: str) -> str:
+        return f'sessions/{self.sid}/blobs/{key}.json'
+
+    def put(self, value: Any) -> 'BlobRef':
+        content = json.dumps(value)
+        key = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        with self._lock:
+            if key in self._known:
+                self.dedup_hits += 1
+                return BlobRef(key, self)
+            self._known.add(key)
+            self.writes += 1
+        self._file_store.write(self._get_filename(key), content)
+        return BlobRef(key, self)
+
+    def get(self, key: str) -> Any:
+        """Returns the value stored under the key. Raises FileNotFoundError if there is none."""
+        return json.loads(self._file_store.read(self._get_filename(key)))
+
+
+class BlobRef:
+    """A reference to a value in a BlobStore, loaded when it is needed."""
+
+    __slots__ = ('key', 'store')
+
+    def __init__(self, key: str, store: BlobStore | None = None):
+        self.key = key
+        self.store = store
+
+    def load(self) -> Any:
+        if self.store is None:
+            raise FileNotFoundError(f'Blob {self.key} has no store to be loaded from')
+        return self.store.get(self.key)
+
+    def to_dict(self) -> dict:
+        return {BLOB_KEY: self.key}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BlobRef) and other.key == self.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f'BlobRef({self.key!r})'
+
+
+class LazyBlobFields:
+    """Mixin for events whose fields may hold BlobRefs: reading one loads its value.
+
+    The references themselves are found in the instance dict, without loading them.
+    """
+
+    def __getattribute__(self, name: str):
+        value = object.__getattribute__(self, name)
+        if type(value) is BlobRef:
+            return value.load()
+        return value
+
+    def blob_refs(self) -> dict[str, BlobRef]:
+        return {
+            name: value for name, value in vars(self).items() if type(value) is BlobRef
+        }
+
+
+def is_blob_ref_dict(value: Any) -> bool:
+    return isinstance(value, dict) and len(value) == 1 and BLOB_KEY in value
+
+
+def attach_blobs(event: Any, store: BlobStore) -> None:
+    """Replaces the serialized references of a decoded event by BlobRefs to the store."""
+    if not isinstance(event, LazyBlobFields):
+        return
+    for name, value in list(vars(event).items()):
+        if is_blob_ref_dict(value):
+            setattr(event, name, BlobRef(value[BLOB_KEY], store))
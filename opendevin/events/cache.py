@@ -0,0 +1,80 @@
+import threading
+from collections import OrderedDict
+
+from .event import Event
+
+
+class EventCache:
+    """Bounded LRU cache of decoded events, keyed by event id.
+
+    Entries are evicted when either the number of cached events exceeds max_events
+    or their approximate size (the length of their serialized form) exceeds
+    max_bytes. Cached events are shared between readers and must not be mutated.
+    """
+
+    max_events: int
+    max_bytes: int
+    hits: int
+    misses: int
+    evictions: int
+    _entries: OrderedDict[int, tuple[Event, int]]
+    _nbytes: int
+    _lock: threading.Lock
+
+    def __init__(self, max_events: int = 2000, max_bytes: int = 64 * 1024 * 1024):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, id: int) -> bool:
+        return id in self._entries
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def get(self, id: int) -> Event | None:
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, id: int, event: Event, size: int) -> None:
+        if self.max_events <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(id, None)
+            if old is not None:
+                self._nbytes -= old[1]
+            self._entries[id] = (event, size)
+            self._nbytes += size
+            while len(self._entries) > self.max_events or self._nbytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'bytes': self._nbytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
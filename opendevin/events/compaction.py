@@ -0,0 +1,75 @@
+import base64
+import io
+
+from PIL import Image
+
+from opendevin.core.config import AppConfig
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.events.blobs import BlobRef, BlobStore
+from opendevin.events.event import Event
+from opendevin.events.observation import BrowserOutputObservation
+
+SCREENSHOT_FORMATS = ('png', 'jpeg', 'webp')
+
+
+def encode_screenshot(screenshot: str, format: str, quality: int) -> str:
+    """Re-encodes a base64 screenshot, with or without a data URL prefix, to a data URL."""
+    if not screenshot or format == 'png':
+        return screenshot
+    if screenshot.startswith('data:'):
+        if screenshot.startswith(f'data:image/{format};'):
+            return screenshot
+        screenshot = screenshot.split(',', 1)[1]
+    image: Image.Image = Image.open(io.BytesIO(base64.b64decode(screenshot)))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffered = io.BytesIO()
+    image.save(buffered, format=format.upper(), quality=quality)
+    image_base64 = base64.b64encode(buffered.getvalue()).decode()
+    return f'data:image/{format};base64,{image_base64}'
+
+
+class BrowserObservationCompactor:
+    """Makes browser observations small before they are stored and sent to clients.
+
+    The DOM, the accessibility tree and the element properties move to the session's
+    blob store, and the observation keeps references to them; pages that didn't change
+    between two actions share the same blobs. The screenshot stays in the observation,
+    since the clients show it, but is re-encoded as a lossy JPEG or WebP image.
+    """
+
+    blob_fields = ('dom_object', 'axtree_object', 'extra_element_properties')
+
+    def __init__(self, screenshot_format: str = 'jpeg', screenshot_quality: int = 75):
+        if screenshot_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f'Unsupported screenshot format: {screenshot_format}')
+        self.screenshot_format = screenshot_format
+        self.screenshot_quality = screenshot_quality
+
+    def compact(self, event: Event, store: BlobStore) -> None:
+        if not isinstance(event, BrowserOutputObservation):
+            return
+        values = vars(event)
+        for name in self.blob_fields:
+            value = values[name]
+            # empty values are smaller than their references
+            if value and type(value) is not BlobRef:
+                setattr(event, name, store.put(value))
+        try:
+            event.screenshot = encode_screenshot(
+                event.screenshot, self.screenshot_format, self.screenshot_quality
+            )
+        except Exception as e:
+            # keep the original screenshot rather than losing the observation
+            logger.warning(f'Failed to re-encode the browser screenshot: {e}')
+
+
+def get_observation_compactor(
+    config: AppConfig,
+) -> BrowserObservationCompactor | None:
+    """Returns the compactor for the configured browser observation mode, if any."""
+    if config.browser_observations == 'compact':
+        return BrowserObservationCompactor(
+            config.browser_screenshot_format, config.browser_screenshot_quality
+        )
+    return None
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from enum import Enum
+from typing import Callable
+
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.core.metrics import LatencyHistogram
+
+from .event import Event
+
+
+class OverflowPolicy(str, Enum):
+    # wait for room; only threads other than the event loop's can wait, the loop
+    # itself goes over the limit rather than deadlock
+    BLOCK = 'block'
+
+    # drop the oldest queued event
+    DROP_OLDEST = 'drop_oldest'
+
+    # replace the queued event with the same coalesce key, e.g. an older state change;
+    # drop the oldest event if there is none
+    COALESCE = 'coalesce'
+
+
+# how long a blocked thread waits for room before giving up and going over the limit
+BLOCK_TIMEOUT = 30.0
+
+
+class SubscriberQueue:
+    """The bounded queue of events for one subscriber of an event stream.
+
+    Events are delivered to their callbacks one at a time and in order, by a consumer
+    task on the subscriber's event loop. The task only runs while there are events
+    queued. Events can be put from any thread: the consumer is scheduled on the loop
+    the queue is bound to, which is the running loop when the queue is created or, if
+    there was none, the running loop of the first put from a loop thread. Events put
+    before the queue is bound to a loop wait in the queue.
+
+    A callback that raises is logged, and delivery goes on with the next event.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_size: int = 1000,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        coalesce_key: Callable[[Event], object] = type,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.coalesce_key = coalesce_key
+        # (event, callback, enqueue time)
+        self._queue: deque[tuple[Event, Callable, float]] = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._consuming = False
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.max_depth = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.overflowed = 0
+        self.errors = 0
+        # time from put to the start of the delivery
+        self.lag = LatencyHistogram()
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def put(self, event: Event, callback: Callable) -> None:
+        """Queues an event for the callback."""
+        try:
+            running_loop: asyncio.AbstractEventLoop | None = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        with self._lock:
+            if running_loop is not None and (
+                self._loop is None or self._loop.is_closed()
+            ):
+                # a consumer on a closed loop is gone
+                self._consuming = False
+                self._loop = running_loop
+            on_loop = running_loop is not None and running_loop is self._loop
+
+            if len(self._queue) >= self.max_size:
+                self._make_room(event, on_loop)
+            self._queue.append((event, callback, time.monotonic()))
+            self.max_depth = max(self.max_depth, len(self._queue))
+
+            if self._consuming or self._loop is None:
+                return
+            self._consuming = True
+            loop = self._loop
+
+        if on_loop:
+            loop.create_task(self._consume())
+        else:
+            loop.call_soon_threadsafe(lambda: loop.create_task(self._consume()))
+
+    def _make_room(self, event: Event, on_loop: bool) -> None:
+        # called with the lock held
+        if self.overflow_policy == OverflowPolicy.COALESCE:
+            key = self.coalesce_key(event)
+            for i in range(len(self._queue) - 1, -1, -1):
+                if self.coalesce_key(self._queue[i][0]) == key:
+                    del self._queue[i]
+                    self.coalesced += 1
+                    return
+        if self.overflow_policy in (
+            OverflowPolicy.DROP_OLDEST,
+            OverflowPolicy.COALESCE,
+        ):
+            dropped = self._queue.popleft()
+            self.dropped += 1
+            logger.debug(f'Subscriber {self.name} dropped event {dropped[0].id}')
+            return
+        # block, if the consumer can make progress meanwhile
+        if not on_loop and self._loop is not None and self._loop.is_running():
+            if self._not_full.wait_for(
+                lambda: len(self._queue) < self.max_size, timeout=BLOCK_TIMEOUT
+            ):
+                return
+        self.overflowed += 1
+        if self.overflowed == 1:
+            logger.warning(
+                f'Subscriber {self.name} has more than {self.max_size} queued events'
+            )
+
+    async def _consume(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    if not self._queue:
+                        self._consuming = False
+                        return
+                    event, callback, enqueued_at = self._queue.popleft()
+                    self._not_full.notify()
+                self.lag.observe(time.monotonic() - enqueued_at)
+                try:
+                    await callback(event)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(
+                        f'Subscriber {self.name} failed to handle event {event.id}: {e}',
+                        exc_info=True,
+                    )
+                self.delivered += 1
+        except BaseException:
+            # cancelled: the next put starts a new consumer
+            with self._lock:
+                self._consuming = False
+            raise
+
+    def stats(self) -> dict:
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'coalesced': self.coalesced,
+            'overflowed': self.overflowed,
+            'errors': self.errors,
+            'lag': self.lag.get(),
+        }
@@ -0,0 +1,311 @@
+from abc import abstractmethod
+from typing import Iterator
+
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.core.utils import json
+from opendevin.storage import FileStore
+
+# the number of events FileEventLog.read_range reads at a time, at first and at most
+MIN_READ_BATCH = 16
+MAX_READ_BATCH = 256
+
+
+class EventLog:
+    """Storage for the serialized events of one session, addressed by event id.
+
+    Ids are handed out by the EventStream and are always appended in order.
+    """
+
+    sid: str
+    _file_store: FileStore
+    _next_id: int
+
+    def __init__(self, sid: str, file_store: FileStore):
+        self.sid = sid
+        self._file_store = file_store
+        self._next_id = 0
+
+    @property
+    def next_id(self) -> int:
+        return self._next_id
+
+    @abstractmethod
+    def append(self, id: int, data: str) -> None:
+        pass
+
+    @abstractmethod
+    def read(self, id: int) -> str:
+        """Return the serialized event. Raises FileNotFoundError if it does not exist."""
+        pass
+
+    def read_range(
+        self, start_id: int, end_id: int | None = None
+    ) -> Iterator[tuple[int, str]]:
+        """Yield (id, data) pairs in order, stopping at end_id or the first missing event."""
+        id = start_id
+        while end_id is None or id <= end_id:
+            try:
+                data = self.read(id)
+            except FileNotFoundError:
+                break
+            yield id, data
+            id += 1
+
+
+class FileEventLog(EventLog):
+    """One JSON file per event, under sessions/{sid}/events/{id}.json."""
+
+    def __init__(self, sid: str, file_store: FileStore):
+        super().__init__(sid, file_store)
+        try:
+            events = self._file_store.list(f'sessions/{self.sid}/events')
+        except FileNotFoundError:
+            logger.debug(f'No events found for session {self.sid}')
+            return
+
+        # if we have events, we need to find the highest id to prepare for new events
+        for event_str in events:
+            id = self._get_id_from_filename(event_str)
+            if id >= self._next_id:
+                self._next_id = id + 1
+
+    def _get_filename_for_id(self, id: int) -> str:
+        return f'sessions/{self.sid}/events/{id}.json'
+
+    @staticmethod
+    def _get_id_from_filename(filename: str) -> int:
+        try:
+            return int(filename.split('/')[-1].split('.')[0])
+        except ValueError:
+            logger.warning(f'get id from filename ({filename}) failed.')
+            return -1
+
+    def append(self, id: int, data: str) -> None:
+        self._file_store.write(self._get_filename_for_id(id), data)
+        self._next_id = max(self._next_id, id + 1)
+
+    def read(self, id: int) -> str:
+        return self._file_store.read(self._get_filename_for_id(id))
+
+    def read_range(
+        self, start_id: int, end_id: int | None = None
+    ) -> Iterator[tuple[int, str]]:
+        # read the events in batches, which stores like S3 read concurrently; the
+        # batches grow, so that reading a few events doesn't read many more
+        id = max(start_id, 0)
+        last_id = (
+            self._next_id - 1 if end_id is None else min(end_id, self._next_id - 1)
+        )
+        batch_size = MIN_READ_BATCH
+        while id <= last_id:
+            ids = range(id, min(id + batch_size, last_id + 1))
+            contents = self._file_store.read_many(
+                [self._get_filename_for_id(event_id) for event_id in ids]
+            )
+            for event_id in ids:
+                data = contents.get(self._get_filename_for_id(event_id))
+                if data is None:
+                    return
+                yield event_id, data
+            id = ids.stop
+            batch_size = min(batch_size * 2, MAX_READ_BATCH)
+
+
+class SegmentedEventLog(EventLog):
+    """Append-only log of JSONL segments with a sparse offset index.
+
+    Layout under sessions/{sid}/events/:
+        manifest.json            format version, segment size, index interval and
+                                 the number of sealed segments
+        segments/{n}.jsonl       events n * segment_size .. (n + 1) * segment_size - 1,
+                                 one JSON document per line
+        segments/{n}.idx         byte offsets of every index_interval-th line of a
+                                 sealed segment
+
+    Appends only touch the active segment. Reading an event seeks to the nearest
+    indexed offset and reads at most index_interval lines. Startup reads the
+    manifest and the active segment, never the full list of events.
+    """
+
+    VERSION = 1
+
+    segment_size: int
+    index_interval: int
+    _sealed: int
+    _active_offsets: list[int]
+    _active_size: int
+    _sealed_offsets: dict[int, list[int]]
+    _manifest_written: bool
+
+    def __init__(
+        self,
+        sid: str,
+        file_store: FileStore,
+        segment_size: int = 1000,
+        index_interval: int = 32,
+    ):
+        super().__init__(sid, file_store)
+        self.segment_size = segment_size
+        self.index_interval = index_interval
+        self._sealed = 0
+        self._active_offsets = []
+        self._active_size = 0
+        self._sealed_offsets = {}
+        self._manifest_written = False
+        try:
+            manifest = json.loads(self._file_store.read(self._manifest_path(sid)))
+        except FileNotFoundError:
+            return
+        if manifest.get('version') != self.VERSION:
+            raise ValueError(
+                f'Unsupported event log version for session {sid}: {manifest.get("version")}'
+            )
+        self.segment_size = manifest['segment_size']
+        self.index_interval = manifest['index_interval']
+        self._sealed = manifest['sealed']
+        self._manifest_written = True
+        self._load_active_segment()
+
+    @staticmethod
+    def _manifest_path(sid: str) -> str:
+        return f'sessions/{sid}/events/manifest.json'
+
+    @classmethod
+    def exists(cls, sid: str, file_store: FileStore) -> bool:
+        try:
+            file_store.read(cls._manifest_path(sid))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _segment_path(self, segment: int) -> str:
+        return f'sessions/{self.sid}/events/segments/{segment}.jsonl'
+
+    def _index_path(self, segment: int) -> str:
+        return f'sessions/{self.sid}/events/segments/{segment}.idx'
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            'version': self.VERSION,
+            'segment_size': self.segment_size,
+            'index_interval': self.index_interval,
+            'sealed': self._sealed,
+        }
+        self._file_store.write(self._manifest_path(self.sid), json.dumps(manifest))
+        self._manifest_written = True
+
+    def _load_active_segment(self) -> None:
+        """Rebuild the in-memory index of the active segment after a restart.
+
+        A trailing partial line (from a crash mid-append) is dropped. If the process
+        died between filling a segment and sealing it, the segment is sealed now.
+        """
+        while True:
+            path = self._segment_path(self._sealed)
+            try:
+                content = self._file_store.read(path)
+            except FileNotFoundError:
+                content = ''
+            if content and not content.endswith('\n'):
+                logger.warning(f'Dropping partial event at the end of {path}')
+                content = content[: content.rfind('\n') + 1]
+                self._file_store.write(path, content)
+
+            self._active_offsets = []
+            self._active_size = 0
+            lines = content.split('\n')[:-1]
+            for i, line in enumerate(lines):
+                if i % self.index_interval == 0:
+                    self._active_offsets.append(self._active_size)
+                self._active_size += len(line.encode('utf-8')) + 1
+            self._next_id = self._sealed * self.segment_size + len(lines)
+            if len(lines) < self.segment_size:
+                return
+            self._seal()
+
+    def _seal(self) -> None:
+        self._file_store.write(
+            self._index_path(self._sealed),
+            json.dumps({'offsets': self._active_offsets, 'size': self._active_size}),
+        )
+        self._sealed_offsets[self._sealed] = self._active_offsets
+        self._sealed += 1
+        self._active_offsets = []
+        self._active_size = 0
+        self._write_manifest()
+
+    def _get_offsets(self, segment: int) -> list[int]:
+        if segment == self._sealed:
+            return self._active_offsets
+        if segment not in self._sealed_offsets:
+            index = json.loads(self._file_store.read(self._index_path(segment)))
+            self._sealed_offsets[segment] = index['offsets']
+        return self._sealed_offsets[segment]
+
+    def append(self, id: int, data: str) -> None:
+        if id != self._next_id:
+            raise ValueError(
+                f'Events must be appended in order: expected id {self._next_id}, got {id}'
+            )
+        if not self._manifest_written:
+            self._write_manifest()
+        line = data + '\n'
+        if (id % self.segment_size) % self.index_interval == 0:
+            self._active_offsets.append(self._active_size)
+        self._file_store.append(self._segment_path(self._sealed), line)
+        self._active_size += len(line.encode('utf-8'))
+        self._next_id += 1
+        if self._next_id % self.segment_size == 0:
+            self._seal()
+
+    def _read_block(self, segment: int, block: int) -> list[str]:
+        """Read the lines of one indexed block (index_interval events) of a segment."""
+        offsets = self._get_offsets(segment)
+        end = offsets[block + 1] if block + 1 < len(offsets) else None
+        chunk = self._file_store.read_range(
+            self._segment_path(segment), offsets[block], end
+        )
+        # every line ends with a newline, so the last element of the split is empty
+        return chunk.split('\n')[:-1]
+
+    def read(self, id: int) -> str:
+        if id < 0 or id >= self._next_id:
+            raise FileNotFoundError(f'Event {id} not found in session {self.sid}')
+        segment, position = divmod(id, self.segment_size)
+        block, line = divmod(position, self.index_interval)
+        return self._read_block(segment, block)[line]
+
+    def read_range(
+        self, start_id: int, end_id: int | None = None
+    ) -> Iterator[tuple[int, str]]:
+        id = max(start_id, 0)
+        while id < self._next_id and (end_id is None or id <= end_id):
+            segment, position = divmod(id, self.segment_size)
+            block, line = divmod(position, self.index_interval)
+            lines = self._read_block(segment, block)
+            for data in lines[line:]:
+                if id >= self._next_id or (end_id is not None and id > end_id):
+                    return
+                yield id, data
+                id += 1
+
+
+def get_event_log(
+    sid: str, file_store: FileStore, event_log: str = 'files'
+) -> EventLog:
+    """Open the event log of a session.
+
+    Sessions that were written as segmented logs are always opened as such, so that
+    switching the configured layout does not hide existing sessions. New sessions are
+    segmented only in stores that append natively: elsewhere, each event would rewrite
+    its whole segment.
+    """
+    if SegmentedEventLog.exists(sid, file_store):
+        return SegmentedEventLog(sid, file_store)
+    if event_log == 'segmented':
+        if file_store.supports_append:
+            return SegmentedEventLog(sid, file_store)
+        logger.warning(
+            f'{type(file_store).__name__} does not append natively: using the files event log for session {sid}'
+        )
+    return FileEventLog(sid, file_store)
@@ -1,13 +1,18 @@
 from dataclasses import dataclass, field
 
 from opendevin.core.schema import ObservationType
+from opendevin.events.blobs import LazyBlobFields
 
 from .observation import Observation
 
 
 @dataclass
-class BrowserOutputObservation(Observation):
-    """This data class represents the output of a browser."""
+class BrowserOutputObservation(Observation, LazyBlobFields):
+    """This data class represents the output of a browser.
+
+    In compact mode, the DOM, the accessibility tree and the element properties are
+    BlobRefs to the session's blob store, loaded when they are read.
+    """
 
     url: str
     screenshot: str = field(repr=False)  # don't show in repr
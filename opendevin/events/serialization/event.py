@@ -1,7 +1,9 @@
+import copy
 from dataclasses import asdict
 from datetime import datetime
 
 from opendevin.events import Event, EventSource
+from opendevin.events.blobs import LazyBlobFields
 from opendevin.events.observation.observation import Observation
 
 from .action import action_from_dict
@@ -45,7 +47,15 @@ def event_from_dict(data) -> 'Event':
 
 
 def event_to_dict(event: 'Event') -> dict:
+    refs = event.blob_refs() if isinstance(event, LazyBlobFields) else {}
+    if refs:
+        # serialize the references, without loading the values
+        event = copy.copy(event)
+        for name in refs:
+            setattr(event, name, None)
     props = asdict(event)
+    for name, ref in refs.items():
+        props[name] = ref.to_dict()
     d = {}
     for key in TOP_KEYS:
         if hasattr(event, key) and getattr(event, key) is not None:
@@ -1,15 +1,45 @@
-import asyncio
+import bisect
+import heapq
+import re
 import threading
 from datetime import datetime
 from enum import Enum
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Iterator
 
 from opendevin.core.logger import opendevin_logger as logger
 from opendevin.core.utils import json
+from opendevin.events.serialization.action import ACTION_TYPE_TO_CLASS
 from opendevin.events.serialization.event import event_from_dict, event_to_dict
+from opendevin.events.serialization.observation import OBSERVATION_TYPE_TO_CLASS
 from opendevin.storage import FileStore
 
+from .blobs import BlobStore, attach_blobs
+from .cache import EventCache
+from .compaction import BrowserObservationCompactor
+from .dispatch import OverflowPolicy, SubscriberQueue
 from .event import Event, EventSource
+from .log import EventLog, get_event_log
+
+# the keys event_to_dict puts before the type of an event; a message is a JSON string
+_EVENT_TYPE_RE = re.compile(
+    r'\{(?:"id": -?\d+, )?(?:"timestamp": "[^"]*", )?(?:"source": "[a-z]+", )?'
+    r'(?:"message": "(?:[^"\\]|\\.)*", )?(?:"cause": -?\d+, )?'
+    r'"(action|observation)": "([a-z_]+)"'
+)
+
+
+def _peek_event_class(content: str) -> type[Event] | None:
+    """Returns the class of a serialized event, reading as little of it as possible."""
+    match = _EVENT_TYPE_RE.match(content)
+    if match is not None:
+        kind, name = match.groups()
+    else:
+        data = json.loads(content)
+        kind = 'action' if 'action' in data else 'observation'
+        name = data.get(kind)
+    if kind == 'action':
+        return ACTION_TYPE_TO_CLASS.get(name)
+    return OBSERVATION_TYPE_TO_CLASS.get(name)
 
 
 class EventStreamSubscriber(str, Enum):
@@ -25,42 +55,66 @@ class EventStream:
     # For each subscriber ID, there is a stack of callback functions - useful
     # when there are agent delegates
     _subscribers: dict[str, list[Callable]]
+    # the events waiting to be delivered, for each subscriber ID
+    _queues: dict[str, SubscriberQueue]
     _cur_id: int
     _lock: threading.Lock
     _file_store: FileStore
+    _event_log: str
+    _log: EventLog
+    # decoded events, so that repeated reads of the history skip the file store
+    _cache: EventCache
+    # ids of the events of each (class, source), in increasing order; built lazily
+    # for restored sessions, None until then
+    _type_index: dict[tuple[type[Event], EventSource | None], list[int]] | None
+    # the large values of the events, stored apart from them
+    _blobs: BlobStore
+    # makes browser observations compact before they are stored, if set
+    _compactor: BrowserObservationCompactor | None
 
-    def __init__(self, sid: str, file_store: FileStore):
+    def __init__(
+        self,
+        sid: str,
+        file_store: FileStore,
+        event_log: str = 'files',
+        cache: EventCache | None = None,
+        compactor: BrowserObservationCompactor | None = None,
+    ):
         self.sid = sid
         self._file_store = file_store
+        self._event_log = event_log
+        self._cache = cache if cache is not None else EventCache()
+        self._compactor = compactor
         self._subscribers = {}
+        self._queues = {}
         self._cur_id = 0
         self._lock = threading.Lock()
         self._reinitialize_from_file_store()
 
     def _reinitialize_from_file_store(self) -> None:
-        try:
-            events = self._file_store.list(f'sessions/{self.sid}/events')
-        except FileNotFoundError:
-            logger.debug(f'No events found for session {self.sid}')
-            self._cur_id = 0
-            return
-
-        # if we have events, we need to find the highest id to prepare for new events
-        for event_str in events:
-            id = self._get_id_from_filename(event_str)
-            if id >= self._cur_id:
-                self._cur_id = id + 1
-
-    def _get_filename_for_id(self, id: int) -> str:
-        return f'sessions/{self.sid}/events/{id}.json'
-
-    @staticmethod
-    def _get_id_from_filename(filename: str) -> int:
-        try:
-            return int(filename.split('/')[-1].split('.')[0])
-        except ValueError:
-            logger.warning(f'get id from filename ({filename}) failed.')
-            return -1
+        self._log = get_event_log(self.sid, self._file_store, self._event_log)
+        self._blobs = BlobStore(self.sid, self._file_store)
+        self._cur_id = self._log.next_id
+        self._cache.clear()
+        self._type_index = {} if self._cur_id == 0 else None
+
+    @property
+    def cache(self) -> EventCache:
+        return self._cache
+
+    @property
+    def blobs(self) -> BlobStore:
+        return self._blobs
+
+    def _from_dict(self, data: dict) -> Event:
+        event = event_from_dict(data)
+        attach_blobs(event, self._blobs)
+        return event
+
+    def _decode(self, id: int, content: str) -> Event:
+        event = self._from_dict(json.loads(content))
+        self._cache.put(id, event, len(content))
+        return event
 
     def get_events(
         self,
@@ -84,25 +138,130 @@ class EventStream:
                     logger.debug(f'No event found for ID {event_id}')
                 event_id -= 1
         else:
-            event_id = start_id
-            while True:
-                if end_id is not None and event_id > end_id:
-                    break
-                try:
-                    event = self.get_event(event_id)
-                    if filter_out_type is None or not isinstance(
-                        event, filter_out_type
-                    ):
-                        yield event
-                except FileNotFoundError:
-                    break
+            for event in self._iter_events(start_id, end_id):
+                if filter_out_type is None or not isinstance(event, filter_out_type):
+                    yield event
+
+    def get_serialized_events(
+        self,
+        start_id: int = 0,
+        end_id: int | None = None,
+        filter_out_type: tuple[type[Event], ...] | None = None,
+    ) -> Iterator[tuple[int, str]]:
+        """Yield (id, JSON) of the events in id order, as they are stored.
+
+        The events are neither decoded nor cached: the JSON is what event_to_dict returned
+        when they were added. Events are filtered out by the type in their JSON.
+        """
+        for id, content in self._log.read_range(start_id, end_id):
+            if filter_out_type is not None:
+                event_cls = _peek_event_class(content)
+                if event_cls is not None and issubclass(event_cls, filter_out_type):
+                    continue
+            yield id, content
+
+    def _iter_events(self, start_id: int, end_id: int | None) -> Iterable[Event]:
+        """Yield events in id order, serving cached ones without touching storage.
+
+        Runs of uncached events are read from the log in one range read.
+        """
+        event_id = start_id
+        while end_id is None or event_id <= end_id:
+            event = self._cache.get(event_id)
+            if event is not None:
+                yield event
                 event_id += 1
+                continue
+            read_any = False
+            for id, content in self._log.read_range(event_id, end_id):
+                read_any = True
+                yield self._decode(id, content)
+                event_id = id + 1
+                if event_id in self._cache:
+                    break
+            if not read_any:
+                return
+
+    def _ensure_type_index(
+        self,
+    ) -> dict[tuple[type[Event], EventSource | None], list[int]]:
+        """Build the type index of a restored session, from the raw event dicts."""
+        if self._type_index is not None:
+            return self._type_index
+        with self._lock:
+            if self._type_index is None:
+                index: dict[tuple[type[Event], EventSource | None], list[int]] = {}
+                for id, content in self._log.read_range(0, self._cur_id - 1):
+                    data = json.loads(content)
+                    event_cls: type[Event] | None = (
+                        ACTION_TYPE_TO_CLASS.get(data['action'])
+                        if 'action' in data
+                        else OBSERVATION_TYPE_TO_CLASS.get(data.get('observation'))
+                    )
+                    if event_cls is None:
+                        logger.warning(f'Unknown event type for event id={id}')
+                        continue
+                    source = EventSource(data['source']) if 'source' in data else None
+                    index.setdefault((event_cls, source), []).append(id)
+                self._type_index = index
+        return self._type_index
+
+    def get_events_by_type(
+        self,
+        types: tuple[type[Event], ...],
+        source: EventSource | None = None,
+        start_id: int = 0,
+        end_id: int | None = None,
+        reverse: bool = False,
+        exclude_types: tuple[type[Event], ...] = (),
+    ) -> Iterable[Event]:
+        """Yield the events that are instances of types (and from source, if given).
+
+        Uses the type index, so events of other types are never read or decoded.
+        """
+        if end_id is None:
+            end_id = self._cur_id - 1
+        id_lists = []
+        for (event_cls, event_source), ids in list(self._ensure_type_index().items()):
+            if not issubclass(event_cls, types) or issubclass(event_cls, exclude_types):
+                continue
+            if source is not None and event_source != source:
+                continue
+            lo = bisect.bisect_left(ids, start_id)
+            hi = bisect.bisect_right(ids, end_id)
+            positions = range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)
+            id_lists.append(map(ids.__getitem__, positions))
+        for id in heapq.merge(*id_lists, reverse=reverse):
+            try:
+                yield self.get_event(id)
+            except FileNotFoundError:
+                logger.debug(f'No event found for ID {id}')
+
+    def get_latest_event_of_type(
+        self,
+        types: tuple[type[Event], ...],
+        source: EventSource | None = None,
+        end_id: int | None = None,
+        exclude_types: tuple[type[Event], ...] = (),
+    ) -> Event | None:
+        return next(
+            iter(
+                self.get_events_by_type(
+                    types,
+                    source=source,
+                    end_id=end_id,
+                    reverse=True,
+                    exclude_types=exclude_types,
+                )
+            ),
+            None,
+        )
 
     def get_event(self, id: int) -> Event:
-        filename = self._get_filename_for_id(id)
-        content = self._file_store.read(filename)
-        data = json.loads(content)
-        return event_from_dict(data)
+        event = self._cache.get(id)
+        if event is not None:
+            return event
+        return self._decode(id, self._log.read(id))
 
     def get_latest_event(self) -> Event:
         return self.get_event(self._cur_id - 1)
@@ -110,7 +269,24 @@ class EventStream:
     def get_latest_event_id(self) -> int:
         return self._cur_id - 1
 
-    def subscribe(self, id: EventStreamSubscriber, callback: Callable, append=False):
+    def subscribe(
+        self,
+        id: EventStreamSubscriber,
+        callback: Callable,
+        append=False,
+        max_queue_size: int = 1000,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+    ):
+        """Subscribes a callback to the events added to the stream.
+
+        Each subscriber ID gets its events in order, one at a time, through a queue of up
+        to max_queue_size events; the overflow policy tells what to do when it is full.
+        The queue settings are those of the first subscription of the ID.
+        """
+        if id not in self._queues:
+            self._queues[id] = SubscriberQueue(
+                id, max_size=max_queue_size, overflow_policy=overflow_policy
+            )
         if id in self._subscribers:
             if append:
                 self._subscribers[id].append(callback)
@@ -128,20 +304,32 @@ class EventStream:
                 del self._subscribers[id]
 
     def add_event(self, event: Event, source: EventSource):
+        event._timestamp = datetime.now()  # type: ignore [attr-defined]
+        event._source = source  # type: ignore [attr-defined]
+        if self._compactor is not None:
+            # subscribers get the compact event as well
+            self._compactor.compact(event, self._blobs)
+        # ids are assigned and persisted under the lock, so that append-only logs
+        # receive events in id order
         with self._lock:
             event._id = self._cur_id  # type: ignore [attr-defined]
             self._cur_id += 1
-        logger.debug(f'Adding {type(event).__name__} id={event.id} from {source.name}')
-        event._timestamp = datetime.now()  # type: ignore [attr-defined]
-        event._source = source  # type: ignore [attr-defined]
-        data = event_to_dict(event)
-        if event.id is not None:
-            self._file_store.write(
-                self._get_filename_for_id(event.id), json.dumps(data)
+            logger.debug(
+                f'Adding {type(event).__name__} id={event.id} from {source.name}'
             )
-        for stack in self._subscribers.values():
-            callback = stack[-1]
-            asyncio.create_task(callback(event))
+            data = event_to_dict(event)
+            content = json.dumps(data)
+            self._log.append(event.id, content)
+            # cache a decoded copy: the caller keeps ownership of the original object
+            self._cache.put(event.id, self._from_dict(data), len(content))
+            if self._type_index is not None:
+                self._type_index.setdefault((type(event), source), []).append(event.id)
+        for id, stack in list(self._subscribers.items()):
+            self._queues[id].put(event, stack[-1])
+
+    def get_subscriber_stats(self) -> dict[str, dict]:
+        """Returns the queue depth, lag and drop counts of each subscriber."""
+        return {id: queue.stats() for id, queue in self._queues.items()}
 
     def filtered_events_by_source(self, source: EventSource):
         for event in self.get_events():
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from opendevin.core.logger import opendevin_logger as logger
+
+# completion arguments that don't change the response
+_IGNORED_KWARGS = {
+    'api_key',
+    'timeout',
+    'drop_params',
+    'aws_access_key_id',
+    'aws_secret_access_key',
+}
+
+
+class CompletionCache:
+    """A cache of LLM completions, keyed on the request.
+
+    Responses are kept in an in-memory LRU, backed by an optional SQLite file so that
+    they persist across runs. The file can be shared by several processes (e.g. the
+    evaluation workers): each process opens its own connection, and SQLite serializes
+    the writes.
+
+    Entries are (response, cost) pairs, where the cost is what the original request was
+    billed, so that a hit can be reported as a saving.
+    """
+
+    def __init__(self, path: str | None = None, max_entries: int = 1000):
+        """Initializes the cache.
+
+        Args:
+            path: The SQLite file to persist the completions to, or None to keep them in memory only.
+            max_entries: The maximum number of completions kept in memory.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._conn_pid: int | None = None
+
+    @staticmethod
+    def make_key(*args, **kwargs) -> str:
+        """Returns the cache key for the arguments of a completion call."""
+        request = {k: v for k, v in kwargs.items() if k not in _IGNORED_KWARGS}
+        serialized = json.dumps([args, request], sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        # a connection must not be shared with a forked process
+        if self._conn is None or self._conn_pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS completions '
+                '(key TEXT PRIMARY KEY, response TEXT NOT NULL, cost REAL NOT NULL, created REAL NOT NULL)'
+            )
+            conn.commit()
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, entry: tuple[dict, float]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> tuple[dict, float] | None:
+        """Returns the cached (response, cost) for the key, or None."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            try:
+                conn = self._connection()
+                if conn is None:
+                    return None
+                row = conn.execute(
+                    'SELECT response, cost FROM completions WHERE key = ?', (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f'Could not read from the completion cache: {e}')
+                return None
+            if row is None:
+                return None
+            entry = (json.loads(row[0]), row[1])
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key: str, response: dict, cost: float) -> None:
+        """Stores a response, and the cost it was billed, under the key."""
+        with self._lock:
+            self._remember(key, (response, cost))
+            try:
+                conn = self._connection()
+                if conn is None:
+                    return
+                with conn:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?)',
+                        (key, json.dumps(response, default=str), cost, time.time()),
+                    )
+            except sqlite3.Error as e:
+                logger.warning(f'Could not write to the completion cache: {e}')
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            try:
+                conn = self._connection()
+                if conn is not None:
+                    with conn:
+                        conn.execute('DELETE FROM completions')
+            except sqlite3.Error as e:
+                logger.warning(f'Could not clear the completion cache: {e}')
+
+
+_caches: dict[str | None, CompletionCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_completion_cache(path: str | None = None) -> CompletionCache:
+    """Returns the cache for the path, shared by all the LLMs in this process."""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = CompletionCache(path)
+        return _caches[path]
@@ -30,6 +30,7 @@ from opendevin.core.exceptions import UserCancelledError
 from opendevin.core.logger import llm_prompt_logger, llm_response_logger
 from opendevin.core.logger import opendevin_logger as logger
 from opendevin.core.metrics import Metrics
+from opendevin.llm.cache import CompletionCache, get_completion_cache
 
 __all__ = ['LLM']
 
@@ -62,6 +63,8 @@ class LLM:
         # Set up config attributes with default values to prevent AttributeError
         LLMConfig.set_missing_attributes(self.config)
 
+        # the max input tokens of the model, if configured or known to litellm
+        self.input_token_limit: int | None
         # litellm actually uses base Exception here for unknown model
         self.model_info = None
         try:
@@ -83,9 +86,14 @@ class LLM:
                 and isinstance(self.model_info['max_input_tokens'], int)
             ):
                 self.config.max_input_tokens = self.model_info['max_input_tokens']
+                self.input_token_limit = self.config.max_input_tokens
             else:
                 # Max input tokens for gpt3.5, so this is a safe fallback for any potentially viable model
                 self.config.max_input_tokens = 4096
+                # the fallback is only a guess: the model's actual limit is not known
+                self.input_token_limit = None
+        else:
+            self.input_token_limit = self.config.max_input_tokens
 
         if self.config.max_output_tokens is None:
             if (
@@ -101,6 +109,12 @@ class LLM:
         if self.config.drop_params:
             litellm.drop_params = self.config.drop_params
 
+        self.completion_cache: CompletionCache | None = None
+        if self.config.completion_cache:
+            self.completion_cache = get_completion_cache(
+                self.config.completion_cache_file
+            )
+
         self._completion = partial(
             litellm_completion,
             model=self.config.model,
@@ -157,8 +171,17 @@ class LLM:
                     debug_message += message_separator + message['content']
             llm_prompt_logger.debug(debug_message)
 
+            cache_key = None
+            if debug_message and self.completion_cache is not None:
+                cache_key = self.completion_cache.make_key(
+                    *args, **{**completion_unwrapped.keywords, **kwargs}
+                )
+            cached_resp = self._get_cached_completion(cache_key)
+
             # skip if messages is empty (thus debug_message is empty)
-            if debug_message:
+            if cached_resp is not None:
+                resp = cached_resp
+            elif debug_message:
                 resp = completion_unwrapped(*args, **kwargs)
             else:
                 resp = {'choices': [{'message': {'content': ''}}]}
@@ -168,7 +191,9 @@ class LLM:
             llm_response_logger.debug(message_back)
 
             # post-process to log costs
-            self._post_completion(resp)
+            if cached_resp is None:
+                cost = self._post_completion(resp)
+                self._cache_completion(cache_key, resp, cost)
 
             return resp
 
@@ -234,6 +259,22 @@ class LLM:
                         raise UserCancelledError('LLM request cancelled by user')
                     await asyncio.sleep(0.1)
 
+            cache_key = None
+            if (
+                debug_message
+                and self.completion_cache is not None
+                and not kwargs.get('stream', False)
+            ):
+                cache_key = self.completion_cache.make_key(
+                    *args, **{**async_completion_unwrapped.keywords, **kwargs}
+                )
+            cached_resp = self._get_cached_completion(cache_key)
+            if cached_resp is not None:
+                llm_response_logger.debug(
+                    cached_resp['choices'][0]['message']['content']
+                )
+                return cached_resp
+
             stop_check_task = asyncio.create_task(check_stopped())
 
             try:
@@ -246,7 +287,8 @@ class LLM:
                     llm_response_logger.debug(message_back)
                 else:
                     resp = {'choices': [{'message': {'content': ''}}]}
-                self._post_completion(resp)
+                cost = self._post_completion(resp)
+                self._cache_completion(cache_key, resp, cost)
 
                 # We do not support streaming in this method, thus return resp
                 return resp
@@ -307,6 +349,8 @@ class LLM:
                 debug_message += message_separator + message['content']
             llm_prompt_logger.debug(debug_message)
 
+            chunks = []
+            resp = None
             try:
                 # Directly call and await litellm_acompletion
                 resp = await async_completion_unwrapped(*args, **kwargs)
@@ -325,7 +369,7 @@ class LLM:
                     # with streaming, it is "delta", not "message"!
                     message_back = chunk['choices'][0]['delta']['content']
                     llm_response_logger.debug(message_back)
-                    self._post_completion(chunk)
+                    chunks.append(chunk)
 
                     yield chunk
 
@@ -345,6 +389,12 @@ class LLM:
                 raise
 
             finally:
+                # end the request, if the caller stopped reading before the end of the response
+                if resp is not None and hasattr(resp, 'aclose'):
+                    await resp.aclose()
+                # the cost is for the whole response, up to where the caller stopped reading
+                if chunks:
+                    self._post_streaming_completion(chunks, messages)
                 if kwargs.get('stream', False):
                     await asyncio.sleep(0.1)
 
@@ -378,8 +428,8 @@ class LLM:
         """
         return self._async_streaming_completion
 
-    def _post_completion(self, response: str) -> None:
-        """Post-process the completion response."""
+    def _post_completion(self, response) -> float:
+        """Post-process the completion response. Returns its cost."""
         try:
             cur_cost = self.completion_cost(response)
         except Exception:
@@ -390,6 +440,40 @@ class LLM:
                 cur_cost,
                 self.metrics.accumulated_cost,
             )
+        return cur_cost
+
+    def _get_cached_completion(self, cache_key: str | None):
+        """Returns the cached response for the key, if any, and counts the hit."""
+        if cache_key is None or self.completion_cache is None:
+            return None
+        cached = self.completion_cache.get(cache_key)
+        if cached is None:
+            return None
+        response, cost = cached
+        self.metrics.add_cache_hit(cost)
+        logger.info(
+            'Completion served from the cache | Saved Cost: %.2f USD | Cache Hits: %d',
+            cost,
+            self.metrics.cache_hits,
+        )
+        return litellm.ModelResponse(**response)
+
+    def _cache_completion(self, cache_key: str | None, response, cost: float) -> None:
+        if cache_key is None or self.completion_cache is None:
+            return
+        if hasattr(response, 'model_dump'):
+            response = response.model_dump()
+        self.completion_cache.put(cache_key, response, cost)
+
+    def _post_streaming_completion(self, chunks: list, messages: list) -> None:
+        """Post-process a streamed completion, from the chunks received."""
+        try:
+            response = litellm.stream_chunk_builder(chunks, messages=messages)
+        except Exception as e:
+            logger.debug(f'Could not rebuild the streamed response: {e}')
+            return
+        if response is not None:
+            self._post_completion(response)
 
     def get_token_count(self, messages):
         """Get the number of tokens in a list of messages.
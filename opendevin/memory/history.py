@@ -1,4 +1,5 @@
-from typing import ClassVar, Iterable
+import bisect
+from typing import ClassVar, Iterable, Iterator, Mapping
 
 from opendevin.core.logger import opendevin_logger as logger
 from opendevin.events.action.action import Action
@@ -18,6 +19,71 @@ from opendevin.events.serialization.event import event_to_dict
 from opendevin.events.stream import EventStream
 
 
+class DelegateRanges(Mapping[tuple[int, int], tuple[str, str]]):
+    """The (delegate_start, delegate_end) id ranges of the delegates of an agent.
+
+    Maps each range to the (agent, task) of its delegate. The events strictly inside
+    the ranges are kept as sorted, disjoint intervals, so that a range can be skipped
+    in one seek instead of checking every event against every range.
+    """
+
+    _ranges: dict[tuple[int, int], tuple[str, str]]
+    # hidden ids are [_starts[i], _ends[i]] inclusive, sorted and disjoint
+    _starts: list[int]
+    _ends: list[int]
+
+    def __init__(self):
+        self._ranges = {}
+        self._starts = []
+        self._ends = []
+
+    def __getitem__(self, key: tuple[int, int]) -> tuple[str, str]:
+        return self._ranges[key]
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return iter(self._ranges)
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def add(self, start: int, end: int, agent: str, task: str) -> None:
+        self._ranges[(start, end)] = (agent, task)
+        # the delegate action and observation themselves are not hidden
+        lo, hi = start + 1, end - 1
+        if lo > hi:
+            return
+        # merge with the intervals that overlap or touch [lo, hi]
+        i = bisect.bisect_left(self._ends, lo - 1)
+        j = bisect.bisect_right(self._starts, hi + 1)
+        if i < j:
+            lo = min(lo, self._starts[i])
+            hi = max(hi, self._ends[j - 1])
+        self._starts[i:j] = [lo]
+        self._ends[i:j] = [hi]
+
+    def contains(self, event_id: int) -> bool:
+        """Whether the event is inside a delegate range, i.e. from a delegate."""
+        i = bisect.bisect_right(self._starts, event_id) - 1
+        return i >= 0 and event_id <= self._ends[i]
+
+    def visible_ranges(
+        self, start_id: int, end_id: int, reverse: bool = False
+    ) -> list[tuple[int, int]]:
+        """Split [start_id, end_id] into the inclusive id ranges outside delegate ranges."""
+        ranges = []
+        lo = start_id
+        i = bisect.bisect_right(self._ends, start_id - 1)
+        while lo <= end_id:
+            if i >= len(self._starts) or self._starts[i] > end_id:
+                ranges.append((lo, end_id))
+                break
+            if self._starts[i] > lo:
+                ranges.append((lo, self._starts[i] - 1))
+            lo = self._ends[i] + 1
+            i += 1
+        return list(reversed(ranges)) if reverse else ranges
+
+
 class ShortTermHistory(list[Event]):
     """A list of events that represents the short-term memory of the agent.
 
@@ -27,7 +93,9 @@ class ShortTermHistory(list[Event]):
     start_id: int
     end_id: int
     _event_stream: EventStream
-    delegates: dict[tuple[int, int], tuple[str, str]]
+    delegates: DelegateRanges
+    # (id, agent, task) of the delegate actions that have not finished yet
+    _delegate_starts: list[tuple[int, str, str]]
     filter_out: ClassVar[tuple[type[Event], ...]] = (
         NullAction,
         NullObservation,
@@ -39,45 +107,88 @@ class ShortTermHistory(list[Event]):
         super().__init__()
         self.start_id = -1
         self.end_id = -1
-        self.delegates = {}
+        self.delegates = DelegateRanges()
+        self._delegate_starts = []
 
     def set_event_stream(self, event_stream: EventStream):
         self._event_stream = event_stream
 
+    def get_latest_event_id(self) -> int:
+        """Return the id of the latest event of the history, or -1 if there is none yet."""
+        if self.end_id != -1:
+            return self.end_id
+        # a history restored from a session has no event stream until it is set
+        event_stream = getattr(self, '_event_stream', None)
+        return event_stream.get_latest_event_id() if event_stream is not None else -1
+
     def get_events_as_list(self) -> list[Event]:
         """Return the history as a list of Event objects."""
         return list(self.get_events())
 
-    def get_events(self, reverse: bool = False) -> Iterable[Event]:
-        """Return the events as a stream of Event objects."""
+    def get_events(
+        self, reverse: bool = False, start_id: int | None = None
+    ) -> Iterable[Event]:
+        """Return the events as a stream of Event objects.
+
+        If start_id is given, events before it are skipped (but never events before the start of the history).
+        """
         # TODO handle AgentRejectAction, if it's not part of a chunk ending with an AgentDelegateObservation
         # or even if it is, because currently we don't add it to the summary
 
         # iterate from start_id to end_id, or reverse
-        start_id = self.start_id if self.start_id != -1 else 0
+        history_start_id = self.start_id if self.start_id != -1 else 0
+        start_id = (
+            history_start_id if start_id is None else max(start_id, history_start_id)
+        )
+        end_id = (
+            self.end_id
+            if self.end_id != -1
+            else self._event_stream.get_latest_event_id()
+        )
+
+        # TODO add summaries
+        # and filter out events that were included in a summary
+
+        # skip the events from the delegates of the current agent, range by range
+        for range_start, range_end in self.delegates.visible_ranges(
+            start_id, end_id, reverse=reverse
+        ):
+            yield from self._event_stream.get_events(
+                start_id=range_start,
+                end_id=range_end,
+                reverse=reverse,
+                filter_out_type=self.filter_out,
+            )
+
+    def get_events_by_type(
+        self,
+        types: tuple[type[Event], ...],
+        source: EventSource | None = None,
+        start_id: int | None = None,
+        reverse: bool = False,
+    ) -> Iterable[Event]:
+        """Return the events of the given types (and source) in the history, skipping all others without reading them."""
+        history_start_id = self.start_id if self.start_id != -1 else 0
+        start_id = (
+            history_start_id if start_id is None else max(start_id, history_start_id)
+        )
         end_id = (
             self.end_id
             if self.end_id != -1
             else self._event_stream.get_latest_event_id()
         )
 
-        for event in self._event_stream.get_events(
+        for event in self._event_stream.get_events_by_type(
+            types,
+            source=source,
             start_id=start_id,
             end_id=end_id,
             reverse=reverse,
-            filter_out_type=self.filter_out,
+            exclude_types=self.filter_out,
         ):
-            # TODO add summaries
-            # and filter out events that were included in a summary
-
-            # filter out the events from a delegate of the current agent
-            if not any(
-                # except for the delegate action and observation themselves, currently
-                # AgentDelegateAction has id = delegate_start
-                # AgentDelegateObservation has id = delegate_end
-                delegate_start < event.id < delegate_end
-                for delegate_start, delegate_end in self.delegates.keys()
-            ):
+            # AgentDelegateAction has id = delegate_start and
+            # AgentDelegateObservation has id = delegate_end, they are not hidden
+            if not self.delegates.contains(event.id):
                 yield event
 
     def get_last_action(self, end_id: int = -1) -> Action | None:
@@ -85,63 +196,46 @@ class ShortTermHistory(list[Event]):
         # from end_id in reverse, find the first action
         end_id = self._event_stream.get_latest_event_id() if end_id == -1 else end_id
 
-        last_action = next(
-            (
-                event
-                for event in self._event_stream.get_events(
-                    end_id=end_id, reverse=True, filter_out_type=self.filter_out
-                )
-                if isinstance(event, Action)
-            ),
-            None,
+        last_action = self._event_stream.get_latest_event_of_type(
+            (Action,), end_id=end_id, exclude_types=self.filter_out
         )
 
-        return last_action
+        return last_action if isinstance(last_action, Action) else None
 
     def get_last_observation(self, end_id: int = -1) -> Observation | None:
         """Return the last observation from the event stream, filtered to exclude unwanted events."""
         # from end_id in reverse, find the first observation
         end_id = self._event_stream.get_latest_event_id() if end_id == -1 else end_id
 
-        last_observation = next(
-            (
-                event
-                for event in self._event_stream.get_events(
-                    end_id=end_id, reverse=True, filter_out_type=self.filter_out
-                )
-                if isinstance(event, Observation)
-            ),
-            None,
+        last_observation = self._event_stream.get_latest_event_of_type(
+            (Observation,), end_id=end_id, exclude_types=self.filter_out
         )
 
-        return last_observation
+        return last_observation if isinstance(last_observation, Observation) else None
 
     def get_last_user_message(self) -> str:
         """Return the content of the last user message from the event stream."""
-        last_user_message = next(
-            (
-                event.content
-                for event in self._event_stream.get_events(reverse=True)
-                if isinstance(event, MessageAction) and event.source == EventSource.USER
-            ),
-            None,
+        last_user_message = self._event_stream.get_latest_event_of_type(
+            (MessageAction,), source=EventSource.USER
         )
 
-        return last_user_message if last_user_message is not None else ''
+        return (
+            last_user_message.content
+            if isinstance(last_user_message, MessageAction)
+            else ''
+        )
 
     def get_last_agent_message(self) -> str:
         """Return the content of the last agent message from the event stream."""
-        last_agent_message = next(
-            (
-                event.content
-                for event in self._event_stream.get_events(reverse=True)
-                if isinstance(event, MessageAction)
-                and event.source == EventSource.AGENT
-            ),
-            None,
+        last_agent_message = self._event_stream.get_latest_event_of_type(
+            (MessageAction,), source=EventSource.AGENT
         )
 
-        return last_agent_message if last_agent_message is not None else ''
+        return (
+            last_agent_message.content
+            if isinstance(last_agent_message, MessageAction)
+            else ''
+        )
 
     def get_last_events(self, n: int) -> list[Event]:
         """Return the last n events from the event stream."""
@@ -160,12 +254,18 @@ class ShortTermHistory(list[Event]):
         )
 
     def has_delegation(self) -> bool:
-        for event in self._event_stream.get_events():
-            if isinstance(event, AgentDelegateObservation):
-                return True
-        return False
+        return (
+            self._event_stream.get_latest_event_of_type((AgentDelegateObservation,))
+            is not None
+        )
 
     def on_event(self, event: Event):
+        if isinstance(event, AgentDelegateAction):
+            # remember where the delegate starts, to close its range on its observation
+            self._delegate_starts.append(
+                (event.id, event.agent, event.inputs.get('task', ''))
+            )
+            return
         if not isinstance(event, AgentDelegateObservation):
             return
 
@@ -177,25 +277,23 @@ class ShortTermHistory(list[Event]):
         # in order to use later to exclude them from parent stream
         # or summarize them
         delegate_end = event.id
-        delegate_start = -1
-        delegate_agent: str = ''
-        delegate_task: str = ''
-        for prev_event in self._event_stream.get_events(
-            end_id=event.id - 1, reverse=True
-        ):
-            if isinstance(prev_event, AgentDelegateAction):
-                delegate_start = prev_event.id
-                delegate_agent = prev_event.agent
-                delegate_task = prev_event.inputs.get('task', '')
-                break
-
-        if delegate_start == -1:
-            logger.error(
-                f'No AgentDelegateAction found for AgentDelegateObservation with id={delegate_end}'
+        if self._delegate_starts:
+            delegate_start, delegate_agent, delegate_task = self._delegate_starts.pop()
+        else:
+            # the delegate action was not seen, e.g. in a restored session
+            delegate_action = self._event_stream.get_latest_event_of_type(
+                (AgentDelegateAction,), end_id=event.id - 1
             )
-            return
+            if not isinstance(delegate_action, AgentDelegateAction):
+                logger.error(
+                    f'No AgentDelegateAction found for AgentDelegateObservation with id={delegate_end}'
+                )
+                return
+            delegate_start = delegate_action.id
+            delegate_agent = delegate_action.agent
+            delegate_task = delegate_action.inputs.get('task', '')
 
-        self.delegates[(delegate_start, delegate_end)] = (delegate_agent, delegate_task)
+        self.delegates.add(delegate_start, delegate_end, delegate_agent, delegate_task)
         logger.debug(
             f'Delegate {delegate_agent} with task {delegate_task} ran from id={delegate_start} to id={delegate_end}'
         )
@@ -0,0 +1,169 @@
+from bisect import bisect_left
+from typing import Callable
+
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.events.event import Event
+from opendevin.memory.history import ShortTermHistory
+
+# the (approximate) number of tokens the environment reminder of the CodeAct agents adds
+# to the built messages
+REMINDER_TOKENS = 50
+
+
+class IncrementalMessageBuilder:
+    """Builds the LLM messages for an agent's history, converting each event only once.
+
+    The converted messages are kept between steps, and only the events added to the
+    history since the previous build are converted and appended. Consecutive messages
+    with the same role are merged, as the LLM APIs expect alternating roles.
+
+    The cached messages are rebuilt from scratch when they could be stale: a different
+    history or prefix, a moved history start, a new delegate range (its events are
+    hidden from the parent's history), or a history that went backwards.
+
+    With a token counter, the builder also keeps a token count per event (reused across
+    rebuilds while the event's message is unchanged) and running totals per message, so
+    that the newest history fitting a token budget is found without tokenizing it again.
+    """
+
+    _event_to_message: Callable[[Event], dict[str, str] | None]
+    _token_counter: Callable[[dict[str, str]], int] | None
+    _messages: list[dict[str, str]]
+    # running total of the token counts, up to and including each message
+    _cumulative_tokens: list[int]
+    # event id -> (hash of its message content, token count)
+    _event_tokens: dict[int, tuple[int, int]]
+    _prefix_len: int
+    _last_id: int
+    _history: ShortTermHistory | None
+    _key: tuple
+
+    def __init__(
+        self,
+        event_to_message: Callable[[Event], dict[str, str] | None],
+        token_counter: Callable[[dict[str, str]], int] | None = None,
+    ):
+        """Initializes the builder.
+
+        Parameters:
+        - event_to_message: converts an event into a message, or None to skip it
+        - token_counter: counts the tokens of a message; needed to build within a token budget
+        """
+        self._event_to_message = event_to_message
+        self._token_counter = token_counter
+        self.reset()
+
+    def reset(self) -> None:
+        self._messages = []
+        self._cumulative_tokens = []
+        self._event_tokens = {}
+        self._prefix_len = 0
+        self._last_id = -1
+        self._history = None
+        self._key = ()
+
+    def _cache_key(
+        self, history: ShortTermHistory, prefix: list[dict[str, str]], extra: tuple
+    ) -> tuple:
+        # delegate ranges are only ever added, so their count tells whether one was
+        return (history.start_id, history.end_id, len(history.delegates), extra, prefix)
+
+    def _count_tokens(
+        self, message: dict[str, str], event_id: int | None = None
+    ) -> int:
+        if self._token_counter is None:
+            return 0
+        if event_id is None:
+            return self._token_counter(message)
+        content_hash = hash(message['content'])
+        cached = self._event_tokens.get(event_id)
+        if cached is not None and cached[0] == content_hash:
+            return cached[1]
+        count = self._token_counter(message)
+        self._event_tokens[event_id] = (content_hash, count)
+        return count
+
+    def _append(self, message: dict[str, str], tokens: int) -> None:
+        total = self._cumulative_tokens[-1] if self._cumulative_tokens else 0
+        # there should not be two consecutive messages from the same role
+        # litellm.exceptions.BadRequestError: litellm.BadRequestError: OpenAIException - Error code: 400 - {'detail': 'Only supports u/a/u/a/u...'}
+        last_message = self._messages[-1] if self._messages else None
+        if last_message and last_message['role'] == message['role']:
+            last_message['content'] += '\n\n' + message['content']
+            # the counts of merged messages are summed, which slightly overestimates
+            self._cumulative_tokens[-1] = total + tokens
+        else:
+            self._messages.append(dict(message))
+            self._cumulative_tokens.append(total + tokens)
+
+    def build(
+        self,
+        history: ShortTermHistory,
+        prefix: list[dict[str, str]],
+        extra_key: tuple = (),
+        max_tokens: int | None = None,
+    ) -> list[dict[str, str]]:
+        """Return the prefix messages followed by the messages for the history.
+
+        Parameters:
+        - history: the agent's history
+        - prefix: messages that come before the history, e.g. the system message
+        - extra_key: anything else the conversion depends on; a change triggers a rebuild
+        - max_tokens: if set, the oldest history messages are left out until the messages fit.
+          The prefix, and any history merged into it (usually the task), are always kept.
+
+        The returned list is a copy, and can be changed by the caller. The messages in it
+        are shared with the builder, so callers must copy a message before changing it.
+        """
+        key = self._cache_key(history, prefix, extra_key)
+        if (
+            history is not self._history
+            or key != self._key
+            or history.get_latest_event_id() < self._last_id
+        ):
+            if self._history is not None:
+                logger.debug('Rebuilding the messages for the history from scratch')
+            self._history = history
+            self._key = key
+            self._messages = []
+            self._cumulative_tokens = []
+            for prefix_message in prefix:
+                self._append(prefix_message, self._count_tokens(prefix_message))
+            self._prefix_len = len(self._messages)
+            self._last_id = -1
+
+        for event in history.get_events(start_id=self._last_id + 1):
+            self._last_id = event.id
+            message = self._event_to_message(event)
+            if not message:
+                continue
+            self._append(message, self._count_tokens(message, event.id))
+
+        if max_tokens is None or self._token_counter is None:
+            return list(self._messages)
+        return self._fit(max_tokens)
+
+    def _fit(self, max_tokens: int) -> list[dict[str, str]]:
+        """Returns the kept head messages and the newest of the others that fit in max_tokens."""
+        total = self._cumulative_tokens[-1] if self._cumulative_tokens else 0
+        if total <= max_tokens:
+            return list(self._messages)
+
+        head = self._prefix_len
+        head_tokens = self._cumulative_tokens[head - 1] if head > 0 else 0
+        # the first message to keep is the one after the last message whose running
+        # total must be dropped to get under the budget
+        start = bisect_left(self._cumulative_tokens, total - max_tokens + head_tokens)
+        start = max(start + 1, head)
+        # the roles must keep alternating after the head, and the conversation can't
+        # start with an assistant message
+        last_role = self._messages[head - 1]['role'] if head > 0 else 'system'
+        while start < len(self._messages) and (
+            self._messages[start]['role'] == last_role
+            or (last_role == 'system' and self._messages[start]['role'] != 'user')
+        ):
+            start += 1
+        logger.debug(
+            f'Leaving out {start - head} of {len(self._messages) - head} messages to fit in {max_tokens} tokens'
+        )
+        return self._messages[:head] + self._messages[start:]
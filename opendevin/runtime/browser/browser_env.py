@@ -1,11 +1,15 @@
+import asyncio
 import atexit
 import base64
 import io
 import json
 import multiprocessing
+import multiprocessing.connection
 import os
-import time
+import threading
 import uuid
+from abc import abstractmethod
+from concurrent.futures import Future
 
 import browsergym.core  # noqa F401 (we register the openended task as a gym environment)
 import gymnasium as gym
@@ -15,34 +19,29 @@ import tenacity
 from browsergym.utils.obs import flatten_dom_to_str
 from PIL import Image
 
-from opendevin.core.exceptions import BrowserInitException
+from opendevin.core.exceptions import BrowserInitException, BrowserUnavailableException
 from opendevin.core.logger import opendevin_logger as logger
 
 
-class BrowserEnv:
-    def __init__(
-        self,
-        browsergym_eval: str = '',
-        browsergym_eval_save_dir: str = '',
-    ):
+class BrowserProcess:
+    """A browser, run by BrowserGym in a separate process.
+
+    Requests are sent to the process over a pipe, each with an id that its response
+    carries back. A reader thread waits on the pipe and resolves the request's future,
+    so there can be several requests in flight, from any thread or event loop: `_call`
+    blocks the calling thread, and `_acall` only suspends the calling coroutine.
+
+    Subclasses implement `browser_process`, which serves the requests in the process.
+    """
+
+    def __init__(self):
         self.html_text_converter = self.get_html_text_converter()
-        self.eval_mode = False
-        self.eval_dir = ''
-        # EVAL only: browsergym_eval and browsergym_eval_save_dir must be provided for evaluation
-        self.browsergym_eval = browsergym_eval
-        self.browsergym_eval_save_dir = browsergym_eval_save_dir
-        if self.browsergym_eval:
-            assert (
-                self.browsergym_eval_save_dir
-            ), 'browsergym_eval_save_dir must be provided for evaluation.'
-            self.eval_mode = True
-            self.eval_dir = os.path.join(
-                self.browsergym_eval_save_dir, self.browsergym_eval.split('/')[1]
-            )
-            os.makedirs(self.eval_dir, exist_ok=True)
         # Initialize browser environment process
         multiprocessing.set_start_method('spawn', force=True)
         self.browser_side, self.agent_side = multiprocessing.Pipe()
+        # the requests waiting for a response, by id
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
 
         try:
             self.original_cwd = os.getcwd()
@@ -91,97 +90,113 @@ class BrowserEnv:
         except Exception as e:
             logger.error(f'Failed to start browser process: {e}')
             raise
+        threading.Thread(
+            target=self._read_responses, args=(self.process,), daemon=True
+        ).start()
 
         if not self.check_alive():
             self.close()
             raise BrowserInitException('Failed to start browser environment.')
 
+    def __getstate__(self):
+        # the browser process gets the configuration and the pipe, not the requests
+        state = self.__dict__.copy()
+        state.pop('_pending', None)
+        state.pop('_lock', None)
+        return state
+
+    @abstractmethod
     def browser_process(self):
-        if self.eval_mode:
-            logger.info('Creating browser env for evaluation purpose.')
-            env = gym.make(self.browsergym_eval)
-        else:
-            env = gym.make(
-                'browsergym/openended',
-                task_kwargs={'start_url': 'about:blank', 'goal': 'PLACEHOLDER_GOAL'},
-                wait_for_user_message=False,
-                headless=True,
-                disable_env_checker=True,
-            )
-        obs, info = env.reset()
-        # EVAL only: save the goal into file for evaluation
-        if self.eval_mode:
-            rewards = []  # store rewards if in eval mode
-            logger.info(obs['goal'])
-            with open(
-                os.path.join(self.eval_dir, 'goal.txt'), 'w', encoding='utf-8'
-            ) as f:
-                f.write(obs['goal'])
-        logger.info('Browser env started.')
-        while True:
-            try:
-                if self.browser_side.poll(timeout=0.01):
-                    unique_request_id, action_data = self.browser_side.recv()
-                    # shutdown the browser environment
-                    if unique_request_id == 'SHUTDOWN':
-                        logger.info('SHUTDOWN recv, shutting down browser env...')
-                        env.close()
-                        return
-                    elif unique_request_id == 'IS_ALIVE':
-                        self.browser_side.send(('ALIVE', None))
-                        continue
-                    action = action_data['action']
-                    obs, reward, terminated, truncated, info = env.step(action)
-                    # EVAL only: save the rewards into file for evaluation
-                    if self.eval_mode:
-                        rewards.append(reward)
-                        with open(
-                            os.path.join(self.eval_dir, 'rewards.json'),
-                            'w',
-                            encoding='utf-8',
-                        ) as f:
-                            f.write(json.dumps(rewards))
-                    # add text content of the page
-                    html_str = flatten_dom_to_str(obs['dom_object'])
-                    obs['text_content'] = self.html_text_converter.handle(html_str)
-                    # make observation serializable
-                    obs['screenshot'] = self.image_to_png_base64_url(obs['screenshot'])
-                    obs['active_page_index'] = obs['active_page_index'].item()
-                    obs['elapsed_time'] = obs['elapsed_time'].item()
-                    self.browser_side.send((unique_request_id, obs))
-            except KeyboardInterrupt:
-                logger.info('Browser env process interrupted by user.')
-                try:
-                    env.close()
-                except Exception:
-                    pass
+        """Serves the requests sent over the pipe, in the browser process, until SHUTDOWN."""
+        pass
+
+    def _serializable_obs(self, obs: dict) -> dict:
+        # add text content of the page
+        html_str = flatten_dom_to_str(obs['dom_object'])
+        obs['text_content'] = self.html_text_converter.handle(html_str)
+        # make observation serializable
+        obs['screenshot'] = self.image_to_png_base64_url(obs['screenshot'])
+        obs['active_page_index'] = obs['active_page_index'].item()
+        obs['elapsed_time'] = obs['elapsed_time'].item()
+        return obs
+
+    def _read_responses(self, process: multiprocessing.Process) -> None:
+        """Resolves the pending requests with the responses of the browser process, until it exits."""
+        try:
+            while True:
+                ready = multiprocessing.connection.wait(
+                    [self.agent_side, process.sentinel]
+                )
+                # read what the process sent before it exited
+                while self.agent_side.poll():
+                    response_id, obs = self.agent_side.recv()
+                    with self._lock:
+                        future = self._pending.pop(response_id, None)
+                    if future is None:
+                        # the request timed out
+                        logger.debug(f'Dropping late browser response {response_id}')
+                    elif not future.done():
+                        future.set_result(obs)
+                if process.sentinel in ready:
+                    break
+        except (EOFError, OSError):
+            # the pipe was closed
+            pass
+        with self._lock:
+            if self.process is not process:
+                # the process was restarted, its requests are the new reader's
                 return
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(
+                    BrowserUnavailableException('Browser environment has exited.')
+                )
 
-    def step(self, action_str: str, timeout: float = 30) -> dict:
-        unique_request_id = str(uuid.uuid4())
-        self.agent_side.send((unique_request_id, {'action': action_str}))
-        start_time = time.time()
-        while True:
-            if time.time() - start_time > timeout:
-                raise TimeoutError('Browser environment took too long to respond.')
-            if self.agent_side.poll(timeout=0.01):
-                response_id, obs = self.agent_side.recv()
-                if response_id == unique_request_id:
-                    return obs
+    def _request(self, data: dict) -> tuple[str, Future]:
+        request_id = str(uuid.uuid4())
+        future: Future = Future()
+        with self._lock:
+            if not self.process.is_alive():
+                raise BrowserUnavailableException()
+            self._pending[request_id] = future
+            # a connection must not be written by several threads at once
+            self.agent_side.send((request_id, data))
+        return request_id, future
+
+    def _call(self, data: dict, timeout: float) -> dict:
+        request_id, future = self._request(data)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise TimeoutError('Browser environment took too long to respond.')
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
+
+    async def _acall(self, data: dict, timeout: float) -> dict:
+        request_id, future = self._request(data)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError('Browser environment took too long to respond.')
+        finally:
+            with self._lock:
+                self._pending.pop(request_id, None)
 
     def check_alive(self, timeout: float = 60):
-        self.agent_side.send(('IS_ALIVE', None))
-        if self.agent_side.poll(timeout=timeout):
-            response_id, _ = self.agent_side.recv()
-            if response_id == 'ALIVE':
-                return True
-            logger.info(f'Browser env is not alive. Response ID: {response_id}')
+        try:
+            return self._call({'is_alive': True}, timeout)['alive']
+        except Exception as e:
+            logger.info(f'Browser env is not alive: {e!r}')
+            return False
 
     def close(self):
         if not self.process.is_alive():
             return
         try:
-            self.agent_side.send(('SHUTDOWN', None))
+            with self._lock:
+                self.agent_side.send(('SHUTDOWN', None))
             self.process.join(5)  # Wait for the process to terminate
             if self.process.is_alive():
                 logger.error(
@@ -234,3 +249,97 @@ class BrowserEnv:
             if add_data_prefix
             else f'{image_base64}'
         )
+
+
+class BrowserEnv(BrowserProcess):
+    """A browser of its own, in a BrowserGym environment; see `BrowserProcess`.
+
+    `step` blocks the calling thread, and `astep` only suspends the calling coroutine.
+    """
+
+    def __init__(
+        self,
+        browsergym_eval: str = '',
+        browsergym_eval_save_dir: str = '',
+    ):
+        self.eval_mode = False
+        self.eval_dir = ''
+        # EVAL only: browsergym_eval and browsergym_eval_save_dir must be provided for evaluation
+        self.browsergym_eval = browsergym_eval
+        self.browsergym_eval_save_dir = browsergym_eval_save_dir
+        if self.browsergym_eval:
+            assert (
+                self.browsergym_eval_save_dir
+            ), 'browsergym_eval_save_dir must be provided for evaluation.'
+            self.eval_mode = True
+            self.eval_dir = os.path.join(
+                self.browsergym_eval_save_dir, self.browsergym_eval.split('/')[1]
+            )
+            os.makedirs(self.eval_dir, exist_ok=True)
+        super().__init__()
+
+    def browser_process(self):
+        if self.eval_mode:
+            logger.info('Creating browser env for evaluation purpose.')
+            env = gym.make(self.browsergym_eval)
+        else:
+            env = gym.make(
+                'browsergym/openended',
+                task_kwargs={'start_url': 'about:blank', 'goal': 'PLACEHOLDER_GOAL'},
+                wait_for_user_message=False,
+                headless=True,
+                disable_env_checker=True,
+            )
+        obs, info = env.reset()
+        # EVAL only: save the goal into file for evaluation
+        if self.eval_mode:
+            rewards = []  # store rewards if in eval mode
+            logger.info(obs['goal'])
+            with open(
+                os.path.join(self.eval_dir, 'goal.txt'), 'w', encoding='utf-8'
+            ) as f:
+                f.write(obs['goal'])
+        logger.info('Browser env started.')
+        while True:
+            try:
+                # wait for the next request, without polling
+                try:
+                    unique_request_id, action_data = self.browser_side.recv()
+                except EOFError:
+                    logger.info('Browser env pipe closed, shutting down browser env...')
+                    env.close()
+                    return
+                # shutdown the browser environment
+                if unique_request_id == 'SHUTDOWN':
+                    logger.info('SHUTDOWN recv, shutting down browser env...')
+                    env.close()
+                    return
+                elif action_data.get('is_alive'):
+                    self.browser_side.send((unique_request_id, {'alive': True}))
+                    continue
+                action = action_data['action']
+                obs, reward, terminated, truncated, info = env.step(action)
+                # EVAL only: save the rewards into file for evaluation
+                if self.eval_mode:
+                    rewards.append(reward)
+                    with open(
+                        os.path.join(self.eval_dir, 'rewards.json'),
+                        'w',
+                        encoding='utf-8',
+                    ) as f:
+                        f.write(json.dumps(rewards))
+                self.browser_side.send((unique_request_id, self._serializable_obs(obs)))
+            except KeyboardInterrupt:
+                logger.info('Browser env process interrupted by user.')
+                try:
+                    env.close()
+                except Exception:
+                    pass
+                return
+
+    def step(self, action_str: str, timeout: float = 30) -> dict:
+        return self._call({'action': action_str}, timeout)
+
+    async def astep(self, action_str: str, timeout: float = 30) -> dict:
+        """Performs a browser action like `step`, without blocking the event loop."""
+        return await self._acall({'action': action_str}, timeout)
@@ -0,0 +1,254 @@
+import atexit
+import threading
+import uuid
+from typing import Any
+
+import browsergym.core
+import gymnasium as gym
+import playwright.sync_api
+
+from opendevin.core.exceptions import BrowserInitException, BrowserUnavailableException
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.runtime.browser.browser_env import BrowserProcess
+
+
+class _SharedBrowser:
+    """A browser that BrowserGym can't close: it is shared by all the contexts."""
+
+    def __init__(self, browser: playwright.sync_api.Browser):
+        self._browser = browser
+
+    def close(self) -> None:
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+class _SharedChromium:
+    def __init__(self, browser: playwright.sync_api.Browser):
+        self._browser = browser
+
+    def launch(self, **kwargs) -> _SharedBrowser:
+        return _SharedBrowser(self._browser)
+
+
+class _SharedPlaywright:
+    """The Playwright instance given to BrowserGym, where launching Chromium returns the shared browser.
+
+    BrowserGym launches a browser for every environment (and another one for its chat);
+    with this, each of them only gets a new context of the shared browser.
+    """
+
+    def __init__(
+        self,
+        playwright: playwright.sync_api.Playwright,
+        browser: playwright.sync_api.Browser,
+    ):
+        self._playwright = playwright
+        self.chromium = _SharedChromium(browser)
+
+    def __getattr__(self, name):
+        return getattr(self._playwright, name)
+
+
+class BrowserHost(BrowserProcess):
+    """One browser process, whose Chromium is shared by many sessions.
+
+    Instead of a browser of its own, a session leases a context of the shared browser:
+    an isolated BrowserGym environment, with its own cookies, storage and pages, which
+    is closed when the lease is. At most `max_contexts` contexts are open at a time.
+
+    The contexts are driven by a single Playwright instance, so the host process
+    performs one browser action at a time; requests of all the leases are queued on the
+    pipe, in order.
+    """
+
+    def __init__(self, max_contexts: int = 8):
+        self.max_contexts = max_contexts
+        self._slots = threading.BoundedSemaphore(max_contexts)
+        self.leased = 0
+        self.leases = 0
+        self.rejected = 0
+        super().__init__()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_slots', None)
+        return state
+
+    def _start_browser(self) -> playwright.sync_api.Browser | None:
+        """Launches the shared browser, and makes BrowserGym use it."""
+        pw = playwright.sync_api.sync_playwright().start()
+        browser = pw.chromium.launch(headless=True)
+        browsergym.core._set_global_playwright(_SharedPlaywright(pw, browser))
+        return browser
+
+    def _open_env(self):
+        env = gym.make(
+            'browsergym/openended',
+            task_kwargs={'start_url': 'about:blank', 'goal': 'PLACEHOLDER_GOAL'},
+            wait_for_user_message=False,
+            headless=True,
+            disable_env_checker=True,
+        )
+        env.reset()
+        return env
+
+    def _close_env(self, context_id: str, env) -> None:
+        try:
+            env.close()
+        except Exception as e:
+            logger.error(f'Failed to close browser context {context_id}: {e}')
+
+    def browser_process(self):
+        browser = self._start_browser()
+        envs: dict = {}
+        logger.info('Browser host started.')
+        while True:
+            try:
+                try:
+                    request_id, data = self.browser_side.recv()
+                except EOFError:
+                    request_id, data = 'SHUTDOWN', None
+                if request_id == 'SHUTDOWN':
+                    logger.info('Shutting down browser host...')
+                    for context_id, env in envs.items():
+                        self._close_env(context_id, env)
+                    return
+                if data.get('is_alive'):
+                    self.browser_side.send((request_id, {'alive': True}))
+                    continue
+                response: dict[str, Any]
+                try:
+                    if 'open' in data:
+                        envs[data['open']] = self._open_env()
+                        response = {'opened': True}
+                    elif 'close' in data:
+                        env = envs.pop(data['close'], None)
+                        if env is not None:
+                            self._close_env(data['close'], env)
+                        response = {'closed': env is not None}
+                    else:
+                        env = envs[data['context']]
+                        obs, _, _, _, _ = env.step(data['action'])
+                        response = self._serializable_obs(obs)
+                except Exception as e:
+                    logger.error(f'Browser host request failed: {e!r}')
+                    response = {'error': f'{type(e).__name__}: {e}'}
+                self.browser_side.send((request_id, response))
+                if browser is not None and not browser.is_connected():
+                    # the leases fail, and the next one starts a new host
+                    logger.error('The shared browser has crashed, exiting...')
+                    return
+            except KeyboardInterrupt:
+                logger.info('Browser host process interrupted by user.')
+                return
+
+    def lease(self, timeout: float = 30) -> 'BrowserContextLease':
+        """Opens a new context, waiting up to timeout for one to be closed if all are in use.
+
+        Raises BrowserInitException if no context could be opened.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise BrowserInitException(
+                f'All {self.max_contexts} browser contexts are in use'
+            )
+        context_id = uuid.uuid4().hex
+        try:
+            response = self._call({'open': context_id}, timeout=60)
+        except Exception as e:
+            # the context may still be opened, once the host gets to it
+            try:
+                self._request({'close': context_id})
+            except BrowserUnavailableException:
+                pass
+            self._slots.release()
+            raise BrowserInitException(f'Failed to open a browser context: {e}')
+        if 'error' in response:
+            self._slots.release()
+            raise BrowserInitException(
+                f'Failed to open a browser context: {response["error"]}'
+            )
+        with self._lock:
+            self.leased += 1
+            self.leases += 1
+        return BrowserContextLease(self, context_id)
+
+    def _release(self, context_id: str) -> None:
+        try:
+            if self.process.is_alive():
+                self._call({'close': context_id}, timeout=30)
+        except Exception as e:
+            logger.error(f'Failed to close browser context {context_id}: {e}')
+        finally:
+            with self._lock:
+                self.leased -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_contexts': self.max_contexts,
+                'leased': self.leased,
+                'leases': self.leases,
+                'rejected': self.rejected,
+            }
+
+
+class BrowserContextLease:
+    """A context of a BrowserHost, with the interface of a BrowserEnv."""
+
+    def __init__(self, host: BrowserHost, context_id: str):
+        self.host = host
+        self.context_id = context_id
+        self._closed = False
+
+    def _check_response(self, response: dict) -> dict:
+        if 'error' in response:
+            raise BrowserUnavailableException(response['error'])
+        return response
+
+    def step(self, action_str: str, timeout: float = 30) -> dict:
+        return self._check_response(
+            self.host._call({'context': self.context_id, 'action': action_str}, timeout)
+        )
+
+    async def astep(self, action_str: str, timeout: float = 30) -> dict:
+        return self._check_response(
+            await self.host._acall(
+                {'context': self.context_id, 'action': action_str}, timeout
+            )
+        )
+
+    def check_alive(self, timeout: float = 60) -> bool:
+        return not self._closed and self.host.check_alive(timeout)
+
+    def close(self) -> None:
+        """Closes the context; the host and the other contexts keep running."""
+        if self._closed:
+            return
+        self._closed = True
+        self.host._release(self.context_id)
+
+
+_host: BrowserHost | None = None
+_host_lock = threading.Lock()
+
+
+def get_browser_host(max_contexts: int) -> BrowserHost:
+    """Returns the browser host of the process, starting it (again) if needed."""
+    global _host
+    with _host_lock:
+        if _host is None or not _host.process.is_alive():
+            _host = BrowserHost(max_contexts)
+        return _host
+
+
+@atexit.register
+def _close_host() -> None:
+    with _host_lock:
+        if _host is not None:
+            _host.close()
@@ -5,10 +5,12 @@ from opendevin.core.schema import ActionType
 from opendevin.events.action import BrowseInteractiveAction, BrowseURLAction
 from opendevin.events.observation import BrowserOutputObservation
 from opendevin.runtime.browser.browser_env import BrowserEnv
+from opendevin.runtime.browser.browser_host import BrowserContextLease
 
 
 async def browse(
-    action: BrowseURLAction | BrowseInteractiveAction, browser: BrowserEnv | None
+    action: BrowseURLAction | BrowseInteractiveAction,
+    browser: BrowserEnv | BrowserContextLease | None,
 ) -> BrowserOutputObservation:
     if browser is None:
         raise BrowserUnavailableException()
@@ -29,7 +31,7 @@ async def browse(
 
     try:
         # obs provided by BrowserGym: see https://github.com/ServiceNow/BrowserGym/blob/main/core/src/browsergym/core/env.py#L396
-        obs = browser.step(action_str)
+        obs = await browser.astep(action_str)
         return BrowserOutputObservation(
             content=obs['text_content'],  # text content of the page
             open_pages_urls=obs['open_pages_urls'],  # list of open pages
@@ -11,15 +11,18 @@ You should add SANDBOX_UPDATE_SOURCE_CODE=True to any `python XXX.py` command yo
 
 import argparse
 import asyncio
+import functools
 import os
-import re
+import shlex
 import shutil
 import subprocess
+import tempfile
+import weakref
 from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Callable
 
-import pexpect
-from fastapi import FastAPI, HTTPException, Request, UploadFile
+from fastapi import FastAPI, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from uvicorn import run
@@ -52,6 +55,7 @@ from opendevin.runtime.plugins import (
 )
 from opendevin.runtime.server.files import insert_lines, read_lines
 from opendevin.runtime.utils import split_bash_commands
+from opendevin.runtime.utils.bash import BashSession, BashSessionPool
 
 
 class ActionRequest(BaseModel):
@@ -61,18 +65,35 @@ class ActionRequest(BaseModel):
 class RuntimeClient:
     """RuntimeClient is running inside docker sandbox.
     It is responsible for executing actions received from OpenDevin backend and producing observations.
+
+    Actions run concurrently, except those sharing a resource: the bash and Jupyter
+    sessions share the working directory and are used one action at a time, as is the
+    browser, and file actions on the same path are serialized. Blocking calls run in
+    worker threads, so that the server stays responsive while a command runs.
     """
 
     def __init__(
-        self, plugins_to_load: list[Plugin], work_dir: str, username: str, user_id: int
+        self,
+        plugins_to_load: list[Plugin],
+        work_dir: str,
+        username: str,
+        user_id: int,
+        shell_pool_size: int = 0,
     ) -> None:
         self.plugins_to_load = plugins_to_load
         self.username = username
         self.user_id = user_id
         self.pwd = work_dir  # current PWD
+        self.shell_pool_size = shell_pool_size
         self._init_user(self.username, self.user_id)
         self._init_bash_shell(self.pwd, self.username)
-        self.lock = asyncio.Lock()
+        # guards the bash and Jupyter sessions
+        self.session_lock = asyncio.Lock()
+        self.browser_lock = asyncio.Lock()
+        # a lock is dropped once no action holds or waits for it
+        self._path_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
         self.plugins: dict[str, Plugin] = {}
         self.browser = BrowserEnv()
 
@@ -127,54 +148,24 @@ class RuntimeClient:
         )
 
     def _init_bash_shell(self, work_dir: str, username: str) -> None:
-        self.shell = pexpect.spawn(
-            f'su - {username}',
-            encoding='utf-8',
-            echo=False,
-        )
-        self.__bash_PS1 = r'[PEXPECT_BEGIN] \u@\h:\w [PEXPECT_END]'
-
-        # This should NOT match "PS1=\u@\h:\w [PEXPECT]$" when `env` is executed
-        self.__bash_expect_regex = (
-            r'\[PEXPECT_BEGIN\] ([a-z0-9_-]*)@([a-zA-Z0-9.-]*):(.+) \[PEXPECT_END\]'
-        )
-
-        self.shell.sendline(f'export PS1="{self.__bash_PS1}"; export PS2=""')
-        self.shell.expect(self.__bash_expect_regex)
-
-        self.shell.sendline(f'cd {work_dir}')
-        self.shell.expect(self.__bash_expect_regex)
-        logger.debug(
-            f'Bash initialized. Working directory: {work_dir}. Output: {self.shell.before}'
-        )
-
-    def _get_bash_prompt_and_update_pwd(self):
-        ps1 = self.shell.after
-
-        # begin at the last occurence of '[PEXPECT_BEGIN]'.
-        # In multi-line bash commands, the prompt will be repeated
-        # and the matched regex captures all of them
-        # - we only want the last one (newest prompt)
-        _begin_pos = ps1.rfind('[PEXPECT_BEGIN]')
-        if _begin_pos != -1:
-            ps1 = ps1[_begin_pos:]
-
-        # parse the ps1 to get username, hostname, and working directory
-        matched = re.match(self.__bash_expect_regex, ps1)
-        assert (
-            matched is not None
-        ), f'Failed to parse bash prompt: {ps1}. This should not happen.'
-        username, hostname, working_dir = matched.groups()
-        self._prev_pwd = self.pwd
-        self.pwd = working_dir
-
-        # re-assemble the prompt
-        prompt = f'{username}@{hostname}:{working_dir} '
-        if username == 'root':
-            prompt += '#'
-        else:
-            prompt += '$'
-        return prompt + ' '
+        self.bash_session = BashSession(work_dir, username)
+
+        # extra shells for background commands, synced to the environment of the main
+        # shell through a snapshot file; the snapshot is taken lazily, and tagged with
+        # the number of commands the main shell had run
+        self.shell_pool: BashSessionPool | None = None
+        if self.shell_pool_size > 0:
+            self.shell_pool = BashSessionPool(self.shell_pool_size, work_dir, username)
+        self._env_generation = 0
+        self._env_snapshot: tuple[int, str] = (0, work_dir)
+        self._env_dir: str | None = None
+        if self.shell_pool is not None:
+            # the environment may hold secrets: the snapshot is in a directory only the
+            # user of the shells can read (mode 0700)
+            self._env_dir = tempfile.mkdtemp(prefix='opendevin_env_')
+            if username:
+                shutil.chown(self._env_dir, user=username)
+            self._env_file = os.path.join(self._env_dir, 'env.sh')
 
     def _execute_bash(
         self,
@@ -182,24 +173,73 @@ class RuntimeClient:
         timeout: int | None,
         keep_prompt: bool = True,
     ) -> tuple[str, int]:
-        logger.debug(f'Executing command: {command}')
-        self.shell.sendline(command)
-        self.shell.expect(self.__bash_expect_regex, timeout=timeout)
-
-        output = self.shell.before
-        if keep_prompt:
-            output += '\r\n' + self._get_bash_prompt_and_update_pwd()
-        logger.debug(f'Command output: {output}')
-
-        # Get exit code
-        self.shell.sendline('echo $?')
-        logger.debug(f'Executing command for exit code: {command}')
-        self.shell.expect(self.__bash_expect_regex, timeout=timeout)
-        _exit_code_output = self.shell.before
-        logger.debug(f'Exit code Output: {_exit_code_output}')
-        exit_code = int(_exit_code_output.strip().split()[0])
+        # the exit code and working directory come with the prompt, in one round-trip
+        output, exit_code = self.bash_session.execute(
+            command, timeout=timeout, keep_prompt=keep_prompt
+        )
+        self._prev_pwd = self.pwd
+        self.pwd = self.bash_session.pwd
+        self._env_generation += 1
         return output, exit_code
 
+    async def _sync_pool_session(self, session: BashSession) -> None:
+        """Brings a pool shell to the environment and working directory of the main one."""
+        assert self.shell_pool is not None
+        # while the main shell runs a command, its last snapshot is its latest state
+        if (
+            self._env_snapshot[0] != self._env_generation
+            and not self.session_lock.locked()
+        ):
+            async with self.session_lock:
+                generation, pwd = self._env_generation, self.pwd
+                env_file = shlex.quote(self._env_file)
+                # replaced at once, a pool shell never reads half a snapshot
+                await asyncio.to_thread(
+                    self.bash_session.execute,
+                    f'export -p > {env_file}.tmp && mv {env_file}.tmp {env_file}',
+                    timeout=60,
+                    keep_prompt=False,
+                )
+                self._env_snapshot = (generation, pwd)
+
+        generation, pwd = self._env_snapshot
+        if self.shell_pool.generation(session) != generation:
+            await asyncio.to_thread(
+                session.execute,
+                f'source {shlex.quote(self._env_file)} 2>/dev/null; cd {shlex.quote(pwd)}',
+                timeout=60,
+                keep_prompt=False,
+            )
+            self.shell_pool.set_generation(session, generation)
+
+    def _run_commands(
+        self, execute, commands: list[str], timeout: int
+    ) -> tuple[str, int]:
+        """Runs the commands one by one with `execute`, until one fails."""
+        all_output = ''
+        exit_code = 0
+        for command in commands:
+            output, exit_code = execute(command, timeout=timeout)
+            if all_output:
+                # previous output already exists with prompt "user@hostname:working_dir #""
+                # we need to add the command to the previous output,
+                # so model knows the following is the output of another action)
+                all_output = all_output.rstrip() + ' ' + command + '\r\n'
+
+            all_output += str(output) + '\r\n'
+            if exit_code != 0:
+                break
+        return all_output, exit_code
+
+    def path_lock(self, path: str) -> asyncio.Lock:
+        """Returns the lock serializing the file actions on the path."""
+        path = os.path.normpath(path)
+        lock = self._path_locks.get(path)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._path_locks[path] = lock
+        return lock
+
     async def run_action(self, action) -> Observation:
         action_type = action.action
         observation = await getattr(self, action_type)(action)
@@ -211,18 +251,24 @@ class RuntimeClient:
                 action.timeout is not None
             ), f'Timeout argument is required for CmdRunAction: {action}'
             commands = split_bash_commands(action.command)
-            all_output = ''
-            for command in commands:
-                output, exit_code = self._execute_bash(command, timeout=action.timeout)
-                if all_output:
-                    # previous output already exists with prompt "user@hostname:working_dir #""
-                    # we need to add the command to the previous output,
-                    # so model knows the following is the output of another action)
-                    all_output = all_output.rstrip() + ' ' + command + '\r\n'
-
-                all_output += str(output) + '\r\n'
-                if exit_code != 0:
-                    break
+
+            # a background command runs in a free pool shell, if there is one
+            session = None
+            if action.background and self.shell_pool is not None:
+                session = self.shell_pool.acquire()
+
+            if session is None:
+                async with self.session_lock:
+                    all_output, exit_code = await asyncio.to_thread(
+                        self._run_commands,
+                        self._execute_bash,
+                        commands,
+                        action.timeout,
+                    )
+            else:
+                all_output, exit_code = await self._run_in_pool(
+                    session, commands, action.timeout
+                )
             return CmdOutputObservation(
                 command_id=-1,
                 content=all_output.rstrip('\r\n'),
@@ -232,20 +278,45 @@ class RuntimeClient:
         except UnicodeDecodeError:
             raise RuntimeError('Command output could not be decoded as utf-8')
 
+    async def _run_in_pool(
+        self, session: BashSession, commands: list[str], timeout: int
+    ) -> tuple[str, int]:
+        assert self.shell_pool is not None
+        # a shell whose command timed out may still be busy, and a failed command may
+        # have left it in an unknown state (e.g. `set -e`, an unfinished heredoc)
+        discard = True
+        try:
+            await self._sync_pool_session(session)
+            all_output, exit_code = await asyncio.to_thread(
+                self._run_commands, session.execute, commands, timeout
+            )
+            discard = exit_code != 0
+            return all_output, exit_code
+        finally:
+            if discard:
+                # replace it, without waiting for the new one
+                asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(self.shell_pool.release, session, discard=True),
+                )
+            else:
+                self.shell_pool.release(session)
+
     async def run_ipython(self, action: IPythonRunCellAction) -> Observation:
         if 'jupyter' in self.plugins:
             _jupyter_plugin: JupyterPlugin = self.plugins['jupyter']  # type: ignore
 
-            # This is used to make AgentSkills in Jupyter aware of the
-            # current working directory in Bash
-            if not hasattr(self, '_prev_pwd') or self.pwd != self._prev_pwd:
-                reset_jupyter_pwd_code = (
-                    f'import os; os.environ["JUPYTER_PWD"] = "{self.pwd}"\n\n'
-                )
-                _aux_action = IPythonRunCellAction(code=reset_jupyter_pwd_code)
-                _ = await _jupyter_plugin.run(_aux_action)
+            async with self.session_lock:
+                # This is used to make AgentSkills in Jupyter aware of the
+                # current working directory in Bash
+                if not hasattr(self, '_prev_pwd') or self.pwd != self._prev_pwd:
+                    reset_jupyter_pwd_code = (
+                        f'import os; os.environ["JUPYTER_PWD"] = "{self.pwd}"\n\n'
+                    )
+                    _aux_action = IPythonRunCellAction(code=reset_jupyter_pwd_code)
+                    _ = await _jupyter_plugin.run(_aux_action)
 
-            obs: IPythonRunCellObservation = await _jupyter_plugin.run(action)
+                obs: IPythonRunCellObservation = await _jupyter_plugin.run(action)
             return obs
         else:
             raise RuntimeError(
@@ -253,11 +324,9 @@ class RuntimeClient:
             )
 
     def _get_working_directory(self):
-        # NOTE: this is part of initialization, so we hard code the timeout
-        result, exit_code = self._execute_bash('pwd', timeout=60, keep_prompt=False)
-        if exit_code != 0:
-            raise RuntimeError('Failed to get working directory')
-        return result.strip()
+        # the working directory of bash, as of its last prompt; it doesn't need the
+        # session, so file actions don't wait for a running command
+        return self.bash_session.pwd
 
     def _resolve_path(self, path: str, working_dir: str) -> str:
         filepath = Path(path)
@@ -271,8 +340,10 @@ class RuntimeClient:
         working_dir = self._get_working_directory()
         filepath = self._resolve_path(action.path, working_dir)
         try:
-            with open(filepath, 'r', encoding='utf-8') as file:
-                lines = read_lines(file.readlines(), action.start, action.end)
+            async with self.path_lock(filepath):
+                lines = await asyncio.to_thread(
+                    self._read_lines, filepath, action.start, action.end
+                )
         except FileNotFoundError:
             return ErrorObservation(
                 f'File not found: {filepath}. Your current working directory is {working_dir}.'
@@ -287,10 +358,17 @@ class RuntimeClient:
         code_view = ''.join(lines)
         return FileReadObservation(path=filepath, content=code_view)
 
+    def _read_lines(self, filepath: str, start: int, end: int) -> list[str]:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            return read_lines(file.readlines(), start, end)
+
     async def write(self, action: FileWriteAction) -> Observation:
         working_dir = self._get_working_directory()
         filepath = self._resolve_path(action.path, working_dir)
+        async with self.path_lock(filepath):
+            return await asyncio.to_thread(self._write, action, filepath)
 
+    def _write(self, action: FileWriteAction, filepath: str) -> Observation:
         insert = action.content.split('\n')
         try:
             if not os.path.exists(os.path.dirname(filepath)):
@@ -343,46 +421,30 @@ class RuntimeClient:
         return FileWriteObservation(content='', path=filepath)
 
     async def browse(self, action: BrowseURLAction) -> Observation:
-        return await browse(action, self.browser)
+        async with self.browser_lock:
+            return await browse(action, self.browser)
 
     async def browse_interactive(self, action: BrowseInteractiveAction) -> Observation:
-        return await browse(action, self.browser)
+        async with self.browser_lock:
+            return await browse(action, self.browser)
 
     def close(self):
-        self.shell.close()
+        self.bash_session.close()
+        if self.shell_pool is not None:
+            self.shell_pool.close()
+        if self._env_dir is not None:
+            shutil.rmtree(self._env_dir, ignore_errors=True)
         self.browser.close()
 
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser()
-    parser.add_argument('port', type=int, help='Port to listen on')
-    parser.add_argument('--working-dir', type=str, help='Working directory')
-    parser.add_argument('--plugins', type=str, help='Plugins to initialize', nargs='+')
-    parser.add_argument(
-        '--username', type=str, help='User to run as', default='opendevin'
-    )
-    parser.add_argument('--user-id', type=int, help='User ID to run as', default=1000)
-    # example: python client.py 8000 --working-dir /workspace --plugins JupyterRequirement
-    args = parser.parse_args()
-
-    plugins_to_load: list[Plugin] = []
-    if args.plugins:
-        for plugin in args.plugins:
-            if plugin not in ALL_PLUGINS:
-                raise ValueError(f'Plugin {plugin} not found')
-            plugins_to_load.append(ALL_PLUGINS[plugin]())  # type: ignore
-
+def create_app(make_client: Callable[[], RuntimeClient]) -> FastAPI:
+    """Returns the action execution API, serving the client made by make_client."""
     client: RuntimeClient | None = None
 
     @asynccontextmanager
     async def lifespan(app: FastAPI):
-        global client
-        client = RuntimeClient(
-            plugins_to_load,
-            work_dir=args.working_dir,
-            username=args.username,
-            user_id=args.user_id,
-        )
+        nonlocal client
+        client = make_client()
         await client.ainit()
         yield
         # Clean up & release the resources
@@ -390,13 +452,6 @@ if __name__ == '__main__':
 
     app = FastAPI(lifespan=lifespan)
 
-    @app.middleware('http')
-    async def one_request_at_a_time(request: Request, call_next):
-        assert client is not None
-        async with client.lock:
-            response = await call_next(request)
-        return response
-
     @app.post('/execute_action')
     async def execute_action(action_request: ActionRequest):
         assert client is not None
@@ -424,8 +479,11 @@ if __name__ == '__main__':
                 )
 
             full_dest_path = destination
-            if not os.path.exists(full_dest_path):
-                os.makedirs(full_dest_path, exist_ok=True)
+            await asyncio.to_thread(os.makedirs, full_dest_path, exist_ok=True)
+
+            def save(path: str) -> None:
+                with open(path, 'wb') as buffer:
+                    shutil.copyfileobj(file.file, buffer)
 
             if recursive:
                 # For recursive uploads, we expect a zip file
@@ -435,12 +493,16 @@ if __name__ == '__main__':
                     )
 
                 zip_path = os.path.join(full_dest_path, file.filename)
-                with open(zip_path, 'wb') as buffer:
-                    shutil.copyfileobj(file.file, buffer)
 
-                # Extract the zip file
-                shutil.unpack_archive(zip_path, full_dest_path)
-                os.remove(zip_path)  # Remove the zip file after extraction
+                def save_and_extract() -> None:
+                    save(zip_path)
+                    # Extract the zip file
+                    shutil.unpack_archive(zip_path, full_dest_path)
+                    os.remove(zip_path)  # Remove the zip file after extraction
+
+                # uploads to distinct paths run concurrently
+                async with client.path_lock(full_dest_path):
+                    await asyncio.to_thread(save_and_extract)
 
                 logger.info(
                     f'Uploaded file {file.filename} and extracted to {destination}'
@@ -448,8 +510,8 @@ if __name__ == '__main__':
             else:
                 # For single file uploads
                 file_path = os.path.join(full_dest_path, file.filename)
-                with open(file_path, 'wb') as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                async with client.path_lock(file_path):
+                    await asyncio.to_thread(save, file_path)
                 logger.info(f'Uploaded file {file.filename} to {destination}')
 
             return JSONResponse(
@@ -464,10 +526,57 @@ if __name__ == '__main__':
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
+    @app.get('/metrics')
+    async def metrics():
+        assert client is not None
+        return {
+            'shell_pool': client.shell_pool.stats()
+            if client.shell_pool is not None
+            else None
+        }
+
     @app.get('/alive')
     async def alive():
         return {'status': 'ok'}
 
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('port', type=int, help='Port to listen on')
+    parser.add_argument('--working-dir', type=str, help='Working directory')
+    parser.add_argument('--plugins', type=str, help='Plugins to initialize', nargs='+')
+    parser.add_argument(
+        '--username', type=str, help='User to run as', default='opendevin'
+    )
+    parser.add_argument('--user-id', type=int, help='User ID to run as', default=1000)
+    parser.add_argument(
+        '--shell-pool-size',
+        type=int,
+        help='Number of extra shells for background commands',
+        default=0,
+    )
+    # example: python client.py 8000 --working-dir /workspace --plugins JupyterRequirement
+    args = parser.parse_args()
+
+    plugins_to_load: list[Plugin] = []
+    if args.plugins:
+        for plugin in args.plugins:
+            if plugin not in ALL_PLUGINS:
+                raise ValueError(f'Plugin {plugin} not found')
+            plugins_to_load.append(ALL_PLUGINS[plugin]())  # type: ignore
+
+    app = create_app(
+        lambda: RuntimeClient(
+            plugins_to_load,
+            work_dir=args.working_dir,
+            username=args.username,
+            user_id=args.user_id,
+            shell_pool_size=args.shell_pool_size,
+        )
+    )
+
     logger.info(f'Starting action execution API on port {args.port}')
     print(f'Starting action execution API on port {args.port}')
     run(app, host='0.0.0.0', port=args.port)
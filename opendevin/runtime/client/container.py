@@ -0,0 +1,77 @@
+import docker
+
+from opendevin.core.config import AppConfig
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.runtime.plugins import PluginRequirement
+
+
+def start_runtime_container(
+    docker_client: docker.DockerClient,
+    config: AppConfig,
+    container_image: str,
+    container_name: str,
+    port: int,
+    sandbox_workspace_dir: str,
+    mount_dir: str | None = None,
+    plugins: list[PluginRequirement] | None = None,
+):
+    """Starts a container running the action execution server on the port.
+
+    Args:
+        docker_client: The docker client to start the container with.
+        config: The app config; the sandbox settings decide how the server runs.
+        container_image: The runtime image, with the server's source code.
+        container_name: The name of the container.
+        port: The port the server listens on.
+        sandbox_workspace_dir: The working directory in the container.
+        mount_dir: The host directory mounted as the working directory, if any.
+        plugins: The plugins the server initializes before it accepts actions.
+    """
+    logger.info(
+        f'Starting container with image: {container_image} and name: {container_name}'
+    )
+    plugin_arg = ''
+    if plugins is not None and len(plugins) > 0:
+        plugin_arg = f'--plugins {" ".join([plugin.name for plugin in plugins])} '
+
+    network_mode: str | None = None
+    port_mapping: dict[str, int] | None = None
+    if config.sandbox.use_host_network:
+        network_mode = 'host'
+        logger.warn(
+            'Using host network mode. If you are using MacOS, please make sure you have the latest version of Docker Desktop and enabled host network feature: https://docs.docker.com/network/drivers/host/#docker-desktop'
+        )
+    else:
+        port_mapping = {f'{port}/tcp': port}
+
+    if mount_dir is not None:
+        volumes = {mount_dir: {'bind': sandbox_workspace_dir, 'mode': 'rw'}}
+        logger.info(f'Mount dir: {sandbox_workspace_dir}')
+    else:
+        logger.warn(
+            'Mount dir is not set, will not mount the workspace directory to the container.'
+        )
+        volumes = None
+
+    logger.info(f'run_as_devin: `{config.run_as_devin}`')
+
+    return docker_client.containers.run(
+        container_image,
+        command=(
+            f'/opendevin/miniforge3/bin/mamba run --no-capture-output -n base '
+            'PYTHONUNBUFFERED=1 poetry run '
+            f'python -u -m opendevin.runtime.client.client {port} '
+            f'--working-dir {sandbox_workspace_dir} '
+            f'{plugin_arg}'
+            f'--username {"opendevin" if config.run_as_devin else "root"} '
+            f'--user-id {config.sandbox.user_id} '
+            f'--shell-pool-size {config.sandbox.shell_pool_size}'
+        ),
+        network_mode=network_mode,
+        ports=port_mapping,
+        working_dir='/opendevin/code/',
+        name=container_name,
+        detach=True,
+        environment={'DEBUG': 'true'} if config.debug else None,
+        volumes=volumes,
+    )
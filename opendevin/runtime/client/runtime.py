@@ -29,6 +29,8 @@ from opendevin.events.observation import (
 )
 from opendevin.events.serialization import event_to_dict, observation_from_dict
 from opendevin.events.serialization.action import ACTION_TYPE_TO_CLASS
+from opendevin.runtime.client.container import start_runtime_container
+from opendevin.runtime.client.warm_pool import WarmContainer, get_warm_pool
 from opendevin.runtime.plugins import PluginRequirement
 from opendevin.runtime.runtime import Runtime
 from opendevin.runtime.utils import find_available_tcp_port
@@ -74,19 +76,30 @@ class EventStreamRuntime(Runtime):
         self.action_semaphore = asyncio.Semaphore(1)  # Ensure one action at a time
 
     async def ainit(self, env_vars: dict[str, str] | None = None):
-        self.container_image = build_runtime_image(
-            self.container_image,
-            self.docker_client,
-            # NOTE: You can need set DEBUG=true to update the source code
-            # inside the container. This is useful when you want to test/debug the
-            # latest code in the runtime docker container.
-            update_source_code=self.config.sandbox.update_source_code,
-        )
-        self.container = await self._init_container(
-            self.sandbox_workspace_dir,
-            mount_dir=self.config.workspace_mount_path,
-            plugins=self.plugins,
-        )
+        # take a container from the warm pool if there is one, it's already initialized
+        warm = None
+        if self.config.sandbox.warm_pool_size > 0:
+            pool = await asyncio.to_thread(
+                get_warm_pool, self.config, self.container_image, self.plugins
+            )
+            warm = await asyncio.to_thread(pool.acquire)
+
+        if warm is not None:
+            await self._use_warm_container(warm)
+        else:
+            self.container_image = build_runtime_image(
+                self.container_image,
+                self.docker_client,
+                # NOTE: You can need set DEBUG=true to update the source code
+                # inside the container. This is useful when you want to test/debug the
+                # latest code in the runtime docker container.
+                update_source_code=self.config.sandbox.update_source_code,
+            )
+            self.container = await self._init_container(
+                self.sandbox_workspace_dir,
+                mount_dir=self.config.workspace_mount_path,
+                plugins=self.plugins,
+            )
         # MUST call super().ainit() to initialize both default env vars
         # AND the ones in env vars!
         await super().ainit(env_vars)
@@ -96,6 +109,15 @@ class EventStreamRuntime(Runtime):
         )
         logger.info(f'Container initialized with env vars: {env_vars}')
 
+    async def _use_warm_container(self, warm: WarmContainer):
+        self._port = warm.port
+        self.api_url = f'http://localhost:{self._port}'
+        self.container = warm.container
+        self.container_image = warm.image
+        # from now on the container is this session's, and is removed with it
+        await asyncio.to_thread(warm.container.rename, self.container_name)
+        logger.info(f'Using warm container. Server url: {self.api_url}')
+
     @staticmethod
     def _init_docker_client() -> docker.DockerClient:
         try:
@@ -117,54 +139,15 @@ class EventStreamRuntime(Runtime):
         plugins: list[PluginRequirement] | None = None,
     ):
         try:
-            logger.info(
-                f'Starting container with image: {self.container_image} and name: {self.container_name}'
-            )
-            plugin_arg = ''
-            if plugins is not None and len(plugins) > 0:
-                plugin_arg = (
-                    f'--plugins {" ".join([plugin.name for plugin in plugins])} '
-                )
-
-            network_mode: str | None = None
-            port_mapping: dict[str, int] | None = None
-            if self.config.sandbox.use_host_network:
-                network_mode = 'host'
-                logger.warn(
-                    'Using host network mode. If you are using MacOS, please make sure you have the latest version of Docker Desktop and enabled host network feature: https://docs.docker.com/network/drivers/host/#docker-desktop'
-                )
-            else:
-                port_mapping = {f'{self._port}/tcp': self._port}
-
-            if mount_dir is not None:
-                volumes = {mount_dir: {'bind': sandbox_workspace_dir, 'mode': 'rw'}}
-                logger.info(f'Mount dir: {sandbox_workspace_dir}')
-            else:
-                logger.warn(
-                    'Mount dir is not set, will not mount the workspace directory to the container.'
-                )
-                volumes = None
-
-            logger.info(f'run_as_devin: `{self.config.run_as_devin}`')
-
-            container = self.docker_client.containers.run(
+            container = start_runtime_container(
+                self.docker_client,
+                self.config,
                 self.container_image,
-                command=(
-                    f'/opendevin/miniforge3/bin/mamba run --no-capture-output -n base '
-                    'PYTHONUNBUFFERED=1 poetry run '
-                    f'python -u -m opendevin.runtime.client.client {self._port} '
-                    f'--working-dir {sandbox_workspace_dir} '
-                    f'{plugin_arg}'
-                    f'--username {"opendevin" if self.config.run_as_devin else "root"} '
-                    f'--user-id {self.config.sandbox.user_id}'
-                ),
-                network_mode=network_mode,
-                ports=port_mapping,
-                working_dir='/opendevin/code/',
-                name=self.container_name,
-                detach=True,
-                environment={'DEBUG': 'true'} if self.config.debug else None,
-                volumes=volumes,
+                self.container_name,
+                self._port,
+                sandbox_workspace_dir,
+                mount_dir=mount_dir,
+                plugins=plugins,
             )
             logger.info(f'Container started. Server url: {self.api_url}')
             return container
@@ -175,7 +158,6 @@ class EventStreamRuntime(Runtime):
             raise e
 
     async def _ensure_session(self):
-        await asyncio.sleep(1)
         if self.session is None or self.session.closed:
             self.session = aiohttp.ClientSession()
         return self.session
@@ -271,48 +253,53 @@ class EventStreamRuntime(Runtime):
         if action.timeout is None:
             action.timeout = self.config.sandbox.timeout
 
+        if isinstance(action, CmdRunAction) and action.background:
+            # a background command runs in a pool shell of the client, next to the
+            # actions in the main shell
+            return await self._execute_action(action)
         async with self.action_semaphore:
-            if not action.runnable:
-                return NullObservation('')
-            action_type = action.action  # type: ignore[attr-defined]
-            if action_type not in ACTION_TYPE_TO_CLASS:
-                return ErrorObservation(f'Action {action_type} does not exist.')
-            if not hasattr(self, action_type):
-                return ErrorObservation(
-                    f'Action {action_type} is not supported in the current runtime.'
-                )
-
-            logger.info('Awaiting session')
-            session = await self._ensure_session()
-            await self._wait_until_alive()
-
-            assert action.timeout is not None
+            return await self._execute_action(action)
+
+    async def _execute_action(self, action: Action) -> Observation:
+        if not action.runnable:
+            return NullObservation('')
+        action_type = action.action  # type: ignore[attr-defined]
+        if action_type not in ACTION_TYPE_TO_CLASS:
+            return ErrorObservation(f'Action {action_type} does not exist.')
+        if not hasattr(self, action_type):
+            return ErrorObservation(
+                f'Action {action_type} is not supported in the current runtime.'
+            )
 
-            try:
-                logger.info('Executing command')
-                async with session.post(
-                    f'{self.api_url}/execute_action',
-                    json={'action': event_to_dict(action)},
-                    timeout=action.timeout,
-                ) as response:
-                    if response.status == 200:
-                        output = await response.json()
-                        obs = observation_from_dict(output)
-                        obs._cause = action.id  # type: ignore[attr-defined]
-                        return obs
-                    else:
-                        error_message = await response.text()
-                        logger.error(f'Error from server: {error_message}')
-                        obs = ErrorObservation(
-                            f'Command execution failed: {error_message}'
-                        )
-            except asyncio.TimeoutError:
-                logger.error('No response received within the timeout period.')
-                obs = ErrorObservation('Command execution timed out')
-            except Exception as e:
-                logger.error(f'Error during command execution: {e}')
-                obs = ErrorObservation(f'Command execution failed: {str(e)}')
-            return obs
+        logger.info('Awaiting session')
+        session = await self._ensure_session()
+        await self._wait_until_alive()
+
+        assert action.timeout is not None
+
+        try:
+            logger.info('Executing command')
+            async with session.post(
+                f'{self.api_url}/execute_action',
+                json={'action': event_to_dict(action)},
+                timeout=action.timeout,
+            ) as response:
+                if response.status == 200:
+                    output = await response.json()
+                    obs = observation_from_dict(output)
+                    obs._cause = action.id  # type: ignore[attr-defined]
+                    return obs
+                else:
+                    error_message = await response.text()
+                    logger.error(f'Error from server: {error_message}')
+                    obs = ErrorObservation(f'Command execution failed: {error_message}')
+        except asyncio.TimeoutError:
+            logger.error('No response received within the timeout period.')
+            obs = ErrorObservation('Command execution timed out')
+        except Exception as e:
+            logger.error(f'Error during command execution: {e}')
+            obs = ErrorObservation(f'Command execution failed: {str(e)}')
+        return obs
 
     async def run(self, action: CmdRunAction) -> Observation:
         return await self.run_action(action)
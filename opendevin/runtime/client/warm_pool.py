@@ -0,0 +1,255 @@
+import atexit
+import copy
+import threading
+import time
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import docker
+
+from opendevin.core.config import AppConfig
+from opendevin.core.logger import opendevin_logger as logger
+from opendevin.runtime.client.container import start_runtime_container
+from opendevin.runtime.plugins import PluginRequirement
+from opendevin.runtime.utils import find_available_tcp_port
+from opendevin.runtime.utils.runtime_build import build_runtime_image
+
+# how long a new container may take to start its server and initialize the plugins
+STARTUP_TIMEOUT = 300.0
+
+
+@dataclass
+class WarmContainer:
+    container: docker.models.containers.Container
+    port: int
+    image: str
+
+
+def is_alive(port: int, timeout: float = 2.0) -> bool:
+    """Returns whether the action execution server on the port answers."""
+    try:
+        with urllib.request.urlopen(
+            f'http://localhost:{port}/alive', timeout=timeout
+        ) as response:
+            return response.status == 200
+    except Exception:
+        return False
+
+
+class WarmContainerPool:
+    """Runtime containers started ahead of time, so that a session doesn't wait for one.
+
+    The pool keeps `size` containers running, with the action execution server up and
+    the plugins initialized. A container serves a single session: once handed out, it
+    belongs to the session, which removes it when it closes, and a new one is started in
+    the background to take its place. Containers are never given back to the pool, so a
+    session sees nothing of the previous ones (processes, environment, files outside the
+    mounted workspace, browser state).
+
+    The pool can be used from any thread or event loop; containers are started by worker
+    threads.
+    """
+
+    container_name_prefix = 'opendevin-warm-'
+
+    def __init__(
+        self,
+        size: int,
+        config: AppConfig,
+        container_image: str,
+        plugins: list[PluginRequirement] | None = None,
+    ):
+        """Starts filling the pool.
+
+        Args:
+            size: The number of containers to keep ready.
+            config: The app config the containers are started with.
+            container_image: The base image, the runtime image is built from it once.
+            plugins: The plugins initialized in the containers.
+        """
+        self.size = size
+        self.config = copy.deepcopy(config)
+        self.container_image = container_image
+        self.plugins = plugins
+        self.docker_client = docker.from_env()
+        self._runtime_image: str | None = None
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._ready: list[WarmContainer] = []
+        self._starting = 0
+        self._closed = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix='warm-pool'
+        )
+        self.hits = 0
+        self.misses = 0
+        self.started = 0
+        self.failed = 0
+        self._refill()
+
+    def _refill(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            missing = max(self.size - len(self._ready) - self._starting, 0)
+            self._starting += missing
+        for _ in range(missing):
+            self._executor.submit(self._start_one)
+
+    def _build_image(self) -> str:
+        with self._build_lock:
+            if self._runtime_image is None:
+                self._runtime_image = build_runtime_image(
+                    self.container_image,
+                    self.docker_client,
+                    update_source_code=self.config.sandbox.update_source_code,
+                )
+            return self._runtime_image
+
+    def _start_one(self) -> None:
+        container = None
+        try:
+            image = self._build_image()
+            port = find_available_tcp_port()
+            container = start_runtime_container(
+                self.docker_client,
+                self.config,
+                image,
+                self.container_name_prefix + uuid.uuid4().hex,
+                port,
+                self.config.workspace_mount_path_in_sandbox,
+                mount_dir=self.config.workspace_mount_path,
+                plugins=self.plugins,
+            )
+            deadline = time.monotonic() + STARTUP_TIMEOUT
+            while not is_alive(port):
+                container.reload()
+                if container.status == 'exited':
+                    raise RuntimeError('The container exited')
+                if time.monotonic() > deadline:
+                    raise TimeoutError('The action execution server did not start')
+                time.sleep(0.5)
+        except Exception as e:
+            logger.error(f'Failed to start a warm runtime container: {e}')
+            if container is not None:
+                self._remove(container)
+            with self._lock:
+                self._starting -= 1
+                self.failed += 1
+                self._changed.notify_all()
+            return
+
+        with self._lock:
+            self._starting -= 1
+            self.started += 1
+            if not self._closed:
+                self._ready.append(WarmContainer(container, port, image))
+                self._changed.notify_all()
+                return
+        self._remove(container)
+
+    def acquire(self, timeout: float = STARTUP_TIMEOUT) -> WarmContainer | None:
+        """Takes a ready container, waiting for one being started if there is none.
+
+        Returns None if there is no container to be had; the caller then starts its own.
+        """
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                with self._lock:
+                    while not self._ready and self._starting and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or not self._changed.wait(remaining):
+                            break
+                    if not self._ready:
+                        self.misses += 1
+                        return None
+                    warm = self._ready.pop(0)
+
+                # the container may have died while it waited
+                if is_alive(warm.port):
+                    with self._lock:
+                        self.hits += 1
+                    return warm
+                logger.warning(
+                    f'Warm runtime container {warm.container.name} is not alive, discarding it'
+                )
+                self._remove(warm.container)
+                self._refill()
+        finally:
+            self._refill()
+
+    def _remove(self, container) -> None:
+        try:
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        except Exception as e:
+            logger.error(f'Failed to remove warm runtime container: {e}')
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'ready': len(self._ready),
+                'starting': self._starting,
+                'hits': self.hits,
+                'misses': self.misses,
+                'started': self.started,
+                'failed': self.failed,
+            }
+
+    def close(self) -> None:
+        """Removes the containers that weren't handed out, and stops refilling."""
+        with self._lock:
+            self._closed = True
+            ready, self._ready = self._ready, []
+            self._changed.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for warm in ready:
+            self._remove(warm.container)
+
+
+_pools: dict[tuple, WarmContainerPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_warm_pool(
+    config: AppConfig,
+    container_image: str,
+    plugins: list[PluginRequirement] | None = None,
+) -> WarmContainerPool:
+    """Returns the pool of containers for the settings, shared by the whole process.
+
+    Containers are interchangeable only if they were started the same way, so there
+    is a pool for each image, workspace, user and plugins.
+    """
+    key = (
+        container_image,
+        config.sandbox.update_source_code,
+        config.workspace_mount_path,
+        config.workspace_mount_path_in_sandbox,
+        config.run_as_devin,
+        config.debug,
+        config.sandbox.user_id,
+        config.sandbox.use_host_network,
+        config.sandbox.shell_pool_size,
+        tuple(plugin.name for plugin in plugins or []),
+    )
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = WarmContainerPool(
+                config.sandbox.warm_pool_size, config, container_image, plugins
+            )
+        return _pools[key]
+
+
+@atexit.register
+def _close_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
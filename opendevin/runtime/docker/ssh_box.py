@@ -22,6 +22,10 @@ from opendevin.runtime.sandbox import Sandbox
 from opendevin.runtime.utils import find_available_tcp_port, split_bash_commands
 from opendevin.runtime.utils.image_agnostic import get_od_sandbox_image
 
+# the prompt of the SSH session, with the exit code of the last command
+SSH_PS1 = r'[PEXPECT_EXIT_CODE=\$?][PEXPECT]\$ '
+SSH_PROMPT_REGEX = r'\[PEXPECT_EXIT_CODE=(\d+)\]\[PEXPECT\][\$\#] '
+
 
 class SSHExecCancellableStream(CancellableStream):
     def __init__(self, ssh, cmd, timeout):
@@ -365,6 +369,12 @@ class DockerSSHBox(Sandbox):
         self.ssh.prompt()
         time.sleep(1)
 
+        # the prompt carries the exit code of the last command, so that a command
+        # takes a single round-trip; `\$?` is expanded each time the prompt is shown
+        self.ssh.sendline(f'export PS1="{SSH_PS1}"; export PS2=""')
+        self.ssh.PROMPT = SSH_PROMPT_REGEX
+        self.ssh.prompt()
+
         # cd to workspace
         self.ssh.sendline(f'cd {self.sandbox_workspace_dir}')
         self.ssh.prompt()
@@ -419,42 +429,9 @@ class DockerSSHBox(Sandbox):
         success = self.ssh.prompt(timeout=timeout)
         if not success:
             return self._send_interrupt(cmd)
-        command_output = self.ssh.before
-
-        # once out, make sure that we have *every* output, we while loop until we get an empty output
-        while True:
-            self.ssh.sendline('\n')
-            timeout_not_reached = self.ssh.prompt(timeout=1)
-            if not timeout_not_reached:
-                logger.debug('TIMEOUT REACHED')
-                break
-            output = self.ssh.before
-            if isinstance(output, str) and output.strip() == '':
-                break
-            command_output += output
-        command_output = command_output.removesuffix('\r\n')
-
-        # get the exit code
-        self.ssh.sendline('echo $?')
-        self.ssh.prompt()
-        exit_code_str = self.ssh.before.strip()
-        _start_time = time.time()
-        while not exit_code_str:
-            self.ssh.prompt(timeout=1)
-            exit_code_str = self.ssh.before.strip()
-            if time.time() - _start_time > timeout:
-                return self._send_interrupt(
-                    cmd, command_output, ignore_last_output=True
-                )
-        cleaned_exit_code_str = exit_code_str.replace('echo $?', '').strip().split()[0]
-
-        try:
-            exit_code = int(cleaned_exit_code_str)
-        except ValueError:
-            logger.error(f'Invalid exit code: {cleaned_exit_code_str}')
-            # Handle the invalid exit code appropriately (e.g., raise an exception or set a default value)
-            exit_code = -1  # or some other appropriate default value
-
+        # the prompt marks the end of the output, and carries the exit code
+        command_output = self.ssh.before.removesuffix('\r\n')
+        exit_code = int(self.ssh.match.group(1))
         return exit_code, command_output
 
     def copy_to(self, host_src: str, sandbox_dest: str, recursive: bool = False):
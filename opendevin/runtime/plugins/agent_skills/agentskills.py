@@ -20,8 +20,6 @@ import base64
 import functools
 import os
 import re
-import shutil
-import tempfile
 from inspect import signature
 from typing import Optional
 
@@ -33,12 +31,18 @@ from pylatexenc.latex2text import LatexNodes2Text
 
 if __package__ is None or __package__ == '':
     from aider import Linter
+    from file_buffer import get_buffer, write_buffer
+    from file_search import find_files, search_files
 else:
     from .aider import Linter
+    from .file_buffer import get_buffer, write_buffer
+    from .file_search import find_files, search_files
 
 CURRENT_FILE: str | None = None
 CURRENT_LINE = 1
 WINDOW = 100
+# search_dir gives up past this many matching files
+MAX_SEARCH_DIR_FILES = 100
 
 
 # This is also used in unit tests!
@@ -183,55 +187,52 @@ def _lint_file(file_path: str) -> tuple[Optional[str], Optional[int]]:
     return 'ERRORS:\n' + lint_error.text, lint_error.lines[0]
 
 
-def _print_window(file_path, targeted_line, window, return_str=False):
+def _render_window(lines: list[str], targeted_line: int, window: int) -> str:
     global CURRENT_LINE
-    _check_current_file(file_path)
-    with open(file_path) as file:
-        content = file.read()
-
-        # Ensure the content ends with a newline character
-        if not content.endswith('\n'):
-            content += '\n'
+    total_lines = max(1, len(lines))
 
-        lines = content.splitlines(True)  # Keep all line ending characters
-        total_lines = len(lines)
+    # cover edge cases
+    CURRENT_LINE = _clamp(targeted_line, 1, total_lines)
+    half_window = max(1, window // 2)
 
-        # cover edge cases
-        CURRENT_LINE = _clamp(targeted_line, 1, total_lines)
-        half_window = max(1, window // 2)
+    # Ensure at least one line above and below the targeted line
+    start = max(1, CURRENT_LINE - half_window)
+    end = min(total_lines, CURRENT_LINE + half_window)
 
-        # Ensure at least one line above and below the targeted line
-        start = max(1, CURRENT_LINE - half_window)
-        end = min(total_lines, CURRENT_LINE + half_window)
+    # Adjust start and end to ensure at least one line above and below
+    if start == 1:
+        end = min(total_lines, start + window - 1)
+    if end == total_lines:
+        start = max(1, end - window + 1)
 
-        # Adjust start and end to ensure at least one line above and below
-        if start == 1:
-            end = min(total_lines, start + window - 1)
-        if end == total_lines:
-            start = max(1, end - window + 1)
+    output = ''
 
-        output = ''
+    # only display this when there's at least one line above
+    if start > 1:
+        output += f'({start - 1} more lines above)\n'
+    else:
+        output += '(this is the beginning of the file)\n'
+    for i in range(start, end + 1):
+        # an empty file has one empty line
+        _new_line = f'{i}|{lines[i-1] if lines else ""}'
+        if not _new_line.endswith('\n'):
+            _new_line += '\n'
+        output += _new_line
+    if end < total_lines:
+        output += f'({total_lines - end} more lines below)\n'
+    else:
+        output += '(this is the end of the file)\n'
+    return output.rstrip()
 
-        # only display this when there's at least one line above
-        if start > 1:
-            output += f'({start - 1} more lines above)\n'
-        else:
-            output += '(this is the beginning of the file)\n'
-        for i in range(start, end + 1):
-            _new_line = f'{i}|{lines[i-1]}'
-            if not _new_line.endswith('\n'):
-                _new_line += '\n'
-            output += _new_line
-        if end < total_lines:
-            output += f'({total_lines - end} more lines below)\n'
-        else:
-            output += '(this is the end of the file)\n'
-        output = output.rstrip()
 
-        if return_str:
-            return output
-        else:
-            print(output)
+def _print_window(file_path, targeted_line, window, return_str=False):
+    _check_current_file(file_path)
+    # only the lines in the window are rendered, from the buffered file
+    output = _render_window(get_buffer(file_path).lines, targeted_line, window)
+    if return_str:
+        return output
+    else:
+        print(output)
 
 
 def _cur_file_header(current_file, total_lines) -> str:
@@ -259,8 +260,7 @@ def open_file(
         raise FileNotFoundError(f'File {path} not found')
 
     CURRENT_FILE = os.path.abspath(path)
-    with open(CURRENT_FILE) as file:
-        total_lines = max(1, sum(1 for _ in file))
+    total_lines = get_buffer(CURRENT_FILE).total_lines
 
     if not isinstance(line_number, int) or line_number < 1 or line_number > total_lines:
         raise ValueError(f'Line number must be between 1 and {total_lines}')
@@ -287,8 +287,7 @@ def goto_line(line_number: int) -> None:
     global CURRENT_FILE, CURRENT_LINE, WINDOW
     _check_current_file()
 
-    with open(str(CURRENT_FILE)) as file:
-        total_lines = max(1, sum(1 for _ in file))
+    total_lines = get_buffer(str(CURRENT_FILE)).total_lines
     if not isinstance(line_number, int) or line_number < 1 or line_number > total_lines:
         raise ValueError(f'Line number must be between 1 and {total_lines}')
 
@@ -309,8 +308,7 @@ def scroll_down() -> None:
     global CURRENT_FILE, CURRENT_LINE, WINDOW
     _check_current_file()
 
-    with open(str(CURRENT_FILE)) as file:
-        total_lines = max(1, sum(1 for _ in file))
+    total_lines = get_buffer(str(CURRENT_FILE)).total_lines
     CURRENT_LINE = _clamp(CURRENT_LINE + WINDOW, 1, total_lines)
     output = _cur_file_header(CURRENT_FILE, total_lines)
     output += _print_window(CURRENT_FILE, CURRENT_LINE, WINDOW, return_str=True)
@@ -327,8 +325,7 @@ def scroll_up() -> None:
     global CURRENT_FILE, CURRENT_LINE, WINDOW
     _check_current_file()
 
-    with open(str(CURRENT_FILE)) as file:
-        total_lines = max(1, sum(1 for _ in file))
+    total_lines = get_buffer(str(CURRENT_FILE)).total_lines
     CURRENT_LINE = _clamp(CURRENT_LINE - WINDOW, 1, total_lines)
     output = _cur_file_header(CURRENT_FILE, total_lines)
     output += _print_window(CURRENT_FILE, CURRENT_LINE, WINDOW, return_str=True)
@@ -511,59 +508,39 @@ def _edit_file_impl(
     if is_insert and is_append:
         raise ValueError('Cannot insert and append at the same time.')
 
-    # Use a temporary file to write changes
     content = str(content or '')
-    temp_file_path = ''
-    src_abs_path = os.path.abspath(file_name)
     first_error_line = None
 
     try:
         n_added_lines = None
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile('w', delete=False) as temp_file:
-            temp_file_path = temp_file.name
-
-            # Read the original file and check if empty and for a trailing newline
-            with open(file_name) as original_file:
-                lines = original_file.readlines()
-
-            if is_append:
-                content, n_added_lines = _append_impl(lines, content)
-            elif is_insert:
-                try:
-                    content, n_added_lines = _insert_impl(lines, start, content)
-                except LineNumberError as e:
-                    ret_str += (f'{ERROR_MSG}\n' f'{e}\n' f'{ERROR_MSG_SUFFIX}') + '\n'
-                    return ret_str
-            else:
-                try:
-                    content, n_added_lines = _edit_impl(lines, start, end, content)
-                except LineNumberError as e:
-                    ret_str += (f'{ERROR_MSG}\n' f'{e}\n' f'{ERROR_MSG_SUFFIX}') + '\n'
-                    return ret_str
-
-            if not content.endswith('\n'):
-                content += '\n'
-
-            # Write the new content to the temporary file
-            temp_file.write(content)
-
-        # Replace the original file with the temporary file atomically
-        shutil.move(temp_file_path, src_abs_path)
+        # the edit is applied to the buffered lines, and written to disk once
+        lines = list(get_buffer(file_name).lines)
+
+        if is_append:
+            content, n_added_lines = _append_impl(lines, content)
+        elif is_insert:
+            try:
+                content, n_added_lines = _insert_impl(lines, start, content)
+            except LineNumberError as e:
+                ret_str += (f'{ERROR_MSG}\n' f'{e}\n' f'{ERROR_MSG_SUFFIX}') + '\n'
+                return ret_str
+        else:
+            try:
+                content, n_added_lines = _edit_impl(lines, start, end, content)
+            except LineNumberError as e:
+                ret_str += (f'{ERROR_MSG}\n' f'{e}\n' f'{ERROR_MSG_SUFFIX}') + '\n'
+                return ret_str
+
+        if not content.endswith('\n'):
+            content += '\n'
+
+        buffer = write_buffer(file_name, content)
 
         # Handle linting
         # NOTE: we need to get env var inside this function
         # because the env var will be set AFTER the agentskills is imported
         enable_auto_lint = os.getenv('ENABLE_AUTO_LINT', 'false').lower() == 'true'
         if enable_auto_lint:
-            # BACKUP the original file
-            original_file_backup_path = os.path.join(
-                os.path.dirname(file_name),
-                f'.backup.{os.path.basename(file_name)}',
-            )
-            with open(original_file_backup_path, 'w') as f:
-                f.writelines(lines)
-
             lint_error, first_error_line = _lint_file(file_name)
             if lint_error is not None:
                 if first_error_line is not None:
@@ -584,23 +561,13 @@ def _edit_file_impl(
 
                 ret_str += '[This is how your edit would have looked if applied]\n'
                 ret_str += '-------------------------------------------------\n'
-                ret_str += (
-                    _print_window(file_name, show_line, editor_lines, return_str=True)
-                    + '\n'
-                )
+                ret_str += _render_window(buffer.lines, show_line, editor_lines) + '\n'
                 ret_str += '-------------------------------------------------\n\n'
 
                 ret_str += '[This is the original code before your edit]\n'
                 ret_str += '-------------------------------------------------\n'
-                ret_str += (
-                    _print_window(
-                        original_file_backup_path,
-                        show_line,
-                        editor_lines,
-                        return_str=True,
-                    )
-                    + '\n'
-                )
+                # the original lines are still in memory
+                ret_str += _render_window(lines, show_line, editor_lines) + '\n'
                 ret_str += '-------------------------------------------------\n'
 
                 ret_str += (
@@ -610,11 +577,7 @@ def _edit_file_impl(
                 )
 
                 # recover the original file
-                with open(original_file_backup_path) as fin, open(
-                    file_name, 'w'
-                ) as fout:
-                    fout.write(fin.read())
-                os.remove(original_file_backup_path)
+                write_buffer(file_name, ''.join(lines))
                 return ret_str
 
     except FileNotFoundError as e:
@@ -624,15 +587,11 @@ def _edit_file_impl(
     except ValueError as e:
         ret_str += f'Invalid input: {e}\n'
     except Exception as e:
-        # Clean up the temporary file if an error occurs
-        if temp_file_path and os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
         print(f'An unexpected error occurred: {e}')
         raise e
 
     # Update the file information and print the updated content
-    with open(file_name, 'r', encoding='utf-8') as file:
-        n_total_lines = max(1, len(file.readlines()))
+    n_total_lines = get_buffer(file_name).total_lines
     if first_error_line is not None and int(first_error_line) > 0:
         CURRENT_LINE = first_error_line
     else:
@@ -704,8 +663,7 @@ def edit_file_by_replace(file_name: str, to_replace: str, new_content: str) -> N
     # search for `to_replace` in the file
     # if found, replace it with `new_content`
     # if not found, perform a fuzzy search to find the closest match and replace it with `new_content`
-    with open(file_name, 'r') as file:
-        file_content = file.read()
+    file_content = get_buffer(file_name).text
 
     if file_content.count(to_replace) > 1:
         raise ValueError(
@@ -816,28 +774,24 @@ def search_dir(search_term: str, dir_path: str = './') -> None:
     if not os.path.isdir(dir_path):
         raise FileNotFoundError(f'Directory {dir_path} not found')
     matches = []
-    for root, _, files in os.walk(dir_path):
-        for file in files:
-            if file.startswith('.'):
-                continue
-            file_path = os.path.join(root, file)
-            with open(file_path, 'r', errors='ignore') as f:
-                for line_num, line in enumerate(f, 1):
-                    if search_term in line:
-                        matches.append((file_path, line_num, line.strip()))
+    num_files = 0
+    # files ignored by .gitignore and binary files are skipped
+    for file_path, file_matches in search_files(search_term, dir_path):
+        num_files += 1
+        if num_files > MAX_SEARCH_DIR_FILES:
+            # no need to search the rest
+            print(
+                f'More than {MAX_SEARCH_DIR_FILES} files matched for "{search_term}" in {dir_path}. Please narrow your search.'
+            )
+            return
+        for line_num, line in file_matches:
+            matches.append((file_path, line_num, line))
 
     if not matches:
         print(f'No matches found for "{search_term}" in {dir_path}')
         return
 
     num_matches = len(matches)
-    num_files = len(set(match[0] for match in matches))
-
-    if num_files > 100:
-        print(
-            f'More than {num_files} files matched for "{search_term}" in {dir_path}. Please narrow your search.'
-        )
-        return
 
     print(f'[Found {num_matches} matches for "{search_term}" in {dir_path}]')
     for file_path, line_num, line in matches:
@@ -889,11 +843,7 @@ def find_file(file_name: str, dir_path: str = './') -> None:
     if not os.path.isdir(dir_path):
         raise FileNotFoundError(f'Directory {dir_path} not found')
 
-    matches = []
-    for root, _, files in os.walk(dir_path):
-        for file in files:
-            if file_name in file:
-                matches.append(os.path.join(root, file))
+    matches = find_files(file_name, dir_path)
 
     if matches:
         print(f'[Found {len(matches)} matches for "{file_name}" in {dir_path}]')
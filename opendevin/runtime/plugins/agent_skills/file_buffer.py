@@ -0,0 +1,148 @@
+"""file_buffer.py
+
+This module keeps the files the editor skills work on in memory, so that opening,
+scrolling and editing a file doesn't read it from disk each time.
+
+A buffer holds the lines of a file (split on newlines, as `readlines` does), which is
+also the index used to render a window or count the lines. It is valid for as long as
+the file's mtime and size stay the same: a file changed by anything else than the skills
+(e.g. a shell command) is read again. Edits are applied to the buffer and written to disk
+in a single write.
+"""
+
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# the number of buffers, and the number of characters in them, kept in memory
+MAX_BUFFERS = 16
+MAX_BUFFERED_CHARS = 64 * 1024 * 1024
+
+
+def split_lines(content: str) -> list[str]:
+    """Splits the content into lines that keep their newline, like `readlines` in text mode."""
+    return io.StringIO(content, newline=None).readlines()
+
+
+class FileBuffer:
+    """The lines of a file, as of its mtime and size."""
+
+    def __init__(self, path: str, lines: list[str], stat: os.stat_result):
+        self.path = path
+        self.lines = lines
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.nchars = sum(map(len, lines))
+        self._text: str | None = None
+
+    @property
+    def total_lines(self) -> int:
+        return max(1, len(self.lines))
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = ''.join(self.lines)
+        return self._text
+
+    def is_valid(self, stat: os.stat_result) -> bool:
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+
+class FileBufferCache:
+    """The buffers of the most recently used files, by absolute path."""
+
+    def __init__(
+        self, max_buffers: int = MAX_BUFFERS, max_chars: int = MAX_BUFFERED_CHARS
+    ):
+        self.max_buffers = max_buffers
+        self.max_chars = max_chars
+        self._buffers: OrderedDict[str, FileBuffer] = OrderedDict()
+        self._nchars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _put(self, buffer: FileBuffer) -> None:
+        with self._lock:
+            old = self._buffers.pop(buffer.path, None)
+            if old is not None:
+                self._nchars -= old.nchars
+            self._buffers[buffer.path] = buffer
+            self._nchars += buffer.nchars
+            while len(self._buffers) > 1 and (
+                len(self._buffers) > self.max_buffers or self._nchars > self.max_chars
+            ):
+                _, evicted = self._buffers.popitem(last=False)
+                self._nchars -= evicted.nchars
+
+    def get(self, path: str) -> FileBuffer:
+        """Returns the buffer of the file, reading it if it changed since it was buffered."""
+        abs_path = os.path.abspath(path)
+        stat = os.stat(abs_path)
+        with self._lock:
+            buffer = self._buffers.get(abs_path)
+            if buffer is not None and buffer.is_valid(stat):
+                self._buffers.move_to_end(abs_path)
+                self.hits += 1
+                return buffer
+            self.misses += 1
+        with open(abs_path) as f:
+            # the file may have changed since it was stat'ed
+            stat = os.fstat(f.fileno())
+            lines = f.readlines()
+        buffer = FileBuffer(abs_path, lines, stat)
+        self._put(buffer)
+        return buffer
+
+    def write(self, path: str, content: str) -> FileBuffer:
+        """Writes the content to the file, in one write, and returns its new buffer.
+
+        The file is replaced atomically where the directory allows it, and written in
+        place otherwise.
+        """
+        abs_path = os.path.abspath(path)
+        try:
+            mode = os.stat(abs_path).st_mode
+        except FileNotFoundError:
+            mode = None
+        dir_path = os.path.dirname(abs_path)
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=dir_path, prefix=f'.{os.path.basename(abs_path)}.'
+            )
+        except OSError:
+            with open(abs_path, 'w') as f:
+                f.write(content)
+        else:
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.write(content)
+                if mode is not None:
+                    os.chmod(temp_path, mode)
+                os.replace(temp_path, abs_path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        buffer = FileBuffer(abs_path, split_lines(content), os.stat(abs_path))
+        buffer._text = content
+        self._put(buffer)
+        return buffer
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffers.clear()
+            self._nchars = 0
+
+
+_cache = FileBufferCache()
+
+
+def get_buffer(path: str) -> FileBuffer:
+    return _cache.get(path)
+
+
+def write_buffer(path: str, content: str) -> FileBuffer:
+    return _cache.write(path, content)
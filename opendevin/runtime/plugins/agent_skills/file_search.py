@@ -0,0 +1,272 @@
+"""file_search.py
+
+This module finds and searches files for the `search_dir` and `find_file` skills.
+
+- Directories are walked once, skipping `.git`, `node_modules` and what the `.gitignore`
+  files (of the directory, its subdirectories and its parents up to the repository root)
+  ignore.
+- Binary files are skipped, by looking for a NUL byte at their start.
+- Files are searched by a pool of threads, in walk order, and the search stops as soon as
+  the caller has seen enough.
+- With AGENT_SKILLS_SEARCH_INDEX=1, a trigram index of the searched files is kept in
+  memory. It is updated as files are read, and an entry is reused for as long as the
+  file's mtime and size stay the same, so that repeated searches of a repository only
+  read the files that may contain the term.
+"""
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+
+from pathspec import PathSpec
+from pathspec.patterns import GitWildMatchPattern
+
+IGNORED_DIRS = {'.git', 'node_modules'}
+# how much of a file is looked at to tell whether it is binary
+SNIFF_SIZE = 8192
+# the number of files read ahead of the caller, per worker
+READ_AHEAD = 4
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+# larger files are always read, rather than indexed
+MAX_INDEXED_SIZE = 4 * 1024 * 1024
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix='file-search'
+            )
+        return _executor
+
+
+# ==================================================================================================
+# Ignore rules
+# ==================================================================================================
+
+# compiled .gitignore files, by path, with the mtime they were compiled at
+_gitignores: dict[str, tuple[int, PathSpec]] = {}
+
+
+def _load_gitignore(dir_path: str) -> PathSpec | None:
+    path = os.path.join(dir_path, '.gitignore')
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _gitignores.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(path, 'r', errors='ignore') as f:
+            spec = PathSpec.from_lines(GitWildMatchPattern, f.readlines())
+    except OSError:
+        return None
+    _gitignores[path] = (mtime, spec)
+    return spec
+
+
+def _parent_gitignores(dir_path: str) -> list[tuple[str, PathSpec]]:
+    """Returns the .gitignore files of the parents of dir_path, up to its repository root."""
+    abs_path = os.path.abspath(dir_path)
+    parents = []
+    current = abs_path
+    while not os.path.exists(os.path.join(current, '.git')):
+        parent = os.path.dirname(current)
+        if parent == current:
+            # not in a repository
+            return []
+        current = parent
+        parents.append(current)
+    specs = []
+    for parent in reversed(parents):
+        spec = _load_gitignore(parent)
+        if spec is not None:
+            specs.append((parent, spec))
+    return specs
+
+
+def _is_ignored(abs_path: str, is_dir: bool, specs: list[tuple[str, PathSpec]]) -> bool:
+    # the deepest .gitignore with a matching pattern decides, as in git
+    for base, spec in reversed(specs):
+        rel_path = os.path.relpath(abs_path, base)
+        if is_dir:
+            rel_path += '/'
+        include = spec.check_file(rel_path).include
+        if include is not None:
+            return include
+    return False
+
+
+def walk_files(dir_path: str) -> Iterator[str]:
+    """Yields the paths of the files under dir_path that aren't ignored, in os.walk order."""
+    chains = {dir_path: _parent_gitignores(dir_path)}
+    for root, dirs, files in os.walk(dir_path):
+        specs = chains.pop(root)
+        abs_root = os.path.abspath(root)
+        if '.gitignore' in files:
+            spec = _load_gitignore(root)
+            if spec is not None:
+                specs = specs + [(abs_root, spec)]
+        kept = []
+        for name in dirs:
+            if name in IGNORED_DIRS:
+                continue
+            if specs and _is_ignored(os.path.join(abs_root, name), True, specs):
+                continue
+            kept.append(name)
+            chains[os.path.join(root, name)] = specs
+        # prune the walk
+        dirs[:] = kept
+        for name in files:
+            if specs and _is_ignored(os.path.join(abs_root, name), False, specs):
+                continue
+            yield os.path.join(root, name)
+
+
+# ==================================================================================================
+# Trigram index
+# ==================================================================================================
+
+
+def _trigram_bits(trigram: bytes, mask: int) -> int:
+    return (int.from_bytes(trigram, 'little') * 2654435761 >> 8) & mask
+
+
+class TrigramIndex:
+    """The trigrams of files, each in a bitmap sized to the file, keyed by path.
+
+    A bitmap may have false positives (a term the file doesn't contain is reported as
+    maybe there), but never false negatives, so a file whose bitmap rules the term out
+    is not read.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[int, int, bytearray]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.skipped = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, path: str, stat: os.stat_result, data: bytes) -> None:
+        trigrams = {data[i : i + 3] for i in range(len(data) - 2)}
+        # about 4 bits per trigram, to keep false positives rare
+        nbits = 1024
+        while nbits < 4 * len(trigrams) and nbits < 1 << 23:
+            nbits <<= 1
+        bitmap = bytearray(nbits >> 3)
+        mask = nbits - 1
+        for trigram in trigrams:
+            bit = _trigram_bits(trigram, mask)
+            bitmap[bit >> 3] |= 1 << (bit & 7)
+        with self._lock:
+            self._entries[path] = (stat.st_mtime_ns, stat.st_size, bitmap)
+
+    def may_contain(self, path: str, stat: os.stat_result, term: bytes) -> bool | None:
+        """Returns whether the file may contain the term, or None if its entry is out of date."""
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != stat.st_mtime_ns or entry[1] != stat.st_size:
+            return None
+        self.hits += 1
+        bitmap = entry[2]
+        mask = (len(bitmap) << 3) - 1
+        for i in range(len(term) - 2):
+            bit = _trigram_bits(term[i : i + 3], mask)
+            if not bitmap[bit >> 3] & (1 << (bit & 7)):
+                self.skipped += 1
+                return False
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_index = TrigramIndex()
+
+
+def _use_index() -> bool:
+    # read at every search: the variable may be set after the skills are imported
+    return os.getenv('AGENT_SKILLS_SEARCH_INDEX', '').lower() in ('1', 'true', 'yes')
+
+
+# ==================================================================================================
+# Search
+# ==================================================================================================
+
+
+def _search_file(
+    path: str, term: bytes, index: TrigramIndex | None
+) -> list[tuple[int, str]]:
+    """Returns the (line number, stripped line) of the lines of the file containing the term."""
+    try:
+        if index is not None:
+            stat = os.stat(path)
+            if index.may_contain(os.path.abspath(path), stat, term) is False:
+                return []
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    if b'\0' in data[:SNIFF_SIZE]:
+        return []
+    if index is not None and len(data) <= MAX_INDEXED_SIZE:
+        index.update(os.path.abspath(path), stat, data)
+    if term not in data:
+        return []
+    text = data.decode('utf-8', errors='ignore')
+    # same line splitting as reading the file in text mode
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    term_str = term.decode('utf-8', errors='ignore')
+    return [
+        (line_num, line.strip())
+        for line_num, line in enumerate(text.split('\n'), 1)
+        if term_str in line
+    ]
+
+
+def search_files(
+    search_term: str, dir_path: str
+) -> Iterator[tuple[str, list[tuple[int, str]]]]:
+    """Yields (path, matches) for the files under dir_path containing search_term, in walk order.
+
+    Dotfiles and binary files are skipped. The files are read by a thread pool, a few
+    ahead of the caller; when the caller stops iterating, the search stops.
+    """
+    term = search_term.encode('utf-8')
+    index = _index if _use_index() else None
+    executor = _get_executor()
+    pending: deque[tuple[str, Future]] = deque()
+    try:
+        for path in walk_files(dir_path):
+            if os.path.basename(path).startswith('.'):
+                continue
+            pending.append((path, executor.submit(_search_file, path, term, index)))
+            if len(pending) >= MAX_WORKERS * READ_AHEAD:
+                path, future = pending.popleft()
+                matches = future.result()
+                if matches:
+                    yield path, matches
+        while pending:
+            path, future = pending.popleft()
+            matches = future.result()
+            if matches:
+                yield path, matches
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def find_files(file_name: str, dir_path: str) -> list[str]:
+    """Returns the paths of the files under dir_path whose name contains file_name."""
+    return [
+        path for path in walk_files(dir_path) if file_name in os.path.basename(path)
+    ]
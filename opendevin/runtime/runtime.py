@@ -69,6 +69,8 @@ class Runtime:
 
         self.config = copy.deepcopy(config)
         self.DEFAULT_ENV_VARS = _default_env_vars(config.sandbox)
+        # the background commands being run
+        self._background_tasks: set[asyncio.Task] = set()
         atexit.register(self.close_sync)
 
     async def ainit(self, env_vars: dict[str, str] | None = None) -> None:
@@ -104,7 +106,7 @@ class Runtime:
     # Methods we plan to deprecate when we move to new EventStreamRuntime
     # ====================================================================
 
-    def init_runtime_tools(
+    async def init_runtime_tools(
         self,
         runtime_tools: list[RuntimeTool],
         runtime_tools_config: Optional[dict[RuntimeTool, Any]] = None,
@@ -146,10 +148,20 @@ class Runtime:
             if event.timeout is None:
                 event.timeout = self.config.sandbox.timeout
             assert event.timeout is not None
-            observation = await self.run_action(event)
-            observation._cause = event.id  # type: ignore[attr-defined]
-            source = event.source if event.source else EventSource.AGENT
-            self.event_stream.add_event(observation, source)  # type: ignore[arg-type]
+            if isinstance(event, CmdRunAction) and event.background:
+                # events are delivered one at a time: a background command runs in a
+                # task of its own, so that the actions after it don't wait for it
+                task = asyncio.create_task(self._run_and_observe(event))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+                return
+            await self._run_and_observe(event)
+
+    async def _run_and_observe(self, action: Action) -> None:
+        observation = await self.run_action(action)
+        observation._cause = action.id  # type: ignore[attr-defined]
+        source = action.source if action.source else EventSource.AGENT
+        self.event_stream.add_event(observation, source)  # type: ignore[arg-type]
 
     async def run_action(self, action: Action) -> Observation:
         """Run an action and return the resulting observation.
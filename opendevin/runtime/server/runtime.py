@@ -1,3 +1,4 @@
+import asyncio
 from typing import Any, Optional
 
 from opendevin.core.config import AppConfig
@@ -25,6 +26,10 @@ from opendevin.runtime import (
     Sandbox,
 )
 from opendevin.runtime.browser.browser_env import BrowserEnv
+from opendevin.runtime.browser.browser_host import (
+    BrowserContextLease,
+    get_browser_host,
+)
 from opendevin.runtime.plugins import JupyterRequirement, PluginRequirement
 from opendevin.runtime.runtime import Runtime
 from opendevin.runtime.tools import RuntimeTool
@@ -51,7 +56,7 @@ class ServerRuntime(Runtime):
         else:
             self.sandbox = sandbox
             self._is_external_sandbox = True
-        self.browser: BrowserEnv | None = None
+        self.browser: BrowserEnv | BrowserContextLease | None = None
 
     def create_sandbox(self, sid: str = 'default', box_type: str = 'ssh') -> Sandbox:
         if box_type == 'local':
@@ -101,9 +106,10 @@ class ServerRuntime(Runtime):
         if hasattr(self, '_is_external_sandbox') and not self._is_external_sandbox:
             self.sandbox.close()
         if hasattr(self, 'browser') and self.browser is not None:
-            self.browser.close()
+            # closing waits for the browser process, or for the host to close the context
+            await asyncio.to_thread(self.browser.close)
 
-    def init_runtime_tools(
+    async def init_runtime_tools(
         self,
         runtime_tools: list[RuntimeTool],
         runtime_tools_config: Optional[dict[RuntimeTool, Any]] = None,
@@ -114,7 +120,19 @@ class ServerRuntime(Runtime):
                 runtime_tools_config = {}
             browser_env_config = runtime_tools_config.get(RuntimeTool.BROWSER, {})
             try:
-                self.browser = BrowserEnv(**browser_env_config)
+                if (
+                    self.config.sandbox.browser_host_contexts > 0
+                    and not browser_env_config
+                ):
+                    # evaluation browsers need a browser of their own; the first call
+                    # starts the host, and leasing may wait for a free context, and for
+                    # the host to open it
+                    host = await asyncio.to_thread(
+                        get_browser_host, self.config.sandbox.browser_host_contexts
+                    )
+                    self.browser = await asyncio.to_thread(host.lease)
+                else:
+                    self.browser = BrowserEnv(**browser_env_config)
             except BrowserInitException:
                 logger.warn(
                     'Failed to start browser environment, web browsing functionality will not work'
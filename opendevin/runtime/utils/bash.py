@@ -1,4 +1,9 @@
+import re
+import threading
+import time
+
 import bashlex
+import pexpect
 
 from opendevin.core.logger import opendevin_logger as logger
 
@@ -50,3 +55,208 @@ def split_bash_commands(commands):
             result.append(remaining)
             logger.debug(f'BASH PARSING result.append(remaining): {result[-1]}')
     return result
+
+
+class BashSession:
+    """An interactive bash shell, driven through pexpect.
+
+    The prompt carries the exit code of the last command and the working directory, so
+    running a command takes a single round-trip: its output, exit code and the new
+    working directory all arrive with the next prompt.
+    """
+
+    # `\$?` and `\$PWD` are expanded by bash each time the prompt is shown
+    PS1 = r'[PEXPECT_BEGIN] \u@\h:\w [PEXPECT_EXIT_CODE=\$?] [PEXPECT_PWD=\$PWD] [PEXPECT_END]'
+
+    # This should NOT match "PS1=\u@\h:\w [PEXPECT]$" when `env` is executed
+    PROMPT_REGEX = (
+        r'\[PEXPECT_BEGIN\] ([a-z0-9_-]*)@([a-zA-Z0-9.-]*):(.+) '
+        r'\[PEXPECT_EXIT_CODE=(\d+)\] \[PEXPECT_PWD=(.*)\] \[PEXPECT_END\]'
+    )
+
+    def __init__(self, work_dir: str, username: str | None = None):
+        """Starts the shell in work_dir.
+
+        Args:
+            work_dir: The initial working directory.
+            username: The user to log in as with `su`, or None to run bash as the current user.
+        """
+        command = f'su - {username}' if username else '/bin/bash --noprofile --norc'
+        self.shell = pexpect.spawn(command, encoding='utf-8', echo=False)
+        self.username = username
+        self.pwd = work_dir
+        self.prev_pwd = work_dir
+
+        # the exit code in the prompt must be the command's, not PROMPT_COMMAND's;
+        # bracketed paste would wrap the output in escape sequences
+        self.shell.sendline(
+            "bind 'set enable-bracketed-paste off' 2>/dev/null; "
+            f'unset PROMPT_COMMAND; export PS1="{self.PS1}"; export PS2=""'
+        )
+        self.shell.expect(self.PROMPT_REGEX)
+
+        self.execute(f'cd {work_dir}', timeout=None)
+        logger.debug(
+            f'Bash initialized. Working directory: {self.pwd}. Output: {self.shell.before}'
+        )
+
+    def _parse_prompt(self) -> tuple[str, int]:
+        """Returns the prompt to show and the exit code, and updates the working directory."""
+        ps1 = self.shell.after
+
+        # begin at the last occurence of '[PEXPECT_BEGIN]'.
+        # In multi-line bash commands, the prompt will be repeated
+        # and the matched regex captures all of them
+        # - we only want the last one (newest prompt)
+        _begin_pos = ps1.rfind('[PEXPECT_BEGIN]')
+        if _begin_pos != -1:
+            ps1 = ps1[_begin_pos:]
+
+        matched = re.match(self.PROMPT_REGEX, ps1)
+        assert (
+            matched is not None
+        ), f'Failed to parse bash prompt: {ps1}. This should not happen.'
+        username, hostname, working_dir, exit_code, pwd = matched.groups()
+        self.prev_pwd = self.pwd
+        self.pwd = pwd
+
+        # re-assemble the prompt
+        prompt = f'{username}@{hostname}:{working_dir} '
+        if username == 'root':
+            prompt += '#'
+        else:
+            prompt += '$'
+        return prompt + ' ', int(exit_code)
+
+    def execute(
+        self, command: str, timeout: int | None, keep_prompt: bool = True
+    ) -> tuple[str, int]:
+        """Runs a command, and returns its output and exit code.
+
+        Args:
+            command: The command to run.
+            timeout: How long to wait for the command to finish, in seconds.
+            keep_prompt: Whether to end the output with the prompt, as a terminal would show it.
+        """
+        logger.debug(f'Executing command: {command}')
+        self.shell.sendline(command)
+        self.shell.expect(self.PROMPT_REGEX, timeout=timeout)
+
+        output = self.shell.before
+        prompt, exit_code = self._parse_prompt()
+        if keep_prompt:
+            output += '\r\n' + prompt
+        logger.debug(f'Command output: {output}')
+        return output, exit_code
+
+    def close(self):
+        self.shell.close()
+
+
+class BashSessionPool:
+    """A pool of pre-started bash sessions, to run independent commands in parallel.
+
+    The sessions are started up front, logged in as the same user in the same working
+    directory, so that taking one is instant. A session is used by one command at a
+    time; a session left in an unknown state (e.g. by a command that timed out) is
+    replaced by a new one when it's given back.
+
+    Each session remembers the version of the environment it was last synced to, see
+    `generation`; syncing is up to the caller.
+    """
+
+    def __init__(self, size: int, work_dir: str, username: str | None = None):
+        """Starts the sessions.
+
+        Args:
+            size: The number of sessions.
+            work_dir: The initial working directory of the sessions.
+            username: The user to log in as, or None to run bash as the current user.
+        """
+        self.size = size
+        self.work_dir = work_dir
+        self.username = username
+        self._lock = threading.Lock()
+        self._idle: list[BashSession] = [
+            BashSession(work_dir, username) for _ in range(size)
+        ]
+        self._generations: dict[BashSession, int] = {
+            session: 0 for session in self._idle
+        }
+        self._acquired_at: dict[BashSession, float] = {}
+        self._started_at = time.monotonic()
+        self._busy_seconds = 0.0
+        self.max_busy = 0
+        self.dispatched = 0
+        self.exhausted = 0
+        self.replaced = 0
+
+    @property
+    def busy(self) -> int:
+        return len(self._acquired_at)
+
+    def acquire(self) -> BashSession | None:
+        """Takes an idle session, or returns None if all of them are busy."""
+        with self._lock:
+            if not self._idle:
+                self.exhausted += 1
+                return None
+            session = self._idle.pop()
+            self._acquired_at[session] = time.monotonic()
+            self.max_busy = max(self.max_busy, self.busy)
+            self.dispatched += 1
+            return session
+
+    def release(self, session: BashSession, discard: bool = False) -> None:
+        """Gives a session back, or replaces it with a new one if discard is set."""
+        with self._lock:
+            self._busy_seconds += time.monotonic() - self._acquired_at.pop(session)
+            if not discard:
+                self._idle.append(session)
+                return
+            del self._generations[session]
+        # starting a session takes a while, don't hold the lock meanwhile
+        session.close()
+        try:
+            new_session = BashSession(self.work_dir, self.username)
+        except Exception as e:
+            logger.error(f'Failed to replace a bash session of the pool: {e}')
+            return
+        with self._lock:
+            self._generations[new_session] = 0
+            self._idle.append(new_session)
+            self.replaced += 1
+
+    def generation(self, session: BashSession) -> int:
+        """Returns the version of the environment the session was last synced to."""
+        return self._generations[session]
+
+    def set_generation(self, session: BashSession, generation: int) -> None:
+        self._generations[session] = generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            busy_seconds = self._busy_seconds + sum(
+                time.monotonic() - acquired_at
+                for acquired_at in self._acquired_at.values()
+            )
+            uptime = time.monotonic() - self._started_at
+            return {
+                'size': self.size,
+                'busy': self.busy,
+                'max_busy': self.max_busy,
+                'dispatched': self.dispatched,
+                'exhausted': self.exhausted,
+                'replaced': self.replaced,
+                # the share of the time the sessions spent running commands
+                'utilization': busy_seconds / (self.size * uptime)
+                if self.size and uptime
+                else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            sessions = self._idle + list(self._acquired_at)
+            self._idle = []
+        for session in sessions:
+            session.close()
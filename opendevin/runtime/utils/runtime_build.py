@@ -1,4 +1,6 @@
 import argparse
+import functools
+import hashlib
 import os
 import shutil
 import subprocess
@@ -11,10 +13,82 @@ from jinja2 import Environment, FileSystemLoader
 import opendevin
 from opendevin.core.logger import opendevin_logger as logger
 
+# the files of the project that are copied to the image, besides the package itself
+_PROJECT_FILES = ['pyproject.toml', 'poetry.lock', 'README.md']
+# the files that decide the dependencies installed in the image
+_DEPENDENCY_FILES = ['pyproject.toml', 'poetry.lock']
+
+
+def _get_project_root() -> str:
+    return os.path.dirname(os.path.dirname(os.path.abspath(opendevin.__file__)))
+
+
+def _get_template_path() -> str:
+    return os.path.join(os.path.dirname(__file__), 'runtime_templates', 'Dockerfile.j2')
+
+
+def _hash_file(hasher, path: str, name: str) -> None:
+    hasher.update(name.encode('utf-8') + b'\0')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            hasher.update(f.read())
+    hasher.update(b'\0')
+
+
+def _get_dependencies_hash(base_image: str) -> str:
+    """Returns the hash of what the dependencies image is built from: the base image,
+    the Dockerfile template and the dependency files."""
+    hasher = hashlib.sha256(base_image.encode('utf-8') + b'\0')
+    _hash_file(hasher, _get_template_path(), 'Dockerfile.j2')
+    project_root = _get_project_root()
+    for name in _DEPENDENCY_FILES:
+        _hash_file(hasher, os.path.join(project_root, name), name)
+    return hasher.hexdigest()
+
+
+@functools.cache
+def _get_source_hash() -> str:
+    """Returns the hash of the project source that goes into the image.
+
+    The source is hashed once per process: a change to it is picked up on restart.
+    """
+    hasher = hashlib.sha256()
+    project_root = _get_project_root()
+    for name in _PROJECT_FILES:
+        _hash_file(hasher, os.path.join(project_root, name), name)
+    package_dir = os.path.dirname(os.path.abspath(opendevin.__file__))
+    for root, dirs, files in os.walk(package_dir):
+        # walk in a stable order
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for file in sorted(files):
+            if file.endswith('.pyc'):
+                continue
+            path = os.path.join(root, file)
+            _hash_file(hasher, path, os.path.relpath(path, project_root))
+    return hasher.hexdigest()
+
+
+def get_runtime_image_names(base_image: str) -> tuple[str, str]:
+    """Returns the names of the dependencies image and the runtime image for a base image.
+
+    The tags are content hashes: the dependencies image is tagged with the hash of the
+    base image, Dockerfile template, `pyproject.toml` and `poetry.lock`, and the runtime
+    image with that and the hash of the project source. An image with the tag is thus
+    up to date, and is reused as is.
+    """
+    dependencies_hash = _get_dependencies_hash(base_image)
+    runtime_hash = hashlib.sha256(
+        (dependencies_hash + _get_source_hash()).encode('utf-8')
+    ).hexdigest()
+    return (
+        f'od_runtime:deps_{dependencies_hash[:16]}',
+        f'od_runtime:{runtime_hash[:16]}',
+    )
+
 
 def _get_package_version():
     """Read the version from pyproject.toml as the other one may be outdated."""
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(opendevin.__file__)))
+    project_root = _get_project_root()
     pyproject_path = os.path.join(project_root, 'pyproject.toml')
     with open(pyproject_path, 'r') as f:
         pyproject_data = toml.load(f)
@@ -25,7 +99,7 @@ def _create_project_source_dist():
     """Create a source distribution of the project. Return the path to the tarball."""
     # Copy the project directory to the container
     # get the location of "opendevin" package
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(opendevin.__file__)))
+    project_root = _get_project_root()
     logger.info(f'Using project root: {project_root}')
 
     # run "python -m build -s" on project_root
@@ -63,19 +137,25 @@ def _put_source_code_to_dir(temp_dir: str) -> str:
 
 
 def _generate_dockerfile(
-    base_image: str, source_code_dirname: str, skip_init: bool = False
+    base_image: str,
+    source_code_dirname: str,
+    skip_init: bool = False,
+    install_dependencies: bool = True,
 ) -> str:
-    """Generate the Dockerfile content for the eventstream runtime image based on user-provided base image."""
+    """Generate the Dockerfile content for the eventstream runtime image based on user-provided base image.
+
+    With skip_init, the base image is an od_runtime image, and only the project is copied
+    to it; its dependencies are installed again unless install_dependencies is False.
+    """
     env = Environment(
-        loader=FileSystemLoader(
-            searchpath=os.path.join(os.path.dirname(__file__), 'runtime_templates')
-        )
+        loader=FileSystemLoader(searchpath=os.path.dirname(_get_template_path()))
     )
     template = env.get_template('Dockerfile.j2')
     dockerfile_content = template.render(
         base_image=base_image,
         source_code_dirname=source_code_dirname,
         skip_init=skip_init,
+        install_dependencies=install_dependencies or not skip_init,
     )
     return dockerfile_content
 
@@ -84,11 +164,15 @@ def prep_docker_build_folder(
     dir_path: str,
     base_image: str,
     skip_init: bool = False,
+    install_dependencies: bool = True,
 ):
     """Prepares the docker build folder by copying the source code and generating the Dockerfile."""
     source_code_dirname = _put_source_code_to_dir(dir_path)
     dockerfile_content = _generate_dockerfile(
-        base_image, source_code_dirname, skip_init=skip_init
+        base_image,
+        source_code_dirname,
+        skip_init=skip_init,
+        install_dependencies=install_dependencies,
     )
     logger.info(
         (
@@ -106,6 +190,7 @@ def _build_sandbox_image(
     target_image_name: str,
     docker_client: docker.DockerClient,
     skip_init: bool = False,
+    install_dependencies: bool = True,
 ):
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -115,7 +200,12 @@ def _build_sandbox_image(
                 )
             else:
                 logger.info(f'Building agnostic sandbox image: {target_image_name}')
-            prep_docker_build_folder(temp_dir, base_image, skip_init=skip_init)
+            prep_docker_build_folder(
+                temp_dir,
+                base_image,
+                skip_init=skip_init,
+                install_dependencies=install_dependencies,
+            )
             api_client = docker_client.api
             build_logs = api_client.build(
                 path=temp_dir,
@@ -148,36 +238,26 @@ def _build_sandbox_image(
         raise e
 
 
-def get_new_image_name(base_image: str, dev_mode: bool = False) -> str:
-    if dev_mode:
-        if 'od_runtime' not in base_image:
-            raise ValueError(
-                f'Base image {base_image} must be a valid od_runtime image to be used for dev mode.'
-            )
-        # remove the 'od_runtime' prefix from the base_image
-        return base_image.replace('od_runtime', 'od_runtime_dev')
-    elif 'od_runtime' in base_image:
-        # if the base image is a valid od_runtime image, we will use it as is
-        logger.info(f'Using existing od_runtime image [{base_image}]')
-        return base_image
-    else:
-        prefix = 'od_runtime'
-        if ':' not in base_image:
-            base_image = base_image + ':latest'
-        [repo, tag] = base_image.split(':')
-        repo = repo.replace('/', '___')
-
-        od_version = _get_package_version()
-        return f'{prefix}:od_v{od_version}_image_{repo}_tag_{tag}'
+def _check_image_exists(image_name: str, docker_client: docker.DockerClient) -> bool:
+    try:
+        docker_client.images.get(image_name)
+        return True
+    except docker.errors.ImageNotFound:
+        return False
 
 
-def _check_image_exists(image_name: str, docker_client: docker.DockerClient) -> bool:
-    images = docker_client.images.list()
-    if images:
-        for image in images:
-            if image_name in image.tags:
-                return True
-    return False
+def _get_image(image_name: str, docker_client: docker.DockerClient) -> bool:
+    """Returns whether the image is there, locally or pulled from the registry."""
+    if _check_image_exists(image_name, docker_client):
+        logger.info(f'Image {image_name} exists')
+        return True
+    try:
+        docker_client.images.pull(image_name)
+        logger.info(f'Image {image_name} pulled')
+        return True
+    except Exception:
+        logger.info(f'Image {image_name} does not exist, and cannot be pulled')
+        return False
 
 
 def build_runtime_image(
@@ -189,78 +269,58 @@ def build_runtime_image(
     """Build the runtime image for the OpenDevin runtime.
 
     This is only used for **eventstream runtime**.
+
+    The image is built in two steps: a dependencies image installs everything on the
+    base image, and the runtime image only adds the project source to it. Both are
+    tagged with content hashes (see `get_runtime_image_names`), so an unchanged project
+    reuses its image without any build work, and a source change only rebuilds the
+    source layer. An od_runtime base image is used as is, unless update_source_code is
+    set: then the current source is added to it.
     """
-    new_image_name = get_new_image_name(base_image)
-    if base_image == new_image_name:
+    if 'od_runtime' in base_image and not update_source_code:
         logger.info(
             f'Using existing od_runtime image [{base_image}]. Will NOT build a new image.'
         )
-    else:
-        logger.info(f'New image name: {new_image_name}')
+        return base_image
 
-    # Ensure new_image_name contains a colon
-    if ':' not in new_image_name:
-        raise ValueError(
-            f'Invalid image name: {new_image_name}. Expected format "repository:tag".'
+    dependencies_image, runtime_image = get_runtime_image_names(base_image)
+    logger.info(f'Runtime image name: {runtime_image}')
+    if _get_image(runtime_image, docker_client):
+        logger.info('No image build done (the source code is unchanged)')
+        return runtime_image
+
+    install_dependencies = False
+    if 'od_runtime' in base_image:
+        # the dependencies may have changed since the image was built
+        dependencies_image = base_image
+        install_dependencies = True
+    elif not _get_image(dependencies_image, docker_client):
+        logger.info(f'Building image [{dependencies_image}] from scratch')
+        _build_sandbox_image(
+            base_image, dependencies_image, docker_client, skip_init=False
         )
 
-    # Try to pull the new image from the registry
-    try:
-        docker_client.images.pull(new_image_name)
-    except Exception:
-        logger.info(f'Cannot pull image {new_image_name} directly')
-
-    # Detect if the sandbox image is built
-    image_exists = _check_image_exists(new_image_name, docker_client)
-    if image_exists:
-        logger.info(f'Image {new_image_name} exists')
-    else:
-        logger.info(f'Image {new_image_name} does not exist')
-
-    skip_init = False
-    if image_exists and not update_source_code:
-        # If (1) Image exists & we are not updating the source code, we can reuse the existing production image
-        logger.info('No image build done (not updating source code)')
-        return new_image_name
-    elif image_exists and update_source_code:
-        # If (2) Image exists & we plan to update the source code (in dev mode), we need to rebuild the image
-        # and give it a special name
-        # e.g., od_runtime:ubuntu_tag_latest -> od_runtime_dev:ubuntu_tag_latest
-        logger.info('Image exists, but updating source code requested')
-        base_image = new_image_name
-        new_image_name = get_new_image_name(base_image, dev_mode=True)
-
-        skip_init = True  # since we only need to update the source code
-    else:
-        # If (3) Image does not exist, we need to build it from scratch
-        # e.g., ubuntu:latest -> od_runtime:ubuntu_tag_latest
-        # This snippet would allow to load from archive:
-        # tar_path = f'{new_image_name.replace(":", "_")}.tar'
-        # if os.path.exists(tar_path):
-        #     logger.info(f'Loading image from {tar_path}')
-        #     load_command = ['docker', 'load', '-i', tar_path]
-        #     subprocess.run(load_command, check=True)
-        #     logger.info(f'Image {new_image_name} loaded from {tar_path}')
-        #     return new_image_name
-        skip_init = False
-
-    if not skip_init:
-        logger.info(f'Building image [{new_image_name}] from scratch')
-
-    _build_sandbox_image(base_image, new_image_name, docker_client, skip_init=skip_init)
+    logger.info(f'Adding the source code to [{dependencies_image}]')
+    _build_sandbox_image(
+        dependencies_image,
+        runtime_image,
+        docker_client,
+        skip_init=True,
+        install_dependencies=install_dependencies,
+    )
 
     # Only for development: allow to save image as archive:
-    if not image_exists and save_to_local_store:
-        tar_path = f'{new_image_name.replace(":", "_")}.tar'
-        save_command = ['docker', 'save', '-o', tar_path, new_image_name]
+    if save_to_local_store:
+        tar_path = f'{runtime_image.replace(":", "_")}.tar'
+        save_command = ['docker', 'save', '-o', tar_path, runtime_image]
         subprocess.run(save_command, check=True)
         logger.info(f'Image saved to {tar_path}')
 
         load_command = ['docker', 'load', '-i', tar_path]
         subprocess.run(load_command, check=True)
-        logger.info(f'Image {new_image_name} loaded back into Docker from {tar_path}')
+        logger.info(f'Image {runtime_image} loaded back into Docker from {tar_path}')
 
-    return new_image_name
+    return runtime_image
 
 
 if __name__ == '__main__':
@@ -279,7 +339,7 @@ if __name__ == '__main__':
         logger.info(
             f'Will prepare a build folder by copying the source code and generating the Dockerfile: {build_folder}'
         )
-        new_image_path = get_new_image_name(args.base_image)
+        _, new_image_path = get_runtime_image_names(args.base_image)
         prep_docker_build_folder(
             build_folder, args.base_image, skip_init=args.update_source_code
         )
@@ -4,8 +4,6 @@ import uuid
 import warnings
 
 import requests
-from pathspec import PathSpec
-from pathspec.patterns import GitWildMatchPattern
 
 from opendevin.server.data_models.feedback import FeedbackDataModel, store_feedback
 from opendevin.storage import get_file_store
@@ -33,18 +31,15 @@ from opendevin.controller.agent import Agent
 from opendevin.core.config import LLMConfig, load_app_config
 from opendevin.core.logger import opendevin_logger as logger
 from opendevin.core.schema import AgentState  # Add this import
-from opendevin.events.action import ChangeAgentStateAction, NullAction
-from opendevin.events.observation import (
-    AgentStateChangedObservation,
-    NullObservation,
-)
-from opendevin.events.serialization import event_to_dict
 from opendevin.llm import bedrock
 from opendevin.server.auth import get_sid_from_token, sign_token
 from opendevin.server.session import SessionManager
+from opendevin.server.session.workspace import get_etag
 
 config = load_app_config()
-file_store = get_file_store(config.file_store, config.file_store_path)
+file_store = get_file_store(
+    config.file_store, config.file_store_path, config.file_store_write_behind
+)
 session_manager = SessionManager(config, file_store)
 
 app = FastAPI()
@@ -245,6 +240,12 @@ async def websocket_endpoint(websocket: WebSocket):
         ```json
         {"action": "finish", "args": {}}
         ```
+    - Replay the events before an event id (e.g. when connected with `replay_last`), or from an event id:
+        ```json
+        {"action": "replay", "args": {"before": 200, "limit": 100}}
+        {"action": "replay", "args": {"start": 200}}
+        ```
+      Replayed events are sent in frames: `{"replay": {"start", "end", "cursor", "done", "events"}}`.
     """
     await websocket.accept()
 
@@ -263,23 +264,27 @@ async def websocket_endpoint(websocket: WebSocket):
     session = session_manager.add_or_restart_session(sid, websocket)
     await websocket.send_json({'token': token, 'status': 'ok'})
 
-    latest_event_id = -1
-    if websocket.query_params.get('latest_event_id'):
-        latest_event_id = int(websocket.query_params.get('latest_event_id'))
-    for event in session.agent_session.event_stream.get_events(
-        start_id=latest_event_id + 1
-    ):
-        if isinstance(
-            event,
-            (
-                NullAction,
-                NullObservation,
-                ChangeAgentStateAction,
-                AgentStateChangedObservation,
-            ),
-        ):
-            continue
-        await websocket.send_json(event_to_dict(event))
+    # replay the events the client missed: all of them, or the last replay_last ones
+    latest_event_id_param = websocket.query_params.get('latest_event_id')
+    replay_last_param = websocket.query_params.get('replay_last')
+    try:
+        latest_event_id = int(latest_event_id_param) if latest_event_id_param else -1
+        replay_last = int(replay_last_param) if replay_last_param else None
+        if replay_last is not None and replay_last < 1:
+            raise ValueError('replay_last must be positive')
+    except ValueError as e:
+        logger.warning(f'Invalid replay parameters: {e}')
+        await websocket.send_json(
+            {'error': 'Invalid latest_event_id or replay_last', 'error_code': 400}
+        )
+        await websocket.close()
+        return
+    end_id = session.agent_session.event_stream.get_latest_event_id()
+    start_id = latest_event_id + 1
+    if replay_last is not None:
+        start_id = max(start_id, end_id - replay_last + 1)
+    if start_id <= end_id:
+        await session.replay(start_id, end_id)
 
     await session.loop_recv()
 
@@ -355,11 +360,13 @@ async def get_agents():
 
 
 @app.get('/api/list-files')
-def list_files(request: Request, path: str = '/'):
+def list_files(request: Request, path: str = '/', depth: int = 1):
     """List files in the specified path.
 
-    This function retrieves a list of files from the agent's runtime file store,
-    excluding certain system and hidden files/directories.
+    This function retrieves a list of files from the agent's workspace, excluding
+    what the .gitignore files ignore (or, without them, certain system and hidden
+    files/directories). The listings are cached per session, until the directories
+    change.
 
     To list files:
     ```sh
@@ -369,9 +376,11 @@ def list_files(request: Request, path: str = '/'):
     Args:
         request (Request): The incoming request object.
         path (str, optional): The path to list files from. Defaults to '/'.
+        depth (int, optional): The number of levels of the subtree to list. Defaults to 1.
 
     Returns:
-        list: A list of file names in the specified path.
+        list: A list of file names in the specified path, with an ETag: a request
+        with a matching If-None-Match header gets a 304 response.
 
     Raises:
         HTTPException: If there's an error listing the files.
@@ -383,80 +392,19 @@ def list_files(request: Request, path: str = '/'):
         )
 
     try:
-        # Get the full path of the requested directory
-        full_path = (
-            request.state.session.agent_session.runtime.file_store.get_full_path(path)
+        runtime = request.state.session.agent_session.runtime
+        tree = request.state.session.get_workspace_tree(
+            runtime.file_store.get_full_path('')
         )
-
-        # Check if the directory exists
-        if not os.path.exists(full_path) or not os.path.isdir(full_path):
+        paths = tree.list_paths(path, max(depth, 1))
+        if paths is None:
             return []
 
-        # Check if .gitignore exists
-        gitignore_path = os.path.join(full_path, '.gitignore')
-        if os.path.exists(gitignore_path):
-            # Use PathSpec to parse .gitignore
-            with open(gitignore_path, 'r') as f:
-                spec = PathSpec.from_lines(GitWildMatchPattern, f.readlines())
-        else:
-            # Fallback to default exclude list if .gitignore doesn't exist
-            default_exclude = [
-                '.git',
-                '.DS_Store',
-                '.svn',
-                '.hg',
-                '.idea',
-                '.vscode',
-                '.settings',
-                '.pytest_cache',
-                '__pycache__',
-                'node_modules',
-                'vendor',
-                'build',
-                'dist',
-                'bin',
-                'logs',
-                'log',
-                'tmp',
-                'temp',
-                'coverage',
-                'venv',
-                'env',
-            ]
-            spec = PathSpec.from_lines(GitWildMatchPattern, default_exclude)
-
-        entries = request.state.session.agent_session.runtime.file_store.list(path)
-
-        # Filter entries using PathSpec
-        filtered_entries = [
-            entry
-            for entry in entries
-            if not spec.match_file(os.path.relpath(entry, str(full_path)))
-        ]
-
-        # Separate directories and files
-        directories = []
-        files = []
-        for entry in filtered_entries:
-            # Remove leading slash and any parent directory components
-            entry_relative = entry.lstrip('/').split('/')[-1]
-
-            # Construct the full path by joining the base path with the relative entry path
-            full_entry_path = os.path.join(full_path, entry_relative)
-            if os.path.exists(full_entry_path):
-                is_dir = os.path.isdir(full_entry_path)
-                if is_dir:
-                    directories.append(entry)
-                else:
-                    files.append(entry)
-
-        # Sort directories and files separately
-        directories.sort(key=lambda s: s.lower())
-        files.sort(key=lambda s: s.lower())
-
-        # Combine sorted directories and files
-        sorted_entries = directories + files
-        return sorted_entries
+        # the client revalidates its copy on every request
+        headers = {'ETag': get_etag(paths), 'Cache-Control': 'no-cache'}
+        if request.headers.get('if-none-match') == headers['ETag']:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return JSONResponse(content=paths, headers=headers)
 
     except Exception as e:
         logger.error(f'Error listing files: {e}', exc_info=True)
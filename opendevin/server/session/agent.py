@@ -3,9 +3,11 @@ from typing import Optional
 from agenthub.codeact_agent.codeact_agent import CodeActAgent
 from opendevin.controller import AgentController
 from opendevin.controller.agent import Agent
+from opendevin.controller.state.checkpoint import StateCheckpointer
 from opendevin.controller.state.state import State
 from opendevin.core.config import AppConfig, LLMConfig
 from opendevin.core.logger import opendevin_logger as logger
+from opendevin.events.compaction import BrowserObservationCompactor
 from opendevin.events.stream import EventStream
 from opendevin.runtime import DockerSSHBox, get_runtime_cls
 from opendevin.runtime.runtime import Runtime
@@ -26,10 +28,16 @@ class AgentSession:
     runtime: Optional[Runtime] = None
     _closed: bool = False
 
-    def __init__(self, sid: str, file_store: FileStore):
+    def __init__(
+        self,
+        sid: str,
+        file_store: FileStore,
+        event_log: str = 'files',
+        compactor: BrowserObservationCompactor | None = None,
+    ):
         """Initializes a new instance of the Session class."""
         self.sid = sid
-        self.event_stream = EventStream(sid, file_store)
+        self.event_stream = EventStream(sid, file_store, event_log, compactor=compactor)
         self.file_store = file_store
 
     async def start(
@@ -65,7 +73,7 @@ class AgentSession:
             return
         if self.controller is not None:
             end_state = self.controller.get_state()
-            end_state.save_to_session(self.sid, self.file_store)
+            await end_state.asave_to_session(self.sid, self.file_store)
             await self.controller.close()
         if self.runtime is not None:
             await self.runtime.close()
@@ -110,7 +118,7 @@ class AgentSession:
                     'CodeActAgent requires DockerSSHBox as sandbox! Using other sandbox that are not stateful'
                     ' LocalBox will not work properly.'
                 )
-        self.runtime.init_runtime_tools(agent.runtime_tools)
+        await self.runtime.init_runtime_tools(agent.runtime_tools)
 
         self.controller = AgentController(
             sid=self.sid,
@@ -123,6 +131,7 @@ class AgentSession:
             # AgentSession is designed to communicate with the frontend, so we don't want to
             # run the agent in headless mode.
             headless_mode=False,
+            checkpointer=StateCheckpointer(self.sid, self.file_store),
         )
         try:
             agent_state = State.restore_from_session(self.sid, self.file_store)
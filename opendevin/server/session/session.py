@@ -1,5 +1,7 @@
 import asyncio
+import os
 import time
+from typing import Iterator
 
 from fastapi import WebSocket, WebSocketDisconnect
 
@@ -11,6 +13,7 @@ from opendevin.core.schema import AgentState
 from opendevin.core.schema.action import ActionType
 from opendevin.core.schema.config import ConfigType
 from opendevin.events.action import ChangeAgentStateAction, NullAction
+from opendevin.events.compaction import get_observation_compactor
 from opendevin.events.event import Event, EventSource
 from opendevin.events.observation import (
     AgentStateChangedObservation,
@@ -18,13 +21,71 @@ from opendevin.events.observation import (
     NullObservation,
 )
 from opendevin.events.serialization import event_from_dict, event_to_dict
-from opendevin.events.stream import EventStreamSubscriber
+from opendevin.events.stream import EventStream, EventStreamSubscriber
 from opendevin.llm.llm import LLM
 from opendevin.storage.files import FileStore
 
 from .agent import AgentSession
+from .workspace import WorkspaceTree
 
 DEL_DELT_SEC = 60 * 60 * 5
+# replayed events are sent in frames of about this many characters (a larger event is
+# sent in a frame of its own)
+REPLAY_FRAME_SIZE = 256 * 1024
+# the number of events a replay request pages back, by default
+REPLAY_PAGE_SIZE = 100
+# events the client doesn't show
+REPLAY_FILTERED_TYPES = (
+    NullAction,
+    NullObservation,
+    ChangeAgentStateAction,
+    AgentStateChangedObservation,
+)
+
+
+def iter_replay_frames(
+    event_stream: EventStream,
+    start_id: int,
+    end_id: int,
+    max_frame_size: int = REPLAY_FRAME_SIZE,
+) -> Iterator[str]:
+    """Yields the frames replaying the events from start_id to end_id, as JSON text.
+
+    A frame is {"replay": {"start", "end", "cursor", "done", "events"}}: start and end
+    are the range being replayed, and cursor is the id to resume the replay from, once
+    the frame is received. The events are put in the frame as they are stored, without
+    decoding them. The last frame is done, and may have no events.
+    """
+    events: list[str] = []
+    size = 0
+
+    def frame(cursor: int, done: bool) -> str:
+        return (
+            f'{{"replay": {{"start": {start_id}, "end": {end_id}, "cursor": {cursor}, '
+            f'"done": {"true" if done else "false"}, "events": [{", ".join(events)}]}}}}'
+        )
+
+    for id, content in event_stream.get_serialized_events(
+        start_id, end_id, filter_out_type=REPLAY_FILTERED_TYPES
+    ):
+        if events and size + len(content) > max_frame_size:
+            yield frame(id, False)
+            events = []
+            size = 0
+        events.append(content)
+        size += len(content)
+    yield frame(end_id + 1, True)
+
+
+def _non_negative_int(value: object) -> int | None:
+    """Returns value as a non-negative int, or None if it isn't one."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value >= 0 else None
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return None
 
 
 class Session:
@@ -40,11 +101,25 @@ class Session:
         self.sid = sid
         self.websocket = ws
         self.last_active_ts = int(time.time())
-        self.agent_session = AgentSession(sid, file_store)
+        self.agent_session = AgentSession(
+            sid,
+            file_store,
+            config.event_log,
+            compactor=get_observation_compactor(config),
+        )
         self.agent_session.event_stream.subscribe(
             EventStreamSubscriber.SERVER, self.on_event
         )
         self.config = config
+        self._workspace_tree: WorkspaceTree | None = None
+
+    def get_workspace_tree(self, root: str) -> WorkspaceTree:
+        """Returns the cached file tree of the workspace at root."""
+        if self._workspace_tree is None or self._workspace_tree.root != os.path.abspath(
+            root
+        ):
+            self._workspace_tree = WorkspaceTree(root)
+        return self._workspace_tree
 
     async def close(self):
         self.is_alive = False
@@ -139,11 +214,58 @@ class Session:
         ):
             await self.send(event_to_dict(event))
 
+    async def replay(self, start_id: int, end_id: int | None = None):
+        """Sends the events from start_id to end_id (by default, the latest event) in frames.
+
+        The frames are read from the storage in a worker thread, one at a time, so that
+        the event loop keeps running and a slow client doesn't make the server buffer
+        the whole session.
+        """
+        event_stream = self.agent_session.event_stream
+        if end_id is None:
+            end_id = event_stream.get_latest_event_id()
+        frames = iter_replay_frames(event_stream, max(start_id, 0), end_id)
+        while True:
+            frame = await asyncio.to_thread(next, frames, None)
+            if frame is None or not await self.send_text(frame):
+                return
+
+    async def _replay_request(self, args: object):
+        """Replays the page of events before args['before'], or the events from args['start'].
+
+        The page is at most REPLAY_PAGE_SIZE events, and ends at the latest event.
+        """
+        if not isinstance(args, dict):
+            args = {}
+        latest_id = self.agent_session.event_stream.get_latest_event_id()
+        if 'before' in args:
+            before = _non_negative_int(args['before'])
+            limit = _non_negative_int(args.get('limit', REPLAY_PAGE_SIZE))
+            if before is None or limit is None:
+                await self.send_error(
+                    'Invalid replay request: before and limit must be non-negative integers'
+                )
+                return
+            before = min(before, latest_id + 1)
+            limit = min(limit, REPLAY_PAGE_SIZE)
+            await self.replay(before - limit, before - 1)
+        else:
+            start = _non_negative_int(args.get('start', 0))
+            if start is None:
+                await self.send_error(
+                    'Invalid replay request: start must be a non-negative integer'
+                )
+                return
+            await self.replay(start, latest_id)
+
     async def dispatch(self, data: dict):
         action = data.get('action', '')
         if action == ActionType.INIT:
             await self._initialize_agent(data)
             return
+        if action == ActionType.REPLAY:
+            await self._replay_request(data.get('args'))
+            return
         event = event_from_dict(data.copy())
         self.agent_session.event_stream.add_event(event, EventSource.USER)
 
@@ -159,6 +281,18 @@ class Session:
             self.is_alive = False
             return False
 
+    async def send_text(self, text: str) -> bool:
+        """Sends JSON that is already serialized."""
+        try:
+            if self.websocket is None or not self.is_alive:
+                return False
+            await self.websocket.send_text(text)
+            self.last_active_ts = int(time.time())
+            return True
+        except WebSocketDisconnect:
+            self.is_alive = False
+            return False
+
     async def send_error(self, message: str) -> bool:
         """Sends an error message to the client."""
         return await self.send({'error': True, 'message': message})
@@ -0,0 +1,231 @@
+"""The file tree of a workspace, as the file explorer lists it.
+
+Listing a directory reads its entries with one scandir, filters them with the
+.gitignore files of the workspace root and of the directories down to it (or a default
+list of excludes, if there is none), and sorts them, directories first. The listing is
+kept for as long as the directory's mtime stays the same, which changes when an entry is
+added, removed or renamed, and the .gitignore files are compiled once per mtime: listing
+an unchanged directory again costs a stat of it and of its .gitignore files.
+"""
+
+import hashlib
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from pathspec import PathSpec
+from pathspec.patterns import GitWildMatchPattern
+
+DEFAULT_EXCLUDES = [
+    '.git',
+    '.DS_Store',
+    '.svn',
+    '.hg',
+    '.idea',
+    '.vscode',
+    '.settings',
+    '.pytest_cache',
+    '__pycache__',
+    'node_modules',
+    'vendor',
+    'build',
+    'dist',
+    'bin',
+    'logs',
+    'log',
+    'tmp',
+    'temp',
+    'coverage',
+    'venv',
+    'env',
+]
+MAX_CACHED_DIRS = 10000
+# a directory changed this recently may change again within the resolution of its
+# mtime, unnoticed: its listing isn't kept
+RACY_MTIME_NS = 2 * 1_000_000_000
+
+_default_spec = PathSpec.from_lines(GitWildMatchPattern, DEFAULT_EXCLUDES)
+
+
+class _Listing:
+    __slots__ = ('mtime_ns', 'gitignore_mtimes', 'entries')
+
+    def __init__(
+        self,
+        mtime_ns: int,
+        gitignore_mtimes: tuple[int, ...],
+        entries: list[tuple[str, bool]],
+    ):
+        self.mtime_ns = mtime_ns
+        self.gitignore_mtimes = gitignore_mtimes
+        self.entries = entries
+
+
+class WorkspaceTree:
+    """The listings of the directories of a workspace, kept until they change."""
+
+    def __init__(self, root: str, max_dirs: int = MAX_CACHED_DIRS):
+        self.root = os.path.abspath(root)
+        self.max_dirs = max_dirs
+        # by directory, relative to the root ('' for the root)
+        self._listings: OrderedDict[str, _Listing] = OrderedDict()
+        # compiled .gitignore files, by directory, with the mtime they were compiled at
+        self._gitignores: dict[str, tuple[int, PathSpec]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load_gitignore(self, rel_dir: str) -> tuple[int, PathSpec] | None:
+        path = os.path.join(self.root, rel_dir, '.gitignore')
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._gitignores.get(rel_dir)
+        if cached is not None and cached[0] == mtime:
+            return cached
+        try:
+            with open(path, 'r', errors='ignore') as f:
+                spec = PathSpec.from_lines(GitWildMatchPattern, f.readlines())
+        except OSError:
+            return None
+        self._gitignores[rel_dir] = (mtime, spec)
+        return mtime, spec
+
+    def _ignore_rules(
+        self, rel_dir: str
+    ) -> tuple[list[tuple[str, PathSpec]], tuple[int, ...]]:
+        """Returns the .gitignore files from the root down to rel_dir, and their mtimes."""
+        parts = rel_dir.split('/') if rel_dir else []
+        specs = []
+        mtimes = []
+        for i in range(len(parts) + 1):
+            base = '/'.join(parts[:i])
+            gitignore = self._load_gitignore(base)
+            if gitignore is None:
+                mtimes.append(-1)
+            else:
+                mtimes.append(gitignore[0])
+                specs.append((base, gitignore[1]))
+        return specs, tuple(mtimes)
+
+    @staticmethod
+    def _is_ignored(
+        rel_path: str, is_dir: bool, specs: list[tuple[str, PathSpec]]
+    ) -> bool:
+        if is_dir:
+            rel_path += '/'
+        if not specs:
+            return _default_spec.match_file(rel_path)
+        # the deepest .gitignore with a matching pattern decides, as in git
+        for base, spec in reversed(specs):
+            include = spec.check_file(
+                rel_path[len(base) + 1 :] if base else rel_path
+            ).include
+            if include is not None:
+                return include
+        return False
+
+    def list_dir(self, rel_dir: str) -> list[tuple[str, bool]] | None:
+        """Returns the (name, is_dir) of the entries of the directory that aren't ignored.
+
+        Directories come first, and each group is sorted by name, case-insensitively.
+        Returns None if rel_dir isn't a directory.
+        """
+        abs_dir = os.path.join(self.root, rel_dir)
+        try:
+            dir_stat = os.stat(abs_dir)
+        except OSError:
+            dir_stat = None
+        if dir_stat is None or not stat.S_ISDIR(dir_stat.st_mode):
+            with self._lock:
+                self._listings.pop(rel_dir, None)
+            return None
+        specs, gitignore_mtimes = self._ignore_rules(rel_dir)
+        with self._lock:
+            listing = self._listings.get(rel_dir)
+            if (
+                listing is not None
+                and listing.mtime_ns == dir_stat.st_mtime_ns
+                and listing.gitignore_mtimes == gitignore_mtimes
+            ):
+                self._listings.move_to_end(rel_dir)
+                self.hits += 1
+                return listing.entries
+            self.misses += 1
+
+        dirs: list[str] = []
+        files: list[str] = []
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                if self._is_ignored(rel_path, is_dir, specs):
+                    continue
+                (dirs if is_dir else files).append(entry.name)
+        dirs.sort(key=str.lower)
+        files.sort(key=str.lower)
+        entries = [(name, True) for name in dirs] + [(name, False) for name in files]
+
+        if time.time_ns() - dir_stat.st_mtime_ns > RACY_MTIME_NS:
+            with self._lock:
+                self._listings[rel_dir] = _Listing(
+                    dir_stat.st_mtime_ns, gitignore_mtimes, entries
+                )
+                self._listings.move_to_end(rel_dir)
+                while len(self._listings) > self.max_dirs:
+                    self._listings.popitem(last=False)
+        return entries
+
+    def list_paths(self, path: str, depth: int = 1) -> list[str] | None:
+        """Returns the paths of the entries under path, down to depth levels.
+
+        The paths are joined to path, directories end with a slash, and the entries of
+        a directory follow it. Returns None if path isn't a directory of the workspace.
+        """
+        rel_dir = os.path.normpath(path.lstrip('/'))
+        if rel_dir == '.':
+            rel_dir = ''
+        if rel_dir == '..' or rel_dir.startswith('../'):
+            return None
+        paths: list[str] = []
+        if not self._walk(rel_dir, path, depth, paths):
+            return None
+        return paths
+
+    def _walk(self, rel_dir: str, path: str, depth: int, paths: list[str]) -> bool:
+        entries = self.list_dir(rel_dir)
+        if entries is None:
+            return False
+        for name, is_dir in entries:
+            entry_path = os.path.join(path, name)
+            if not is_dir:
+                paths.append(entry_path)
+                continue
+            paths.append(entry_path + '/')
+            if depth > 1:
+                self._walk(
+                    f'{rel_dir}/{name}' if rel_dir else name,
+                    entry_path + '/',
+                    depth - 1,
+                    paths,
+                )
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'cached_dirs': len(self._listings),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+def get_etag(paths: list[str]) -> str:
+    """Returns the ETag of a listing."""
+    return '"' + hashlib.sha256('\n'.join(paths).encode('utf-8')).hexdigest() + '"'
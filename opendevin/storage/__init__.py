@@ -2,13 +2,22 @@ from .files import FileStore
 from .local import LocalFileStore
 from .memory import InMemoryFileStore
 from .s3 import S3FileStore
+from .write_behind import WriteBehindFileStore
 
 
-def get_file_store(file_store: str, file_store_path: str | None = None) -> FileStore:
+def get_file_store(
+    file_store: str, file_store_path: str | None = None, write_behind: bool = False
+) -> FileStore:
+    store: FileStore
     if file_store == 'local':
         if file_store_path is None:
             raise ValueError('file_store_path is required for local file store')
-        return LocalFileStore(file_store_path)
+        store = LocalFileStore(file_store_path)
     elif file_store == 's3':
-        return S3FileStore()
-    return InMemoryFileStore()
+        store = S3FileStore()
+    else:
+        # writes to memory don't block: there is nothing to buffer
+        return InMemoryFileStore()
+    if write_behind:
+        return WriteBehindFileStore(store)
+    return store
@@ -1,7 +1,13 @@
+import asyncio
+import builtins
 from abc import abstractmethod
+from typing import Iterable
 
 
 class FileStore:
+    # whether append writes only the appended contents, rather than the whole file
+    supports_append: bool = False
+
     @abstractmethod
     def write(self, path: str, contents: str) -> None:
         pass
@@ -17,3 +23,63 @@ class FileStore:
     @abstractmethod
     def delete(self, path: str) -> None:
         pass
+
+    def append(self, path: str, contents: str) -> None:
+        """Append contents to the file at path, creating it if needed.
+
+        Stores that support native appends should override this, and set
+        supports_append; the default rewrites the whole file.
+        """
+        try:
+            existing = self.read(path)
+        except FileNotFoundError:
+            existing = ''
+        self.write(path, existing + contents)
+
+    def read_range(self, path: str, start: int, end: int | None = None) -> str:
+        """Read the bytes [start, end) of the file at path, decoded as utf-8."""
+        return self.read(path).encode('utf-8')[start:end].decode('utf-8')
+
+    def write_many(self, files: dict[str, str]) -> None:
+        """Write several files. Stores that can write them concurrently should override this."""
+        for path, contents in files.items():
+            self.write(path, contents)
+
+    def read_many(self, paths: Iterable[str]) -> dict[str, str]:
+        """Read several files, by path. Files that do not exist are left out."""
+        contents = {}
+        for path in paths:
+            try:
+                contents[path] = self.read(path)
+            except FileNotFoundError:
+                pass
+        return contents
+
+    def flush(self) -> None:
+        """Wait until the writes made so far are durable. Stores that buffer writes override this."""
+        pass
+
+    # The async API runs the blocking calls in a worker thread, so that they don't block
+    # the event loop; stores that don't block override it.
+
+    async def awrite(self, path: str, contents: str) -> None:
+        await asyncio.to_thread(self.write, path, contents)
+
+    async def aread(self, path: str) -> str:
+        return await asyncio.to_thread(self.read, path)
+
+    async def alist(self, path: str) -> builtins.list[str]:
+        return await asyncio.to_thread(self.list, path)
+
+    async def adelete(self, path: str) -> None:
+        await asyncio.to_thread(self.delete, path)
+
+    async def awrite_many(self, files: dict[str, str]) -> None:
+        await asyncio.to_thread(self.write_many, files)
+
+    async def aread_many(self, paths: Iterable[str]) -> dict[str, str]:
+        return await asyncio.to_thread(self.read_many, paths)
+
+    async def aflush(self) -> None:
+        """The durability barrier: returns once the writes made so far are durable."""
+        await asyncio.to_thread(self.flush)
@@ -8,6 +8,7 @@ from .files import FileStore
 
 class LocalFileStore(FileStore):
     root: str
+    supports_append = True
 
     def __init__(self, root: str):
         self.root = root
@@ -30,6 +31,19 @@ class LocalFileStore(FileStore):
         with open(full_path, 'r') as f:
             return f.read()
 
+    def append(self, path: str, contents: str) -> None:
+        full_path = self.get_full_path(path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'ab') as f:
+            f.write(contents.encode('utf-8'))
+
+    def read_range(self, path: str, start: int, end: int | None = None) -> str:
+        full_path = self.get_full_path(path)
+        with open(full_path, 'rb') as f:
+            f.seek(start)
+            data = f.read() if end is None else f.read(end - start)
+        return data.decode('utf-8')
+
     def list(self, path: str) -> list[str]:
         full_path = self.get_full_path(path)
         files = [os.path.join(path, f) for f in os.listdir(full_path)]
@@ -1,4 +1,6 @@
+import builtins
 import os
+from typing import Iterable
 
 from opendevin.core.logger import opendevin_logger as logger
 
@@ -38,6 +40,29 @@ class InMemoryFileStore(FileStore):
                     files.append(dir_path)
         return files
 
+    # nothing blocks: the async API runs in the loop
+
+    async def awrite(self, path: str, contents: str) -> None:
+        self.write(path, contents)
+
+    async def aread(self, path: str) -> str:
+        return self.read(path)
+
+    async def alist(self, path: str) -> builtins.list[str]:
+        return self.list(path)
+
+    async def adelete(self, path: str) -> None:
+        self.delete(path)
+
+    async def awrite_many(self, files: dict[str, str]) -> None:
+        self.write_many(files)
+
+    async def aread_many(self, paths: Iterable[str]) -> dict[str, str]:
+        return self.read_many(paths)
+
+    async def aflush(self) -> None:
+        pass
+
     def delete(self, path: str) -> None:
         try:
             keys_to_delete = [key for key in self.files.keys() if key.startswith(path)]
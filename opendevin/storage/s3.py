@@ -1,27 +1,178 @@
+import io
 import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator
 
+import urllib3
 from minio import Minio
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+
+from opendevin.core.logger import opendevin_logger as logger
 
 from .files import FileStore
 
 AWS_S3_ENDPOINT = 's3.amazonaws.com'
+# the number of requests write_many and read_many make at a time, and the number of
+# connections kept open
+MAX_CONCURRENT_REQUESTS = 32
+# the number of keys S3 returns per listing request
+LIST_PAGE_SIZE = 1000
+REQUEST_TIMEOUT = 30
+
+
+def _make_http_client() -> urllib3.PoolManager:
+    return urllib3.PoolManager(
+        maxsize=MAX_CONCURRENT_REQUESTS,
+        # don't open more connections than the pool keeps
+        block=True,
+        timeout=urllib3.Timeout(connect=5, read=REQUEST_TIMEOUT),
+        retries=urllib3.Retry(
+            total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]
+        ),
+    )
 
 
 class S3FileStore(FileStore):
-    def __init__(self, endpoint: str = AWS_S3_ENDPOINT) -> None:
-        access_key = os.getenv('AWS_ACCESS_KEY_ID')
-        secret_key = os.getenv('AWS_SECRET_ACCESS_KEY')
-        self.bucket = os.getenv('AWS_S3_BUCKET')
-        self.client = Minio(endpoint, access_key, secret_key)
+    """A FileStore in an S3 bucket, or in any server with the S3 API (e.g. MinIO).
+
+    The bucket, credentials and endpoint are read from the AWS_S3_BUCKET,
+    AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_S3_ENDPOINT and AWS_S3_SECURE
+    environment variables; set AWS_S3_ENDPOINT=localhost:9000 and AWS_S3_SECURE=false
+    to use a local MinIO server. A missing bucket is an error when the store is created.
+
+    Requests go through a pool of kept-alive connections, sized for the batches of
+    `write_many` and `read_many`, which make their requests concurrently.
+    """
+
+    bucket: str
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        client: Minio | None = None,
+        bucket: str | None = None,
+    ):
+        bucket = bucket or os.getenv('AWS_S3_BUCKET')
+        if not bucket:
+            raise ValueError('No S3 bucket: set the AWS_S3_BUCKET environment variable')
+        self.bucket = bucket
+        if client is None:
+            secure = os.getenv('AWS_S3_SECURE', 'true').lower() not in (
+                '0',
+                'false',
+                'no',
+            )
+            client = Minio(
+                endpoint or os.getenv('AWS_S3_ENDPOINT') or AWS_S3_ENDPOINT,
+                os.getenv('AWS_ACCESS_KEY_ID'),
+                os.getenv('AWS_SECRET_ACCESS_KEY'),
+                secure=secure,
+                http_client=_make_http_client(),
+            )
+        self.client = client
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix='s3-file-store'
+        )
+
+    def _get(self, path: str, offset: int = 0, length: int = 0) -> str:
+        try:
+            response = self.client.get_object(
+                self.bucket, path, offset=offset, length=length
+            )
+        except S3Error as e:
+            if e.code == 'NoSuchKey':
+                raise FileNotFoundError(path) from e
+            raise
+        try:
+            return response.data.decode('utf-8')
+        finally:
+            # give the connection back to the pool
+            response.close()
+            response.release_conn()
 
     def write(self, path: str, contents: str) -> None:
-        self.client.put_object(self.bucket, path, contents)
+        data = contents.encode('utf-8')
+        self.client.put_object(self.bucket, path, io.BytesIO(data), len(data))
 
     def read(self, path: str) -> str:
-        return self.client.get_object(self.bucket, path).data.decode('utf-8')
+        return self._get(path)
+
+    def read_range(self, path: str, start: int, end: int | None = None) -> str:
+        if end is not None and end <= start:
+            return ''
+        # a length of 0 reads to the end
+        return self._get(path, start, 0 if end is None else end - start)
+
+    def write_many(self, files: dict[str, str]) -> None:
+        """Writes the files concurrently."""
+        for future in [
+            self._executor.submit(self.write, path, contents)
+            for path, contents in files.items()
+        ]:
+            future.result()
+
+    def read_many(self, paths: Iterable[str]) -> dict[str, str]:
+        """Reads the files concurrently. Files that do not exist are left out."""
+        futures = [(path, self._executor.submit(self.read, path)) for path in paths]
+        contents = {}
+        for path, future in futures:
+            try:
+                contents[path] = future.result()
+            except FileNotFoundError:
+                pass
+        return contents
+
+    @staticmethod
+    def _prefix(path: str) -> str:
+        # keys have no leading slash, and the files of a directory are under 'path/'
+        path = path.lstrip('/')
+        if path and not path.endswith('/'):
+            path += '/'
+        return path
+
+    def iter_list(
+        self, path: str, start_after: str | None = None, recursive: bool = False
+    ) -> Iterator[str]:
+        """Yields the keys under path, in lexicographic order, after start_after.
+
+        The keys are listed a page (of up to 1000 keys) at a time, as they are consumed.
+        Without recursive, each subdirectory is yielded once, with a trailing slash.
+        """
+        for obj in self.client.list_objects(
+            self.bucket,
+            prefix=self._prefix(path),
+            recursive=recursive,
+            start_after=start_after,
+        ):
+            yield obj.object_name
+
+    def list_page(
+        self,
+        path: str,
+        start_after: str | None = None,
+        limit: int = LIST_PAGE_SIZE,
+        recursive: bool = False,
+    ) -> list[str]:
+        """Returns up to limit keys under path, after start_after.
+
+        Pass the last key of a page as the start_after of the next one.
+        """
+        return list(islice(self.iter_list(path, start_after, recursive), limit))
 
     def list(self, path: str) -> list[str]:
-        return [obj.object_name for obj in self.client.list_objects(self.bucket, path)]
+        return list(self.iter_list(path))
 
     def delete(self, path: str) -> None:
-        self.client.remove_object(self.bucket, path)
+        """Deletes the file at path, or all the files under it if it is a directory."""
+        key = path.lstrip('/')
+        if key and not key.endswith('/'):
+            self.client.remove_object(self.bucket, key)
+        # a request deletes up to 1000 keys
+        errors = self.client.remove_objects(
+            self.bucket,
+            (DeleteObject(name) for name in self.iter_list(key, recursive=True)),
+        )
+        for error in errors:
+            logger.error(f'Failed to delete {error.name} from S3: {error.message}')
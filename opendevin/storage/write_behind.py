@@ -0,0 +1,227 @@
+import atexit
+import threading
+import time
+from typing import Iterable
+
+from opendevin.core.logger import opendevin_logger as logger
+
+from .files import FileStore
+
+
+class _Pending:
+    """The writes to a path that aren't in the store yet: a whole content, or appends."""
+
+    __slots__ = ('contents', 'is_append')
+
+    def __init__(self, contents: str, is_append: bool):
+        self.contents = contents
+        self.is_append = is_append
+
+    def then(self, later: '_Pending') -> '_Pending':
+        """Returns the pending writes of this, followed by the later ones."""
+        if not later.is_append:
+            return later
+        return _Pending(self.contents + later.contents, self.is_append)
+
+
+class WriteBehindFileStore(FileStore):
+    """A FileStore that buffers the writes to another one, and flushes them in batches.
+
+    Writes and appends return as soon as they are buffered; a flusher thread writes them
+    to the store with `write_many` when the buffer holds max_pending_bytes, or
+    flush_interval seconds after the first buffered write. `flush` (or `aflush`) is the
+    durability barrier: it returns once everything written before it is in the store.
+
+    Reads, listings and deletions see the buffered writes: they flush the buffer first,
+    if it holds writes under the path.
+    """
+
+    def __init__(
+        self,
+        store: FileStore,
+        max_pending_bytes: int = 1024 * 1024,
+        flush_interval: float = 1.0,
+    ):
+        self.store = store
+        self.max_pending_bytes = max_pending_bytes
+        self.flush_interval = flush_interval
+        self._pending: dict[str, _Pending] = {}
+        # the batch being written
+        self._inflight: dict[str, _Pending] = {}
+        self._pending_bytes = 0
+        self._first_pending_time: float | None = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        # held while a batch is written, so that flushes are applied in order
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self.flushes = 0
+        self.flushed_files = 0
+        self.failed_flushes = 0
+        self._thread = threading.Thread(
+            target=self._run, name='write-behind', daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _buffer(self, path: str, pending: _Pending) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The file store is closed')
+            previous = self._pending.get(path)
+            self._pending[path] = (
+                pending if previous is None else previous.then(pending)
+            )
+            self._pending_bytes += len(pending.contents)
+            if self._first_pending_time is None:
+                # start the flush interval
+                self._first_pending_time = time.monotonic()
+                self._changed.notify_all()
+            elif self._pending_bytes >= self.max_pending_bytes:
+                self._changed.notify_all()
+
+    @property
+    def supports_append(self) -> bool:  # type: ignore[override]
+        return self.store.supports_append
+
+    def write(self, path: str, contents: str) -> None:
+        self._buffer(path, _Pending(contents, is_append=False))
+
+    def append(self, path: str, contents: str) -> None:
+        self._buffer(path, _Pending(contents, is_append=True))
+
+    def write_many(self, files: dict[str, str]) -> None:
+        for path, contents in files.items():
+            self.write(path, contents)
+
+    def _has_pending(self, path: str) -> bool:
+        with self._lock:
+            return any(
+                pending_path.startswith(path)
+                for pending_path in (*self._pending, *self._inflight)
+            )
+
+    def read(self, path: str) -> str:
+        if self._has_pending(path):
+            self.flush()
+        return self.store.read(path)
+
+    def read_range(self, path: str, start: int, end: int | None = None) -> str:
+        if self._has_pending(path):
+            self.flush()
+        return self.store.read_range(path, start, end)
+
+    def read_many(self, paths: Iterable[str]) -> dict[str, str]:
+        paths = list(paths)
+        if any(self._has_pending(path) for path in paths):
+            self.flush()
+        return self.store.read_many(paths)
+
+    def list(self, path: str) -> list[str]:
+        if self._has_pending(path):
+            self.flush()
+        return self.store.list(path)
+
+    def delete(self, path: str) -> None:
+        if self._has_pending(path):
+            self.flush()
+        self.store.delete(path)
+
+    def flush(self) -> None:
+        """Writes the buffered writes to the store. Raises if they could not be written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+                self._pending_bytes = 0
+                self._first_pending_time = None
+            if not batch:
+                return
+            written: set[str] = set()
+            try:
+                writes = {
+                    path: pending.contents
+                    for path, pending in batch.items()
+                    if not pending.is_append
+                }
+                self.store.write_many(writes)
+                written.update(writes)
+                for path, pending in batch.items():
+                    if pending.is_append:
+                        self.store.append(path, pending.contents)
+                        written.add(path)
+            except Exception:
+                # put what wasn't written back in front of the later writes, for the
+                # next flush (appends must not be applied twice)
+                batch = {
+                    path: pending
+                    for path, pending in batch.items()
+                    if path not in written
+                }
+                with self._lock:
+                    self._inflight = {}
+                    self.failed_flushes += 1
+                    for path, pending in self._pending.items():
+                        previous = batch.get(path)
+                        batch[path] = (
+                            pending if previous is None else previous.then(pending)
+                        )
+                    self._pending = batch
+                    self._pending_bytes = sum(
+                        len(pending.contents) for pending in batch.values()
+                    )
+                    self._first_pending_time = time.monotonic()
+                raise
+            with self._lock:
+                self._inflight = {}
+                self.flushes += 1
+                self.flushed_files += len(batch)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._pending_bytes >= self.max_pending_bytes:
+                        break
+                    if self._first_pending_time is None:
+                        self._changed.wait()
+                        continue
+                    remaining = (
+                        self._first_pending_time
+                        + self.flush_interval
+                        - time.monotonic()
+                    )
+                    if remaining <= 0:
+                        break
+                    self._changed.wait(remaining)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f'Failed to flush buffered file store writes: {e}')
+                # don't retry in a tight loop
+                time.sleep(self.flush_interval)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending_files': len(self._pending),
+                'pending_bytes': self._pending_bytes,
+                'flushes': self.flushes,
+                'flushed_files': self.flushed_files,
+                'failed_flushes': self.failed_flushes,
+            }
+
+    def close(self) -> None:
+        """Flushes the buffered writes, and stops the flusher thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._changed.notify_all()
+        self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f'Failed to flush buffered file store writes: {e}')
@@ -0,0 +1,52 @@
+"""Micro-benchmark of the commands per second a BashSession runs.
+
+It compares the single round-trip execution, where the exit code comes with the
+prompt, against the previous way of asking for it with a second `echo $?` command.
+
+Usage (from the repository root): python -m tests.benchmark.bash_roundtrip [--commands N]
+"""
+
+import argparse
+import re
+import tempfile
+import time
+
+from opendevin.runtime.utils.bash import BashSession
+
+
+def run_single_roundtrip(session: BashSession, command: str) -> int:
+    _, exit_code = session.execute(command, timeout=30)
+    return exit_code
+
+
+def run_with_exit_code_query(session: BashSession, command: str) -> int:
+    session.execute(command, timeout=30)
+    output, _ = session.execute('echo $?', timeout=30, keep_prompt=False)
+    matched = re.search(r'^\s*(\d+)\s*$', output, re.MULTILINE)
+    assert matched is not None, f'No exit code in: {output!r}'
+    return int(matched.group(1))
+
+
+def commands_per_second(session: BashSession, run, count: int) -> float:
+    start = time.perf_counter()
+    for i in range(count):
+        assert run(session, f'echo {i} > /dev/null') == 0
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--commands', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        session = BashSession(work_dir)
+        try:
+            for name, run in [
+                ('echo $? round-trip', run_with_exit_code_query),
+                ('exit code in prompt', run_single_roundtrip),
+            ]:
+                rate = commands_per_second(session, run, args.commands)
+                print(f'{name:>20}: {rate:8.1f} commands/s')
+        finally:
+            session.close()
@@ -1,10 +1,12 @@
 import asyncio
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from agenthub.codeact_agent.codeact_agent import CodeActAgent
 from opendevin.core.config import load_app_config
 from opendevin.core.exceptions import UserCancelledError
+from opendevin.events.action import CmdRunAction
 from opendevin.llm.llm import LLM
 
 config = load_app_config()
@@ -185,3 +187,45 @@ async def test_async_streaming_completion_with_user_cancellation(cancel_after_ch
 
     # Ensure the mock was called
     mock_call_acompletion.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_streaming_step_stops_at_closing_tag():
+    test_messages = [
+        'Let me list the files.\n<execute_',
+        'bash>\nls -l\n</exec',
+        'ute_bash>',
+        ' and then some more text',
+        ' that should never be read',
+    ]
+    received = []
+    closed = False
+
+    async def mock_acompletion(*args, **kwargs):
+        nonlocal closed
+        try:
+            for content in test_messages:
+                received.append(content)
+                yield {'choices': [{'delta': {'content': content}}]}
+        finally:
+            closed = True
+
+    llm_config = config.get_llm_config()
+    llm_config.streaming = True
+    with patch.object(
+        LLM, '_call_acompletion', new_callable=AsyncMock
+    ) as mock_call_acompletion:
+        mock_call_acompletion.return_value = mock_acompletion()
+        agent = CodeActAgent(llm=LLM(config=llm_config))
+        state = MagicMock()
+        state.history.get_last_user_message.return_value = 'list the files'
+        with patch.object(agent, '_get_messages', return_value=[]):
+            action = await agent.astep(state)
+
+    assert isinstance(action, CmdRunAction)
+    assert action.command == 'ls -l'
+    assert action.thought == 'Let me list the files.'
+    assert received == test_messages[:3]
+    # the request to the provider is closed
+    assert closed
+    assert mock_call_acompletion.call_args.kwargs['stream'] is True
@@ -84,6 +84,7 @@ def test_cmd_run_action_serialization_deserialization():
         'args': {
             'command': 'echo "Hello world"',
             'thought': '',
+            'background': False,
             'is_confirmed': ActionConfirmationStatus.CONFIRMED,
         },
     }
@@ -0,0 +1,78 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+from pytest import TempPathFactory
+
+from opendevin.controller.agent import Agent
+from opendevin.controller.agent_controller import AgentController
+from opendevin.core.metrics import LatencyHistogram, Metrics
+from opendevin.core.schema import AgentState
+from opendevin.events.action import AgentFinishAction, CmdRunAction, MessageAction
+from opendevin.events.observation import CmdOutputObservation
+from opendevin.events.stream import EventSource, EventStream, EventStreamSubscriber
+from opendevin.storage import get_file_store
+
+
+@pytest.fixture
+def temp_dir(tmp_path_factory: TempPathFactory) -> str:
+    return str(tmp_path_factory.mktemp('test_agent_controller'))
+
+
+class ScriptedAgent(Agent):
+    def __init__(self, actions):
+        llm = MagicMock()
+        llm.metrics = Metrics()
+        super().__init__(llm)
+        self.actions = list(actions)
+
+    def step(self, state):
+        return self.actions.pop(0)
+
+
+@pytest.mark.asyncio
+async def test_steps_on_observation_without_polling(temp_dir: str):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    commands = ['ls', 'pwd', 'whoami', 'date', 'uptime']
+    agent = ScriptedAgent(
+        [CmdRunAction(command=command) for command in commands] + [AgentFinishAction()]
+    )
+
+    # a runtime that answers each command right away
+    async def on_event(event):
+        if isinstance(event, CmdRunAction):
+            observation = CmdOutputObservation(
+                content='', command_id=event.id, command=event.command
+            )
+            observation._cause = event.id  # type: ignore[attr-defined]
+            event_stream.add_event(observation, EventSource.AGENT)
+
+    event_stream.subscribe(EventStreamSubscriber.RUNTIME, on_event)
+    controller = AgentController(
+        agent=agent, event_stream=event_stream, max_iterations=10, sid='abc'
+    )
+    event_stream.add_event(MessageAction(content='task'), EventSource.USER)
+
+    # the old loop slept a second per pending action
+    for _ in range(100):
+        if controller.get_agent_state() == AgentState.FINISHED:
+            break
+        await asyncio.sleep(0.02)
+    assert controller.get_agent_state() == AgentState.FINISHED
+    assert controller.state.iteration == len(commands) + 1
+    assert controller.step_latency.count == len(commands)
+    assert controller.step_latency.quantile(1.0) <= 0.5
+
+    await controller.close()
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.05, 0.5, 2.0]:
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.mean == pytest.approx(0.65)
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+    assert histogram.quantile(1.0) == 2.0
+    assert histogram.get()['buckets'] == {0.1: 2, 1.0: 1, float('inf'): 1}
@@ -379,6 +379,27 @@ def test_scroll_down_edge(tmp_path):
     assert result.split('\n') == expected.split('\n')
 
 
+def test_file_buffer(tmp_path):
+    from opendevin.runtime.plugins.agent_skills.file_buffer import FileBufferCache
+
+    cache = FileBufferCache()
+    path = tmp_path / 'a.txt'
+    path.write_text('Line 1\r\nLine 2')
+    buffer = cache.get(str(path))
+    assert buffer.lines == ['Line 1\n', 'Line 2']
+    assert cache.get(str(path)) is buffer
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    buffer = cache.write(str(path), 'Line 1\nLine 2\nLine 3\n')
+    assert buffer.total_lines == 3
+    assert cache.get(str(path)) is buffer
+    assert path.read_text() == 'Line 1\nLine 2\nLine 3\n'
+
+    # a change made outside of the skills is seen
+    path.write_text('Other\n')
+    assert cache.get(str(path)).lines == ['Other\n']
+
+
 def test_print_window_internal(tmp_path):
     test_file_path = tmp_path / 'a.txt'
     create_file(str(test_file_path))
@@ -1137,7 +1158,7 @@ def test_search_dir_too_much_match(tmp_path):
         result = buf.getvalue()
     assert result is not None
 
-    expected = f'More than 999 files matched for "Line 5" in {tmp_path}. Please narrow your search.\n'
+    expected = f'More than 100 files matched for "Line 5" in {tmp_path}. Please narrow your search.\n'
     assert result.split('\n') == expected.split('\n')
 
 
@@ -1166,6 +1187,73 @@ def test_search_dir_cwd(tmp_path, monkeypatch):
     assert result.split('\n') == expected.split('\n')
 
 
+def _make_repo(tmp_path):
+    (tmp_path / '.git').mkdir()
+    (tmp_path / '.gitignore').write_text('*.log\nbuild/\n')
+    (tmp_path / 'a.txt').write_text('bingo\n')
+    (tmp_path / 'debug.log').write_text('bingo\n')
+    (tmp_path / 'image.bin').write_bytes(b'\x89PNG\0\0bingo')
+    for ignored in ('build', 'node_modules'):
+        (tmp_path / ignored).mkdir()
+        (tmp_path / ignored / 'b.txt').write_text('bingo\n')
+    (tmp_path / 'src').mkdir()
+    (tmp_path / 'src' / '.gitignore').write_text('generated.txt\n')
+    (tmp_path / 'src' / 'generated.txt').write_text('bingo\n')
+    (tmp_path / 'src' / 'c.txt').write_text('line\nbingo bingo\n')
+
+
+def test_search_dir_ignored_files(tmp_path):
+    _make_repo(tmp_path)
+
+    with io.StringIO() as buf:
+        with contextlib.redirect_stdout(buf):
+            search_dir('bingo', str(tmp_path / 'src'))
+        result = buf.getvalue()
+    # the .gitignore of the repository applies as well
+    expected = (
+        f'[Found 1 matches for "bingo" in {tmp_path}/src]\n'
+        f'{tmp_path}/src/c.txt (Line 2): bingo bingo\n'
+        f'[End of matches for "bingo" in {tmp_path}/src]\n'
+    )
+    assert result.split('\n') == expected.split('\n')
+
+    with io.StringIO() as buf:
+        with contextlib.redirect_stdout(buf):
+            find_file('.txt', str(tmp_path))
+        result = buf.getvalue()
+    assert sorted(result.split('\n')[1:3]) == [
+        f'{tmp_path}/a.txt',
+        f'{tmp_path}/src/c.txt',
+    ]
+    assert result.startswith(f'[Found 2 matches for ".txt" in {tmp_path}]')
+
+
+def test_search_dir_index(tmp_path, monkeypatch):
+    from opendevin.runtime.plugins.agent_skills import file_search
+
+    monkeypatch.setenv('AGENT_SKILLS_SEARCH_INDEX', '1')
+    _make_repo(tmp_path)
+
+    def search(term):
+        return [
+            (os.path.relpath(path, tmp_path), matches)
+            for path, matches in file_search.search_files(term, str(tmp_path))
+        ]
+
+    assert sorted(search('bingo')) == [
+        ('a.txt', [(1, 'bingo')]),
+        ('src/c.txt', [(2, 'bingo bingo')]),
+    ]
+    skipped = file_search._index.skipped
+    assert search('bango') == []
+    # the files were ruled out by the index, without being read
+    assert file_search._index.skipped == skipped + 2
+
+    # a modified file is read again
+    (tmp_path / 'a.txt').write_text('bingo\nbango\n')
+    assert search('bango') == [('a.txt', [(2, 'bango')])]
+
+
 def test_search_file(tmp_path):
     temp_file_path = tmp_path / 'a.txt'
     temp_file_path.write_text('Line 1\nLine 2\nLine 3\nLine 4\nLine 5')
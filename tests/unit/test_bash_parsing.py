@@ -1,6 +1,10 @@
 import pytest
 
-from opendevin.runtime.utils.bash import split_bash_commands
+from opendevin.runtime.utils.bash import (
+    BashSession,
+    BashSessionPool,
+    split_bash_commands,
+)
 
 
 def test_split_commands_util():
@@ -281,3 +285,54 @@ def test_split_commands_with_invalid_input():
     for input_command in invalid_inputs:
         # it will fall back to return the original input
         assert split_bash_commands(input_command) == [input_command]
+
+
+def test_bash_session(tmp_path):
+    session = BashSession(str(tmp_path))
+    try:
+        output, exit_code = session.execute('echo hello', timeout=10, keep_prompt=False)
+        assert output.strip() == 'hello'
+        assert exit_code == 0
+
+        _, exit_code = session.execute('false', timeout=10)
+        assert exit_code == 1
+
+        (tmp_path / 'sub').mkdir()
+        _, exit_code = session.execute('cd sub', timeout=10)
+        assert exit_code == 0
+        assert session.pwd == str(tmp_path / 'sub')
+        assert session.prev_pwd == str(tmp_path)
+
+        # the prompt set in the environment is not mistaken for a prompt
+        output, exit_code = session.execute('env | grep PS1', timeout=10)
+        assert 'PEXPECT_EXIT_CODE' in output
+        assert exit_code == 0
+    finally:
+        session.close()
+
+
+def test_bash_session_pool(tmp_path):
+    pool = BashSessionPool(2, str(tmp_path))
+    try:
+        first = pool.acquire()
+        second = pool.acquire()
+        assert first is not None and second is not None
+        assert pool.acquire() is None
+
+        output, _ = first.execute('pwd', timeout=10, keep_prompt=False)
+        assert output.strip() == str(tmp_path)
+
+        pool.release(first)
+        # a session in an unknown state is replaced
+        pool.release(second, discard=True)
+        stats = pool.stats()
+        assert stats['size'] == 2
+        assert stats['busy'] == 0
+        assert stats['max_busy'] == 2
+        assert stats['dispatched'] == 2
+        assert stats['exhausted'] == 1
+        assert stats['replaced'] == 1
+        assert 0 < stats['utilization'] <= 1
+        assert pool.acquire() is not None
+    finally:
+        pool.close()
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from opendevin.core.exceptions import BrowserInitException, BrowserUnavailableException
+from opendevin.runtime.browser.browser_env import BrowserEnv
+from opendevin.runtime.browser.browser_host import BrowserHost
+
+
+class EchoBrowserEnv(BrowserEnv):
+    """A browser process that echoes the actions, to test the bridge without a browser."""
+
+    def browser_process(self):
+        while True:
+            request_id, data = self.browser_side.recv()
+            if request_id == 'SHUTDOWN':
+                return
+            if data.get('is_alive'):
+                self.browser_side.send((request_id, {'alive': True}))
+                continue
+            action = data['action']
+            if action == 'exit':
+                os._exit(1)
+            if action.startswith('sleep '):
+                time.sleep(float(action.split()[1]))
+            self.browser_side.send((request_id, {'action': action}))
+
+
+class HistoryEnv:
+    """A browser context that returns the actions performed in it."""
+
+    def __init__(self):
+        self.actions = []
+
+    def step(self, action):
+        if action == 'fail':
+            raise RuntimeError('context crashed')
+        self.actions.append(action)
+        return {'actions': list(self.actions)}, 0, False, False, {}
+
+    def close(self):
+        pass
+
+
+class FakeBrowserHost(BrowserHost):
+    def _start_browser(self):
+        return None
+
+    def _open_env(self):
+        return HistoryEnv()
+
+    def _serializable_obs(self, obs):
+        return obs
+
+
+@pytest.fixture(scope='module')
+def browser():
+    browser = EchoBrowserEnv()
+    yield browser
+    browser.close()
+
+
+def test_step(browser):
+    assert browser.step('goto("a")') == {'action': 'goto("a")'}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_asteps(browser):
+    results = await asyncio.gather(
+        *(browser.astep(f'click("{i}")') for i in range(10)),
+        # the loop is not blocked while the browser works
+        asyncio.sleep(0),
+    )
+    assert results[:10] == [{'action': f'click("{i}")'} for i in range(10)]
+
+
+@pytest.mark.asyncio
+async def test_astep_timeout(browser):
+    with pytest.raises(TimeoutError):
+        await browser.astep('sleep 1', timeout=0.1)
+    # the late response doesn't get mixed up with the next one
+    assert await browser.astep('noop') == {'action': 'noop'}
+    assert browser._pending == {}
+
+
+@pytest.mark.asyncio
+async def test_browser_exit():
+    browser = EchoBrowserEnv()
+    try:
+        with pytest.raises(BrowserUnavailableException):
+            await browser.astep('exit', timeout=10)
+    finally:
+        browser.close()
+
+
+def test_browser_host_leases():
+    host = FakeBrowserHost(max_contexts=2)
+    try:
+        first = host.lease()
+        second = host.lease()
+        assert first.step('a') == {'actions': ['a']}
+        # the contexts don't share anything
+        assert second.step('b') == {'actions': ['b']}
+        assert first.step('c') == {'actions': ['a', 'c']}
+
+        # an error in a context doesn't affect the others
+        with pytest.raises(BrowserUnavailableException):
+            second.step('fail')
+        assert first.check_alive()
+
+        # no more than max_contexts at a time
+        with pytest.raises(BrowserInitException):
+            host.lease(timeout=0.1)
+        second.close()
+        assert not second.check_alive()
+        third = host.lease(timeout=0.1)
+        assert third.step('d') == {'actions': ['d']}
+
+        assert host.stats() == {
+            'max_contexts': 2,
+            'leased': 2,
+            'leases': 3,
+            'rejected': 1,
+        }
+        first.close()
+        third.close()
+        assert host.stats()['leased'] == 0
+    finally:
+        host.close()
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+import pytest
+from litellm import completion as litellm_completion
+
+from opendevin.core.config import LLMConfig
+from opendevin.llm.cache import CompletionCache
+from opendevin.llm.llm import LLM
+
+MESSAGES = [{'role': 'user', 'content': 'Hello!'}]
+
+
+@pytest.fixture
+def cache_file(tmp_path_factory) -> str:
+    return str(tmp_path_factory.mktemp('test_completion_cache') / 'cache.sqlite')
+
+
+def mock_completion(*args, **kwargs):
+    return litellm_completion(
+        *args,
+        **kwargs,
+        mock_response=f'response to {kwargs["messages"][-1]["content"]}',
+    )
+
+
+def test_completion_cache(cache_file):
+    config = LLMConfig(completion_cache=True, completion_cache_file=cache_file)
+    with patch('opendevin.llm.llm.litellm_completion') as mock_litellm, patch(
+        'opendevin.llm.llm.litellm_completion_cost', return_value=1
+    ):
+        mock_litellm.side_effect = mock_completion
+        llm = LLM(config=config)
+
+        first = llm.completion(messages=MESSAGES, temperature=0.0)
+        second = llm.completion(messages=MESSAGES, temperature=0.0)
+        assert mock_litellm.call_count == 1
+        assert second.choices[0].message.content == 'response to Hello!'
+        assert second.choices[0].message.content == first.choices[0].message.content
+
+        # different sampling params are a different request
+        llm.completion(messages=MESSAGES, temperature=0.5)
+        assert mock_litellm.call_count == 2
+
+        # the hit is not billed, but reported separately
+        assert llm.metrics.accumulated_cost == 2
+        assert llm.metrics.cache_hits == 1
+        assert llm.metrics.cached_cost == 1
+
+        # the cache persists in the file, e.g. for another process
+        other_llm = LLM(config=config)
+        other_llm.completion_cache = CompletionCache(cache_file)
+        other_llm.completion(messages=MESSAGES, temperature=0.0)
+        assert mock_litellm.call_count == 2
+        assert other_llm.metrics.cache_hits == 1
+
+
+def test_completion_cache_lru():
+    cache = CompletionCache(max_entries=2)
+    for i in range(3):
+        cache.put(str(i), {'id': str(i)}, 0.1)
+    assert cache.get('0') is None
+    assert cache.get('2') == ({'id': '2'}, 0.1)
+
+
+def test_completion_cache_disabled():
+    with patch('opendevin.llm.llm.litellm_completion') as mock_litellm:
+        mock_litellm.side_effect = mock_completion
+        llm = LLM(config=LLMConfig())
+        llm.completion(messages=MESSAGES)
+        llm.completion(messages=MESSAGES)
+        assert mock_litellm.call_count == 2
+        assert llm.metrics.cache_hits == 0
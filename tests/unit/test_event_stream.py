@@ -1,14 +1,35 @@
+import asyncio
+import base64
+import io
 import json
+import threading
 
 import pytest
+from PIL import Image
 from pytest import TempPathFactory
 
-from opendevin.events import EventSource, EventStream
+from opendevin.controller.state.state import State
+from opendevin.core.config import AppConfig
+from opendevin.events import EventSource, EventStream, EventStreamSubscriber
 from opendevin.events.action import (
+    Action,
+    AgentFinishAction,
+    CmdRunAction,
+    MessageAction,
     NullAction,
 )
-from opendevin.events.observation import NullObservation
-from opendevin.storage import get_file_store
+from opendevin.events.blobs import BlobRef
+from opendevin.events.cache import EventCache
+from opendevin.events.compaction import BrowserObservationCompactor
+from opendevin.events.dispatch import OverflowPolicy
+from opendevin.events.log import SegmentedEventLog
+from opendevin.events.observation import BrowserOutputObservation, NullObservation
+from opendevin.server.session.session import (
+    REPLAY_PAGE_SIZE,
+    Session,
+    iter_replay_frames,
+)
+from opendevin.storage import InMemoryFileStore, get_file_store
 
 
 @pytest.fixture
@@ -62,3 +83,367 @@ def test_rehydration(temp_dir: str):
     assert len(events) == 2
     assert events[0].content == 'obs1'
     assert events[1].content == 'obs2'
+
+
+def test_segmented_log_rehydration(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    # small segments, as a manifest written with other settings would have them
+    file_store.write(
+        'sessions/abc/events/manifest.json',
+        json.dumps(
+            {
+                'version': SegmentedEventLog.VERSION,
+                'segment_size': 5,
+                'index_interval': 2,
+                'sealed': 0,
+            }
+        ),
+    )
+    event_stream = EventStream('abc', file_store, event_log='segmented')
+    for i in range(12):
+        event_stream.add_event(NullObservation(f'obs{i}'), EventSource.AGENT)
+
+    # only the manifest and the segments are written, no per-event files
+    assert 'sessions/abc/events/0.json' not in file_store.list('sessions/abc/events')
+    assert 'sessions/abc/events/segments/1.idx' in file_store.list(
+        'sessions/abc/events/segments'
+    )
+    assert event_stream.get_event(7).content == 'obs7'
+
+    # the layout is detected from the manifest, whatever the configured default
+    rehydrated = EventStream('abc', file_store)
+    assert rehydrated.get_latest_event_id() == 11
+    events = collect_events(rehydrated)
+    assert [event.content for event in events] == [f'obs{i}' for i in range(12)]
+    assert [event.id for event in events] == list(range(12))
+    assert [event.content for event in rehydrated.get_events(start_id=3, end_id=8)] == [
+        f'obs{i}' for i in range(3, 9)
+    ]
+    assert [event.id for event in rehydrated.get_events(reverse=True)] == list(
+        reversed(range(12))
+    )
+
+    rehydrated.add_event(NullObservation('obs12'), EventSource.AGENT)
+    assert EventStream('abc', file_store).get_latest_event().content == 'obs12'
+
+
+def test_segmented_log_drops_partial_event(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream('abc', file_store, event_log='segmented')
+    event_stream.add_event(NullObservation('obs1'), EventSource.AGENT)
+    event_stream.add_event(NullObservation('obs2'), EventSource.AGENT)
+    file_store.append('sessions/abc/events/segments/0.jsonl', '{"id": 2, "sou')
+
+    rehydrated = EventStream('abc', file_store)
+    assert rehydrated.get_latest_event_id() == 1
+    rehydrated.add_event(NullObservation('obs3'), EventSource.AGENT)
+    assert [event.content for event in collect_events(rehydrated)] == [
+        'obs1',
+        'obs2',
+        'obs3',
+    ]
+
+
+def test_segmented_log_needs_native_append():
+    file_store = InMemoryFileStore()
+    event_stream = EventStream('abc', file_store, event_log='segmented')
+    event_stream.add_event(NullObservation('obs1'), EventSource.AGENT)
+    # each event would rewrite its whole segment: the events are stored as files
+    assert 'sessions/abc/events/0.json' in file_store.files
+    assert not SegmentedEventLog.exists('abc', file_store)
+
+
+def test_event_cache(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream('abc', file_store, cache=EventCache(max_events=3))
+    for i in range(5):
+        event_stream.add_event(NullObservation(f'obs{i}'), EventSource.AGENT)
+    assert event_stream.cache.stats()['size'] == 3
+    assert event_stream.cache.evictions == 2
+
+    # recent events come from the cache, and are decoded copies of the added ones
+    event = NullObservation('mutable')
+    event_stream.add_event(event, EventSource.AGENT)
+    event.content = 'changed'
+    hits = event_stream.cache.hits
+    assert event_stream.get_latest_event().content == 'mutable'
+    assert event_stream.cache.hits == hits + 1
+
+    # older events are read from storage and cached on the way
+    misses = event_stream.cache.misses
+    assert [e.content for e in collect_events(event_stream)] == [
+        'obs0',
+        'obs1',
+        'obs2',
+        'obs3',
+        'obs4',
+        'mutable',
+    ]
+    assert event_stream.cache.misses > misses
+    assert len(event_stream.cache) == 3
+
+    cache = EventCache(max_events=10, max_bytes=100)
+    cache.put(0, NullObservation(''), 60)
+    cache.put(1, NullObservation(''), 60)
+    assert 0 not in cache and 1 in cache
+    assert cache.nbytes == 60
+
+
+def test_type_index(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream('abc', file_store)
+    event_stream.add_event(MessageAction(content='task'), EventSource.USER)
+    event_stream.add_event(CmdRunAction(command='ls'), EventSource.AGENT)
+    event_stream.add_event(NullObservation('obs'), EventSource.AGENT)
+    event_stream.add_event(MessageAction(content='reply'), EventSource.AGENT)
+    event_stream.add_event(CmdRunAction(command='pwd'), EventSource.AGENT)
+
+    for stream in [event_stream, EventStream('abc', file_store)]:
+        # a restored stream builds its index on first use
+        last_user = stream.get_latest_event_of_type(
+            (MessageAction,), source=EventSource.USER
+        )
+        assert last_user is not None and last_user.id == 0
+        last_action = stream.get_latest_event_of_type(
+            (Action,), end_id=3, exclude_types=(MessageAction,)
+        )
+        assert last_action is not None and last_action.id == 1
+        assert stream.get_latest_event_of_type((NullAction,)) is None
+        assert [e.id for e in stream.get_events_by_type((CmdRunAction,))] == [1, 4]
+        assert [e.id for e in stream.get_events_by_type((Action,), reverse=True)] == [
+            4,
+            3,
+            1,
+            0,
+        ]
+        assert [
+            e.id for e in stream.get_events_by_type((Action,), start_id=2, end_id=3)
+        ] == [3]
+
+
+def test_current_user_intent(temp_dir: str):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    state = State()
+    state.history.set_event_stream(event_stream)
+    assert state.get_current_user_intent() is None
+
+    event_stream.add_event(MessageAction(content='task'), EventSource.USER)
+    event_stream.add_event(MessageAction(content='more'), EventSource.USER)
+    assert state.get_current_user_intent() == 'task'
+
+    event_stream.add_event(AgentFinishAction(), EventSource.AGENT)
+    assert state.get_current_user_intent() == 'task'
+
+    event_stream.add_event(MessageAction(content='next task'), EventSource.USER)
+    event_stream.add_event(MessageAction(content='detail'), EventSource.USER)
+    event_stream.add_event(AgentFinishAction(), EventSource.AGENT)
+    assert state.get_current_user_intent() == 'next task'
+
+
+@pytest.mark.asyncio
+async def test_subscriber_ordered_delivery(temp_dir: str):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    received = []
+
+    async def slow_callback(event):
+        # later events must wait for this one
+        await asyncio.sleep(0.01 if event.id % 2 == 0 else 0)
+        if event.id == 3:
+            raise ValueError('failed to handle the event')
+        received.append(event.id)
+
+    event_stream.subscribe(EventStreamSubscriber.TEST, slow_callback)
+    for i in range(6):
+        event_stream.add_event(NullObservation(f'obs{i}'), EventSource.AGENT)
+
+    # and from a thread without an event loop
+    thread = threading.Thread(
+        target=event_stream.add_event,
+        args=(NullObservation('from thread'), EventSource.AGENT),
+    )
+    thread.start()
+    thread.join()
+
+    for _ in range(100):
+        if len(received) == 6:
+            break
+        await asyncio.sleep(0.01)
+    assert received == [0, 1, 2, 4, 5, 6]
+    stats = event_stream.get_subscriber_stats()[EventStreamSubscriber.TEST]
+    assert stats['depth'] == 0
+    assert stats['delivered'] == 7
+    assert stats['errors'] == 1
+    assert stats['lag']['count'] == 7
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'policy, expected',
+    [
+        (OverflowPolicy.BLOCK, ['a0', 'b1', 'a2', 'b3', 'a4']),
+        (OverflowPolicy.DROP_OLDEST, ['a2', 'b3', 'a4']),
+        (OverflowPolicy.COALESCE, ['a0', 'b3', 'a4']),
+    ],
+)
+async def test_subscriber_overflow_policy(temp_dir: str, policy, expected):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    received = []
+
+    async def callback(event):
+        received.append(event.content)
+
+    event_stream.subscribe(
+        EventStreamSubscriber.TEST,
+        callback,
+        max_queue_size=3,
+        overflow_policy=policy,
+    )
+    # nothing is delivered until the loop gets control back
+    for i in range(5):
+        event = NullObservation(f'{"ab"[i % 2]}{i}')
+        if i % 2:
+            event = MessageAction(content=event.content)
+        event_stream.add_event(event, EventSource.AGENT)
+    await asyncio.sleep(0.01)
+    assert received == expected
+
+
+def test_compact_browser_observations(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream(
+        'abc', file_store, compactor=BrowserObservationCompactor('webp', 50)
+    )
+    buffered = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffered, format='PNG')
+    screenshot = base64.b64encode(buffered.getvalue()).decode()
+    dom = {'strings': ['html', 'body'] * 100}
+    axtree = {'nodes': [{'nodeId': str(i)} for i in range(100)]}
+
+    for i in range(2):
+        # the same page twice
+        obs = BrowserOutputObservation(
+            f'page {i}',
+            url='https://example.com',
+            screenshot=screenshot,
+            dom_object=dom,
+            axtree_object=axtree,
+        )
+        event_stream.add_event(obs, EventSource.AGENT)
+        # the event is compact for the subscribers as well
+        assert isinstance(vars(obs)['dom_object'], BlobRef)
+    assert event_stream.blobs.writes == 2
+    assert event_stream.blobs.dedup_hits == 2
+
+    data = json.loads(file_store.read('sessions/abc/events/1.json'))
+    assert set(data['extras']['dom_object']) == {'$blob'}
+    assert data['extras']['extra_element_properties'] == {}
+    assert data['extras']['screenshot'].startswith('data:image/webp;base64,')
+
+    # the references are loaded when the fields are read
+    rehydrated = EventStream('abc', file_store)
+    obs = rehydrated.get_event(1)
+    assert isinstance(vars(obs)['axtree_object'], BlobRef)
+    assert obs.dom_object == dom
+    assert obs.axtree_object == axtree
+    assert obs.content == 'page 1'
+
+
+def test_serialized_events(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream('abc', file_store)
+    # messages that look like the type of an event
+    event_stream.add_event(
+        MessageAction('", "action": "null", "x": "\\"'), EventSource.USER
+    )
+    event_stream.add_event(NullAction(), EventSource.AGENT)
+    event_stream.add_event(NullObservation('null'), EventSource.AGENT)
+    event_stream.add_event(CmdRunAction('ls'), EventSource.AGENT)
+
+    restored = EventStream('abc', file_store)
+    serialized = list(
+        restored.get_serialized_events(filter_out_type=(NullAction, NullObservation))
+    )
+    assert [id for id, _ in serialized] == [0, 3]
+    assert json.loads(serialized[1][1])['args']['command'] == 'ls'
+    # nothing was decoded
+    assert len(restored.cache) == 0
+
+
+def test_replay_frames(temp_dir: str):
+    file_store = get_file_store('local', temp_dir)
+    event_stream = EventStream('abc', file_store)
+    for i in range(10):
+        event_stream.add_event(MessageAction('x' * 100), EventSource.USER)
+        event_stream.add_event(NullAction(), EventSource.AGENT)
+
+    frames = [
+        json.loads(frame)['replay']
+        for frame in iter_replay_frames(event_stream, 4, 19, max_frame_size=1200)
+    ]
+    # the null actions are filtered out, and the frames are bounded
+    assert [[event['id'] for event in frame['events']] for frame in frames] == [
+        [4, 6, 8],
+        [10, 12, 14],
+        [16, 18],
+    ]
+    assert [frame['cursor'] for frame in frames] == [10, 16, 20]
+    assert [frame['done'] for frame in frames] == [False, False, True]
+    assert all(frame['start'] == 4 and frame['end'] == 19 for frame in frames)
+    assert frames[0]['events'][0]['args']['content'] == 'x' * 100
+
+    # nothing to replay
+    frames = list(iter_replay_frames(event_stream, 20, 19))
+    assert json.loads(frames[0])['replay']['events'] == []
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: list[dict] = []
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+@pytest.mark.asyncio
+async def test_replay_dispatch():
+    websocket = FakeWebSocket()
+    session = Session('abc', websocket, AppConfig(), InMemoryFileStore())
+    event_stream = session.agent_session.event_stream
+    for i in range(REPLAY_PAGE_SIZE + 20):
+        event_stream.add_event(MessageAction(f'msg{i}'), EventSource.USER)
+
+    async def replay(args):
+        websocket.sent.clear()
+        await session.dispatch({'action': 'replay', 'args': args})
+        return websocket.sent
+
+    # the page before an event id
+    frames = await replay({'before': 10, 'limit': 5})
+    assert [event['id'] for event in frames[0]['replay']['events']] == [5, 6, 7, 8, 9]
+    # the page is clamped to the page size and to the latest event
+    frames = await replay({'before': 1000, 'limit': 1000})
+    events = [event for frame in frames for event in frame['replay']['events']]
+    assert len(events) == REPLAY_PAGE_SIZE
+    assert events[-1]['id'] == REPLAY_PAGE_SIZE + 19
+    frames = await replay({'start': '115'})
+    assert [event['id'] for event in frames[0]['replay']['events']] == [
+        115,
+        116,
+        117,
+        118,
+        119,
+    ]
+
+    # malformed requests are answered with an error, and the session stays open
+    for args in [
+        {'before': None},
+        {'before': 'x'},
+        {'before': 5, 'limit': -1},
+        {'start': [1]},
+    ]:
+        frames = await replay(args)
+        assert len(frames) == 1 and frames[0]['error'] is True
+    assert session.is_alive
@@ -0,0 +1,63 @@
+import pytest
+from pytest import TempPathFactory
+
+from opendevin.events.action import AgentDelegateAction, MessageAction
+from opendevin.events.observation import AgentDelegateObservation, NullObservation
+from opendevin.events.stream import EventSource, EventStream
+from opendevin.memory.history import DelegateRanges, ShortTermHistory
+from opendevin.storage import get_file_store
+
+
+@pytest.fixture
+def temp_dir(tmp_path_factory: TempPathFactory) -> str:
+    return str(tmp_path_factory.mktemp('test_history'))
+
+
+def test_delegate_ranges():
+    ranges = DelegateRanges()
+    ranges.add(2, 5, 'CoderAgent', 'code')
+    ranges.add(10, 11, 'BrowsingAgent', 'empty')
+    ranges.add(12, 20, 'BrowsingAgent', 'browse')
+    ranges.add(14, 16, 'BrowsingAgent', 'nested')
+    ranges.add(19, 25, 'BrowsingAgent', 'overlap')
+
+    assert len(ranges) == 5
+    assert ranges[(2, 5)] == ('CoderAgent', 'code')
+    assert [i for i in range(30) if ranges.contains(i)] == [3, 4] + list(range(13, 25))
+    assert ranges.visible_ranges(0, 30) == [(0, 2), (5, 12), (25, 30)]
+    assert ranges.visible_ranges(4, 13) == [(5, 12)]
+    assert ranges.visible_ranges(0, 30, reverse=True) == [(25, 30), (5, 12), (0, 2)]
+    assert ranges.visible_ranges(14, 20) == []
+
+
+def test_delegate_events_are_hidden(temp_dir: str):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    history = ShortTermHistory()
+    history.set_event_stream(event_stream)
+
+    def add(event, source=EventSource.AGENT):
+        event_stream.add_event(event, source)
+        history.on_event(event)
+
+    add(MessageAction(content='task'), EventSource.USER)
+    add(AgentDelegateAction(agent='CoderAgent', inputs={'task': 'code'}))
+    add(MessageAction(content='coder working'))
+    add(AgentDelegateAction(agent='BrowsingAgent', inputs={'task': 'browse'}))
+    add(NullObservation('browser working'))
+    add(AgentDelegateObservation(content='', outputs={'browsed': True}))
+    add(AgentDelegateObservation(content='', outputs={'coded': True}))
+    add(MessageAction(content='done'))
+
+    # the nested delegate is matched with its own action, not the outer one
+    assert dict(history.delegates) == {
+        (3, 5): ('BrowsingAgent', 'browse'),
+        (1, 6): ('CoderAgent', 'code'),
+    }
+    assert [event.id for event in history.get_events()] == [0, 1, 6, 7]
+    assert [event.id for event in history.get_events(reverse=True)] == [7, 6, 1, 0]
+
+    # without the delegate action at hand, the range is found through the stream
+    restored = ShortTermHistory()
+    restored.set_event_stream(event_stream)
+    restored.on_event(event_stream.get_event(6))
+    assert dict(restored.delegates) == {(3, 6): ('BrowsingAgent', 'browse')}
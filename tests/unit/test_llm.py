@@ -28,6 +28,7 @@ def test_llm_init_with_model_info(mock_get_model_info, default_config):
     llm = LLM(default_config)
     assert llm.config.max_input_tokens == 8000
     assert llm.config.max_output_tokens == 2000
+    assert llm.input_token_limit == 8000
 
 
 @patch('opendevin.llm.llm.litellm.get_model_info')
@@ -36,6 +37,8 @@ def test_llm_init_without_model_info(mock_get_model_info, default_config):
     llm = LLM(default_config)
     assert llm.config.max_input_tokens == 4096
     assert llm.config.max_output_tokens == 1024
+    # the fallback is not the model's limit
+    assert llm.input_token_limit is None
 
 
 def test_llm_init_with_custom_config():
@@ -52,6 +55,7 @@ def test_llm_init_with_custom_config():
     assert llm.config.api_key == 'custom_key'
     assert llm.config.max_input_tokens == 5000
     assert llm.config.max_output_tokens == 1500
+    assert llm.input_token_limit == 5000
     assert llm.config.temperature == 0.8
     assert llm.config.top_p == 0.9
 
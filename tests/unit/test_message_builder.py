@@ -0,0 +1,156 @@
+import pytest
+from pytest import TempPathFactory
+
+from opendevin.events.action import AgentDelegateAction, CmdRunAction, MessageAction
+from opendevin.events.event import Event
+from opendevin.events.observation import AgentDelegateObservation, CmdOutputObservation
+from opendevin.events.stream import EventSource, EventStream
+from opendevin.memory.history import ShortTermHistory
+from opendevin.memory.message_builder import IncrementalMessageBuilder
+from opendevin.storage import get_file_store
+
+PREFIX = [{'role': 'system', 'content': 'system'}]
+
+
+@pytest.fixture
+def temp_dir(tmp_path_factory: TempPathFactory) -> str:
+    return str(tmp_path_factory.mktemp('test_message_builder'))
+
+
+@pytest.fixture
+def history(temp_dir):
+    event_stream = EventStream('abc', get_file_store('local', temp_dir))
+    history = ShortTermHistory()
+    history.set_event_stream(event_stream)
+    return history
+
+
+class CountingConverter:
+    def __init__(self):
+        self.converted: list[int] = []
+
+    def __call__(self, event: Event) -> dict[str, str] | None:
+        self.converted.append(event.id)
+        if isinstance(event, MessageAction):
+            role = 'user' if event.source == EventSource.USER else 'assistant'
+            return {'role': role, 'content': event.content}
+        if isinstance(event, CmdRunAction):
+            return {'role': 'assistant', 'content': event.command}
+        if isinstance(event, CmdOutputObservation):
+            return {'role': 'user', 'content': event.content}
+        return None
+
+
+def add_command(history: ShortTermHistory, command: str):
+    stream = history._event_stream
+    action = CmdRunAction(command=command)
+    stream.add_event(action, EventSource.AGENT)
+    observation = CmdOutputObservation(
+        content=f'output of {command}', command_id=action.id, command=command
+    )
+    observation._cause = action.id  # type: ignore[attr-defined]
+    stream.add_event(observation, EventSource.AGENT)
+
+
+def test_converts_only_new_events(history: ShortTermHistory):
+    converter = CountingConverter()
+    builder = IncrementalMessageBuilder(converter)
+    history._event_stream.add_event(MessageAction(content='task'), EventSource.USER)
+    history._event_stream.add_event(MessageAction(content='hint'), EventSource.USER)
+    add_command(history, 'ls')
+
+    messages = builder.build(history, PREFIX)
+    assert messages == [
+        {'role': 'system', 'content': 'system'},
+        {'role': 'user', 'content': 'task\n\nhint'},
+        {'role': 'assistant', 'content': 'ls'},
+        {'role': 'user', 'content': 'output of ls'},
+    ]
+    assert converter.converted == [0, 1, 2, 3]
+
+    # the caller can change the returned list without affecting the builder
+    messages.pop()
+    add_command(history, 'pwd')
+    messages = builder.build(history, PREFIX)
+    assert converter.converted == [0, 1, 2, 3, 4, 5]
+    assert [m['content'] for m in messages] == [
+        'system',
+        'task\n\nhint',
+        'ls',
+        'output of ls',
+        'pwd',
+        'output of pwd',
+    ]
+
+    # a fresh builder produces the same messages
+    assert IncrementalMessageBuilder(CountingConverter()).build(
+        history, PREFIX
+    ) == builder.build(history, PREFIX)
+
+
+def test_rebuilds_on_delegate_range(history: ShortTermHistory):
+    converter = CountingConverter()
+    builder = IncrementalMessageBuilder(converter)
+    stream = history._event_stream
+    stream.add_event(MessageAction(content='task'), EventSource.USER)
+    stream.add_event(
+        AgentDelegateAction(agent='BrowsingAgent', inputs={'task': 'browse'}),
+        EventSource.AGENT,
+    )
+    add_command(history, 'delegate command')
+    builder.build(history, PREFIX)
+
+    observation = AgentDelegateObservation(content='', outputs={'done': True})
+    stream.add_event(observation, EventSource.AGENT)
+    history.on_event(observation)
+
+    messages = builder.build(history, PREFIX)
+    assert 'delegate command' not in [m['content'] for m in messages]
+    assert messages == IncrementalMessageBuilder(CountingConverter()).build(
+        history, PREFIX
+    )
+
+
+def test_fits_token_budget(history: ShortTermHistory):
+    counted: list[str] = []
+
+    def count_tokens(message: dict[str, str]) -> int:
+        counted.append(message['content'])
+        return len(message['content'])
+
+    builder = IncrementalMessageBuilder(CountingConverter(), count_tokens)
+    history._event_stream.add_event(MessageAction(content='task'), EventSource.USER)
+    for command in ['ls', 'pwd', 'cat']:
+        add_command(history, command)
+
+    # as for the agents, the task is merged into the in-context example
+    prefix = PREFIX + [{'role': 'user', 'content': 'example'}]
+
+    # everything fits
+    messages = builder.build(history, prefix, max_tokens=1000)
+    assert len(messages) == 8
+    assert len(counted) == 9
+
+    # the prefix and the task merged into it are kept, then the newest messages
+    budget = sum(map(len, ['system', 'example', 'task', 'cat', 'output of cat']))
+    messages = builder.build(history, prefix, max_tokens=budget)
+    assert [m['content'] for m in messages] == [
+        'system',
+        'example\n\ntask',
+        'cat',
+        'output of cat',
+    ]
+
+    # one token less: the roles still alternate after the task
+    messages = builder.build(history, prefix, max_tokens=budget - 1)
+    assert [m['content'] for m in messages] == ['system', 'example\n\ntask']
+
+    # nothing was tokenized again
+    assert len(counted) == 9
+
+    # only new events are tokenized, and the counts survive a rebuild
+    add_command(history, 'echo')
+    builder.build(history, prefix, max_tokens=budget)
+    assert counted[9:] == ['echo', 'output of echo']
+    builder.build(history, PREFIX, max_tokens=budget)
+    assert counted[11:] == ['system']
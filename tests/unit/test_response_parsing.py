@@ -1,10 +1,12 @@
 import pytest
 
+from agenthub.codeact_agent.action_parser import CodeActResponseParser
 from agenthub.micro.agent import parse_response as parse_response_micro
 from agenthub.planner_agent.prompt import parse_response as parse_response_planner
 from opendevin.core.exceptions import LLMResponseError
 from opendevin.core.utils.json import loads as custom_loads
 from opendevin.events.action import (
+    CmdRunAction,
     FileWriteAction,
     MessageAction,
 )
@@ -91,3 +93,11 @@ def test_no_json_found():
     input_response = 'This is just a string with no JSON object.'
     with pytest.raises(LLMResponseError):
         custom_loads(input_response)
+
+
+def test_parse_codeact_background_command():
+    parser = CodeActResponseParser()
+    assert parser.parse(
+        'Run the tests.\n<execute_bash background>\npytest'
+    ) == CmdRunAction('pytest', thought='Run the tests.', background=True)
+    assert parser.parse('<execute_bash> ls </execute_bash>') == CmdRunAction('ls')
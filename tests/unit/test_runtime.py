@@ -146,7 +146,7 @@ async def _load_runtime(
             RuntimeTool,  # deprecate this after ServerRuntime is deprecated
         )
 
-        runtime.init_runtime_tools(
+        await runtime.init_runtime_tools(
             [RuntimeTool.BROWSER],
             runtime_tools_config={},
         )
@@ -1,21 +1,20 @@
 import os
 import tarfile
 from importlib.metadata import version
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock, call, patch
 
+import docker
 import pytest
 import toml
 from pytest import TempPathFactory
 
 from opendevin.runtime.utils.runtime_build import (
     _generate_dockerfile,
-    _get_package_version,
     _put_source_code_to_dir,
     build_runtime_image,
-    get_new_image_name,
+    get_runtime_image_names,
 )
 
-OD_VERSION = f'od_v{_get_package_version()}'
 RUNTIME_IMAGE_PREFIX = 'od_runtime'
 
 
@@ -93,111 +92,133 @@ def test_generate_dockerfile_skip_init():
     )
 
 
-def test_get_new_image_name_eventstream():
-    base_image = 'debian:11'
-    new_image_name = get_new_image_name(base_image)
-    assert new_image_name == f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'
-
-    base_image = 'ubuntu:22.04'
-    new_image_name = get_new_image_name(base_image)
-    assert (
-        new_image_name == f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_ubuntu_tag_22.04'
+def test_generate_dockerfile_source_only():
+    dockerfile_content = _generate_dockerfile(
+        'od_runtime:deps_abc',
+        source_code_dirname='dummy',
+        skip_init=True,
+        install_dependencies=False,
     )
+    assert 'RUN mv /opendevin/dummy /opendevin/code' in dockerfile_content
+    assert 'poetry install' not in dockerfile_content
 
-    base_image = 'ubuntu'
-    new_image_name = get_new_image_name(base_image)
-    assert (
-        new_image_name == f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_ubuntu_tag_latest'
-    )
 
+def test_get_runtime_image_names():
+    dependencies_image, runtime_image = get_runtime_image_names('debian:11')
+    assert dependencies_image.startswith(f'{RUNTIME_IMAGE_PREFIX}:deps_')
+    assert runtime_image.startswith(f'{RUNTIME_IMAGE_PREFIX}:')
+    # the names only depend on the content
+    assert get_runtime_image_names('debian:11') == (dependencies_image, runtime_image)
 
-def test_get_new_image_name_eventstream_dev_mode():
-    base_image = f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'
-    new_image_name = get_new_image_name(base_image, dev_mode=True)
-    assert (
-        new_image_name == f'{RUNTIME_IMAGE_PREFIX}_dev:{OD_VERSION}_image_debian_tag_11'
+    other_dependencies_image, other_runtime_image = get_runtime_image_names(
+        'ubuntu:22.04'
     )
+    assert other_dependencies_image != dependencies_image
+    assert other_runtime_image != runtime_image
 
-    base_image = f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_ubuntu_tag_22.04'
-    new_image_name = get_new_image_name(base_image, dev_mode=True)
-    assert (
-        new_image_name
-        == f'{RUNTIME_IMAGE_PREFIX}_dev:{OD_VERSION}_image_ubuntu_tag_22.04'
-    )
-
-    base_image = f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_ubuntu_tag_latest'
-    new_image_name = get_new_image_name(base_image, dev_mode=True)
-    assert (
-        new_image_name
-        == f'{RUNTIME_IMAGE_PREFIX}_dev:{OD_VERSION}_image_ubuntu_tag_latest'
-    )
+    # a source change only changes the runtime image
+    with patch(
+        'opendevin.runtime.utils.runtime_build._get_source_hash', return_value='abc'
+    ):
+        assert get_runtime_image_names('debian:11')[0] == dependencies_image
+        assert get_runtime_image_names('debian:11')[1] != runtime_image
 
 
-def test_get_new_image_name_eventstream_dev_invalid_base_image():
-    with pytest.raises(ValueError):
-        base_image = 'debian:11'
-        get_new_image_name(base_image, dev_mode=True)
+def _images(*names):
+    """Mocks `images.get` of a docker client with the given local images."""
 
-    with pytest.raises(ValueError):
-        base_image = 'ubuntu:22.04'
-        get_new_image_name(base_image, dev_mode=True)
+    def get(name):
+        if name not in names:
+            raise docker.errors.ImageNotFound(name)
+        return MagicMock(tags=[name])
 
-    with pytest.raises(ValueError):
-        base_image = 'ubuntu:latest'
-        get_new_image_name(base_image, dev_mode=True)
+    return get
 
 
 @patch('opendevin.runtime.utils.runtime_build._build_sandbox_image')
 @patch('opendevin.runtime.utils.runtime_build.docker.DockerClient')
 def test_build_runtime_image_from_scratch(mock_docker_client, mock_build_sandbox_image):
     base_image = 'debian:11'
-    mock_docker_client.images.list.return_value = []
+    dependencies_image, runtime_image = get_runtime_image_names(base_image)
+    mock_docker_client.images.get.side_effect = _images()
+    mock_docker_client.images.pull.side_effect = docker.errors.NotFound('')
 
     image_name = build_runtime_image(base_image, mock_docker_client)
-    assert image_name == f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'
+    assert image_name == runtime_image
+
+    assert mock_build_sandbox_image.call_args_list == [
+        call(base_image, dependencies_image, mock_docker_client, skip_init=False),
+        call(
+            dependencies_image,
+            runtime_image,
+            mock_docker_client,
+            skip_init=True,
+            install_dependencies=False,
+        ),
+    ]
 
-    mock_build_sandbox_image.assert_called_once_with(
-        base_image,
-        f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11',
-        mock_docker_client,
-        skip_init=False,
-    )
+
+@patch('opendevin.runtime.utils.runtime_build._build_sandbox_image')
+@patch('opendevin.runtime.utils.runtime_build.docker.DockerClient')
+def test_build_runtime_image_exist(mock_docker_client, mock_build_sandbox_image):
+    base_image = 'debian:11'
+    _, runtime_image = get_runtime_image_names(base_image)
+    mock_docker_client.images.get.side_effect = _images(runtime_image)
+
+    image_name = build_runtime_image(base_image, mock_docker_client)
+    assert image_name == runtime_image
+
+    mock_build_sandbox_image.assert_not_called()
+    mock_docker_client.images.list.assert_not_called()
+    mock_docker_client.images.pull.assert_not_called()
 
 
 @patch('opendevin.runtime.utils.runtime_build._build_sandbox_image')
 @patch('opendevin.runtime.utils.runtime_build.docker.DockerClient')
-def test_build_runtime_image_exist_no_update_source(
+def test_build_runtime_image_source_changed(
     mock_docker_client, mock_build_sandbox_image
 ):
     base_image = 'debian:11'
-    mock_docker_client.images.list.return_value = [
-        MagicMock(tags=[f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'])
-    ]
+    dependencies_image, runtime_image = get_runtime_image_names(base_image)
+    mock_docker_client.images.get.side_effect = _images(dependencies_image)
+    mock_docker_client.images.pull.side_effect = docker.errors.NotFound('')
 
     image_name = build_runtime_image(base_image, mock_docker_client)
-    assert image_name == f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'
+    assert image_name == runtime_image
 
-    mock_build_sandbox_image.assert_not_called()
+    # only the source layer is built
+    mock_build_sandbox_image.assert_called_once_with(
+        dependencies_image,
+        runtime_image,
+        mock_docker_client,
+        skip_init=True,
+        install_dependencies=False,
+    )
 
 
 @patch('opendevin.runtime.utils.runtime_build._build_sandbox_image')
 @patch('opendevin.runtime.utils.runtime_build.docker.DockerClient')
-def test_build_runtime_image_exist_with_update_source(
+def test_build_runtime_image_with_update_source(
     mock_docker_client, mock_build_sandbox_image
 ):
-    base_image = 'debian:11'
-    mock_docker_client.images.list.return_value = [
-        MagicMock(tags=[f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11'])
-    ]
+    base_image = f'{RUNTIME_IMAGE_PREFIX}:0123456789abcdef'
+    # an od_runtime image is used as is
+    assert build_runtime_image(base_image, mock_docker_client) == base_image
+    mock_build_sandbox_image.assert_not_called()
+
+    _, runtime_image = get_runtime_image_names(base_image)
+    mock_docker_client.images.get.side_effect = _images(base_image)
+    mock_docker_client.images.pull.side_effect = docker.errors.NotFound('')
 
     image_name = build_runtime_image(
         base_image, mock_docker_client, update_source_code=True
     )
-    assert image_name == f'{RUNTIME_IMAGE_PREFIX}_dev:{OD_VERSION}_image_debian_tag_11'
+    assert image_name == runtime_image
 
     mock_build_sandbox_image.assert_called_once_with(
-        f'{RUNTIME_IMAGE_PREFIX}:{OD_VERSION}_image_debian_tag_11',
-        f'{RUNTIME_IMAGE_PREFIX}_dev:{OD_VERSION}_image_debian_tag_11',
+        base_image,
+        runtime_image,
         mock_docker_client,
         skip_init=True,
+        install_dependencies=True,
     )
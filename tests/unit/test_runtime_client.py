@@ -0,0 +1,146 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from opendevin.events.action import CmdRunAction, FileReadAction, FileWriteAction
+from opendevin.events.serialization import event_to_dict
+from opendevin.runtime.client import client as client_module
+from opendevin.runtime.client.client import RuntimeClient, create_app
+
+# the shells log in with `su`, which needs root
+pytestmark = pytest.mark.skipif(
+    os.geteuid() != 0, reason='the runtime client runs as root in the sandbox'
+)
+
+
+class NoBrowser:
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def make_client(tmp_path, monkeypatch):
+    # the client starts a browser, which these tests don't use
+    monkeypatch.setattr(client_module, 'BrowserEnv', NoBrowser)
+    clients = []
+
+    def make(shell_pool_size: int = 0) -> RuntimeClient:
+        client = RuntimeClient(
+            [],
+            work_dir=str(tmp_path),
+            username='root',
+            user_id=0,
+            shell_pool_size=shell_pool_size,
+        )
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+@asynccontextmanager
+async def serve(make_client):
+    """Runs the action execution API, with the client made by make_client."""
+    app = create_app(make_client)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url='http://test'
+        ) as http:
+            yield http
+
+
+def execute(http: httpx.AsyncClient, action):
+    action.timeout = 30
+    return http.post('/execute_action', json={'action': event_to_dict(action)})
+
+
+@pytest.mark.asyncio
+async def test_alive_while_command_runs(make_client):
+    async with serve(make_client) as api:
+        command = asyncio.create_task(
+            execute(api, CmdRunAction('sleep 2 && echo done'))
+        )
+        await asyncio.sleep(0.5)
+
+        started = time.monotonic()
+        response = await api.get('/alive')
+        assert response.json() == {'status': 'ok'}
+        assert time.monotonic() - started < 1
+        assert not command.done()
+
+        response = await command
+        assert response.json()['content'].startswith('done')
+
+
+@pytest.mark.asyncio
+async def test_read_does_not_wait_for_command(make_client, tmp_path):
+    (tmp_path / 'notes.txt').write_text('hello\n')
+    async with serve(make_client) as api:
+        command = asyncio.create_task(execute(api, CmdRunAction('sleep 2')))
+        await asyncio.sleep(0.5)
+
+        started = time.monotonic()
+        response = await execute(api, FileReadAction(str(tmp_path / 'notes.txt')))
+        assert response.json()['content'] == 'hello\n'
+        assert time.monotonic() - started < 1
+        assert not command.done()
+        await command
+
+
+@pytest.mark.asyncio
+async def test_writes_to_a_path_are_serialized(make_client, tmp_path):
+    client = make_client()
+    path = str(tmp_path / 'out.txt')
+
+    async with client.path_lock(path):
+        write = asyncio.create_task(client.write(FileWriteAction(path, 'second')))
+        # a write to another path doesn't wait
+        await client.write(FileWriteAction(str(tmp_path / 'other.txt'), 'other'))
+        await asyncio.sleep(0.1)
+        # the write waits for the action holding the path
+        assert not write.done()
+        with open(path, 'w') as f:
+            f.write('first\n')
+    await write
+
+    assert open(path).read() == 'second\n'
+    assert open(tmp_path / 'other.txt').read() == 'other\n'
+
+
+def command(command: str, background: bool = False) -> CmdRunAction:
+    action = CmdRunAction(command, background=background)
+    action.timeout = 30
+    return action
+
+
+@pytest.mark.asyncio
+async def test_background_command_runs_in_pool(make_client, tmp_path):
+    client = make_client(shell_pool_size=1)
+    await client.run(command('export GREETING=hello && mkdir sub && cd sub'))
+
+    # the pool shell gets the environment and working directory of the main one
+    obs = await client.run(command('echo $GREETING && pwd', background=True))
+    assert obs.exit_code == 0
+    assert obs.content.split('\r\n')[:2] == ['hello', str(tmp_path / 'sub')]
+
+    # and runs while the main shell is busy
+    main = asyncio.create_task(client.run(command('sleep 2')))
+    await asyncio.sleep(0.5)
+    started = time.monotonic()
+    obs = await client.run(command('echo pooled', background=True))
+    assert obs.content.startswith('pooled')
+    assert time.monotonic() - started < 1
+    assert not main.done()
+    await main
+
+    assert client.shell_pool is not None
+    stats = client.shell_pool.stats()
+    assert stats['dispatched'] == 2
+    assert stats['replaced'] == 0
@@ -0,0 +1,206 @@
+import asyncio
+import base64
+import json
+import pickle
+
+import pytest
+
+from opendevin.controller.state.checkpoint import StateCheckpointer
+from opendevin.controller.state.state import State, TrafficControlState
+from opendevin.core.schema import AgentState
+from opendevin.storage import InMemoryFileStore, LocalFileStore
+from opendevin.storage.files import FileStore
+
+
+def make_state() -> State:
+    state = State(iteration=3, max_iterations=50, inputs={'task': 'fix the bug'})
+    state.agent_state = AgentState.RUNNING
+    state.traffic_control_state = TrafficControlState.THROTTLING
+    state.root_task.add_subtask('', 'write the code', [{'goal': 'write the tests'}])
+    state.root_task.set_subtask_state('0', 'in_progress')
+    state.metrics.add_cost(0.5)
+    state.metrics.add_cache_hit(0.25)
+    state.history.start_id = 2
+    return state
+
+
+def test_checkpoint_round_trip():
+    file_store = InMemoryFileStore()
+    state = make_state()
+    StateCheckpointer('sid', file_store).save(state)
+
+    restored, watermark = StateCheckpointer('sid', file_store).load()
+    assert watermark == -1
+    assert restored.iteration == 3
+    assert restored.max_iterations == 50
+    assert restored.inputs == {'task': 'fix the bug'}
+    assert restored.agent_state == AgentState.RUNNING
+    assert restored.traffic_control_state == TrafficControlState.THROTTLING
+    assert restored.root_task.to_dict() == state.root_task.to_dict()
+    assert restored.metrics.get() == state.metrics.get()
+    assert restored.history.start_id == 2
+    # neither base64 nor pickle
+    checkpoint = json.loads(file_store.read('sessions/sid/state/checkpoint.json'))
+    assert checkpoint['version'] == 1
+
+
+def read(file_store: FileStore, path: str) -> str:
+    try:
+        return file_store.read(path)
+    except FileNotFoundError:
+        return ''
+
+
+def test_checkpoint_deltas(tmp_path):
+    # deltas are appended in stores that append natively
+    file_store = LocalFileStore(str(tmp_path))
+    checkpointer = StateCheckpointer('sid', file_store, delta_limit=10)
+    state = make_state()
+    checkpointer.save(state)
+    delta_sizes = []
+    for i in range(9):
+        state.iteration += 1
+        state.history.end_id = 100 + i
+        state.metrics.add_cost(0.01)
+        before = len(read(file_store, checkpointer.deltas_path))
+        checkpointer.save(state)
+        delta_sizes.append(len(read(file_store, checkpointer.deltas_path)) - before)
+    # a delta holds what changed, not the whole state: its size doesn't grow
+    assert max(delta_sizes) - min(delta_sizes) < 20
+    assert checkpointer.full_saves == 1
+    assert checkpointer.delta_saves == 9
+
+    # nothing changed: nothing is written
+    checkpointer.save(state)
+    assert checkpointer.delta_saves == 9
+
+    restored, watermark = StateCheckpointer('sid', file_store).load()
+    assert watermark == 108
+    assert restored.iteration == 12
+    assert restored.metrics.costs == state.metrics.costs
+    assert restored.root_task.to_dict() == state.root_task.to_dict()
+
+    # the deltas are folded into a new checkpoint
+    state.iteration += 1
+    checkpointer.save(state)
+    state.iteration += 1
+    checkpointer.save(state)
+    assert checkpointer.full_saves == 2
+    assert read(file_store, checkpointer.deltas_path) == ''
+    state.iteration += 1
+    checkpointer.save(state)
+    assert len(read(file_store, checkpointer.deltas_path).splitlines()) == 1
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.iteration == 15
+
+
+def test_checkpoint_ignores_stale_and_partial_deltas(tmp_path):
+    file_store = LocalFileStore(str(tmp_path))
+    checkpointer = StateCheckpointer('sid', file_store)
+    state = make_state()
+    checkpointer.save(state)
+    state.iteration = 10
+    checkpointer.save(state)
+    deltas = read(file_store, checkpointer.deltas_path)
+
+    # a crash in the middle of an append
+    state.iteration = 11
+    checkpointer.save(state)
+    file_store.write(
+        checkpointer.deltas_path,
+        deltas + read(file_store, checkpointer.deltas_path)[len(deltas) : -5],
+    )
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.iteration == 10
+
+    # a crash before the deltas of the previous checkpoint were dropped
+    state.iteration = 12
+    checkpointer.save(state, full=True)
+    file_store.write(checkpointer.deltas_path, deltas)
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.iteration == 12
+
+
+def test_checkpoint_without_native_append():
+    file_store = InMemoryFileStore()
+    checkpointer = StateCheckpointer('sid', file_store)
+    state = make_state()
+    checkpointer.save(state)
+    checkpoint = file_store.files[checkpointer.checkpoint_path]
+    delta_sizes = []
+    for i in range(5):
+        state.iteration += 1
+        state.metrics.add_cost(0.01)
+        checkpointer.save(state)
+        delta_sizes.append(
+            len(file_store.files[f'{checkpointer.deltas_dir}{i:06d}.json'])
+        )
+    # an append would rewrite the deltas: each delta is a file of its own, and
+    # neither it nor the checkpoint grows with the costs
+    assert checkpointer.delta_saves == 5
+    assert checkpointer.full_saves == 1
+    assert max(delta_sizes) - min(delta_sizes) < 5
+    assert file_store.files[checkpointer.checkpoint_path] == checkpoint
+    assert checkpointer.deltas_path not in file_store.files
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.iteration == 8
+    assert restored.metrics.costs == state.metrics.costs
+
+    # nothing changed: nothing is written
+    checkpointer.save(state)
+    assert checkpointer.delta_saves == 5
+
+    # the delta files are dropped with the next checkpoint
+    checkpointer.save(state, full=True)
+    assert file_store.list(checkpointer.deltas_dir) == []
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.metrics.costs == state.metrics.costs
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_asave(tmp_path):
+    file_store = LocalFileStore(str(tmp_path))
+    checkpointer = StateCheckpointer('sid', file_store)
+    state = make_state()
+    # the saves are written in order, even when they overlap
+    saves = []
+    for i in range(5):
+        state.iteration = i
+        saves.append(asyncio.create_task(checkpointer.asave(state)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*saves)
+    await state.asave_to_session('sid', file_store)
+
+    restored, _ = StateCheckpointer('sid', file_store).load()
+    assert restored.iteration == 4
+    assert checkpointer.full_saves == 1
+
+
+def test_checkpoint_non_json_values():
+    file_store = InMemoryFileStore()
+    state = make_state()
+    state.inputs = {'task': 'fix the bug', 'files': {'a.py'}, 1: 'one'}
+    state.outputs = {'result': object}
+    state.save_to_session('sid', file_store)
+    restored = State.restore_from_session('sid', file_store)
+    assert restored.inputs == {'task': 'fix the bug', 'files': "{'a.py'}", '1': 'one'}
+    assert restored.outputs == {'result': repr(object)}
+
+
+def test_restore_from_session():
+    file_store = InMemoryFileStore()
+    make_state().save_to_session('sid', file_store)
+    restored = State.restore_from_session('sid', file_store)
+    assert restored.resume_state == AgentState.RUNNING
+    assert restored.agent_state == AgentState.LOADING
+
+    # sessions saved as a pickle
+    state = make_state()
+    state.agent_state = AgentState.PAUSED
+    file_store.write(
+        'sessions/old/agent_state.pkl',
+        base64.b64encode(pickle.dumps(state)).decode('utf-8'),
+    )
+    restored = State.restore_from_session('old', file_store)
+    assert restored.resume_state == AgentState.PAUSED
+    assert restored.iteration == 3
@@ -1,10 +1,18 @@
 import os
 import shutil
+import time
 
 import pytest
+import urllib3
+from minio.datatypes import Object
+from minio.error import S3Error
 
+from opendevin.events import EventSource, EventStream
+from opendevin.events.observation import NullObservation
 from opendevin.storage.local import LocalFileStore
 from opendevin.storage.memory import InMemoryFileStore
+from opendevin.storage.s3 import S3FileStore
+from opendevin.storage.write_behind import WriteBehindFileStore
 
 
 @pytest.fixture
@@ -63,3 +71,229 @@ def test_deep_list(setup_env):
         store.delete('foo/bar/baz.txt')
         store.delete('foo/bar/qux.txt')
         store.delete('foo/bar/quux.txt')
+
+
+def test_append_and_read_range(setup_env):
+    for store in [LocalFileStore('./_test_files_tmp'), InMemoryFileStore()]:
+        store.append('log/foo.txt', 'Hello, ')
+        store.append('log/foo.txt', 'wörld!\n')
+        assert store.read('log/foo.txt') == 'Hello, wörld!\n'
+        assert store.read_range('log/foo.txt', 7) == 'wörld!\n'
+        assert store.read_range('log/foo.txt', 0, 5) == 'Hello'
+        store.delete('log/foo.txt')
+
+
+def test_write_many_and_read_many(setup_env):
+    for store in [LocalFileStore('./_test_files_tmp'), InMemoryFileStore()]:
+        store.write_many({'many/a.txt': 'a', 'many/b.txt': 'b'})
+        assert store.read_many(['many/a.txt', 'many/b.txt', 'many/c.txt']) == {
+            'many/a.txt': 'a',
+            'many/b.txt': 'b',
+        }
+        store.delete('many/a.txt')
+        store.delete('many/b.txt')
+
+
+class CountingFileStore(InMemoryFileStore):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+
+    def write_many(self, files):
+        self.batches.append(dict(files))
+        super().write_many(files)
+
+
+def test_write_behind_buffers_writes(setup_env):
+    backing = CountingFileStore()
+    store = WriteBehindFileStore(backing, flush_interval=60)
+    try:
+        store.write('a.txt', 'one')
+        store.write('a.txt', 'two')
+        store.append('log.txt', 'x')
+        store.append('log.txt', 'y')
+        # nothing reached the store yet
+        assert backing.batches == []
+        with pytest.raises(FileNotFoundError):
+            backing.read('a.txt')
+        # reads see the buffered writes
+        assert store.read('a.txt') == 'two'
+        assert backing.batches == [{'a.txt': 'two'}]
+        assert backing.read('log.txt') == 'xy'
+        store.append('log.txt', 'z')
+        store.flush()
+        assert backing.read('log.txt') == 'xyz'
+        assert store.stats()['flushes'] == 2
+    finally:
+        store.close()
+
+
+def test_write_behind_flushes_in_background(setup_env):
+    backing = CountingFileStore()
+    store = WriteBehindFileStore(backing, max_pending_bytes=10, flush_interval=0.05)
+    try:
+        # by interval
+        store.write('a.txt', 'a')
+        deadline = time.time() + 5
+        while not backing.batches and time.time() < deadline:
+            time.sleep(0.01)
+        assert backing.batches == [{'a.txt': 'a'}]
+        # by size
+        store.flush_interval = 60
+        store.write('b.txt', 'b' * 20)
+        deadline = time.time() + 5
+        while len(backing.batches) < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        assert backing.batches[1] == {'b.txt': 'b' * 20}
+    finally:
+        store.close()
+
+
+def test_write_behind_keeps_failed_writes(setup_env):
+    class FailingFileStore(InMemoryFileStore):
+        fail = True
+
+        def write_many(self, files):
+            if self.fail:
+                raise OSError('unavailable')
+            super().write_many(files)
+
+    backing = FailingFileStore()
+    store = WriteBehindFileStore(backing, flush_interval=60)
+    try:
+        store.write('a.txt', 'one')
+        with pytest.raises(OSError):
+            store.flush()
+        store.write('b.txt', 'two')
+        backing.fail = False
+        store.flush()
+        assert backing.read_many(['a.txt', 'b.txt']) == {'a.txt': 'one', 'b.txt': 'two'}
+    finally:
+        store.close()
+
+
+@pytest.mark.asyncio
+async def test_async_file_store_api(setup_env):
+    backing = LocalFileStore('./_test_files_tmp')
+    store = WriteBehindFileStore(backing, flush_interval=60)
+    try:
+        await store.awrite('async/a.txt', 'a')
+        await store.awrite_many({'async/b.txt': 'b'})
+        # the durability barrier
+        await store.aflush()
+        assert backing.read_many(['async/a.txt', 'async/b.txt']) == {
+            'async/a.txt': 'a',
+            'async/b.txt': 'b',
+        }
+        assert await store.aread('async/a.txt') == 'a'
+        assert sorted(await store.alist('async')) == ['async/a.txt', 'async/b.txt']
+        await store.adelete('async/a.txt')
+        assert await store.aread_many(['async/a.txt', 'async/b.txt']) == {
+            'async/b.txt': 'b'
+        }
+    finally:
+        store.close()
+
+
+class FakeMinio:
+    """A stand-in for a MinIO server, with the parts of the client API S3FileStore uses."""
+
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+        self.gets = 0
+        self.lists = 0
+
+    class Response:
+        def __init__(self, data: bytes):
+            self.data = data
+
+        def close(self):
+            pass
+
+        def release_conn(self):
+            pass
+
+    def put_object(self, bucket, name, data, length):
+        self.objects[name] = data.read(length)
+
+    def get_object(self, bucket, name, offset=0, length=0):
+        self.gets += 1
+        if name not in self.objects:
+            raise S3Error(
+                urllib3.HTTPResponse(status=404), 'NoSuchKey', '', name, '', ''
+            )
+        data = self.objects[name][offset:]
+        return self.Response(data[:length] if length else data)
+
+    def list_objects(self, bucket, prefix='', recursive=False, start_after=None):
+        # the keys are listed in lexicographic order, a page at a time
+        self.lists += 1
+        seen = set()
+        for name in sorted(self.objects):
+            if not name.startswith(prefix):
+                continue
+            if not recursive and '/' in name[len(prefix) :]:
+                name = prefix + name[len(prefix) :].split('/')[0] + '/'
+            if (start_after is not None and name <= start_after) or name in seen:
+                continue
+            seen.add(name)
+            yield Object(bucket, name)
+
+    def remove_object(self, bucket, name):
+        self.objects.pop(name, None)
+
+    def remove_objects(self, bucket, delete_objects):
+        for delete_object in delete_objects:
+            self.objects.pop(delete_object.name, None)
+        return iter([])
+
+
+def test_s3_fileops():
+    store = S3FileStore(client=FakeMinio(), bucket='test')
+    store.write('foo/bar.txt', 'Hello, wörld!')
+    assert store.read('foo/bar.txt') == 'Hello, wörld!'
+    assert store.read_range('foo/bar.txt', 7) == 'wörld!'
+    assert store.read_range('foo/bar.txt', 0, 5) == 'Hello'
+    assert store.read_range('foo/bar.txt', 5, 5) == ''
+    with pytest.raises(FileNotFoundError):
+        store.read('foo/baz.txt')
+    store.write('foo/baz/qux.txt', 'qux')
+    assert store.list('foo') == ['foo/bar.txt', 'foo/baz/']
+    assert store.list('') == ['foo/']
+    store.delete('foo')
+    assert store.list('foo') == []
+
+
+def test_s3_needs_a_bucket(monkeypatch):
+    monkeypatch.delenv('AWS_S3_BUCKET', raising=False)
+    with pytest.raises(ValueError):
+        S3FileStore(client=FakeMinio())
+
+
+def test_s3_list_pages():
+    store = S3FileStore(client=FakeMinio(), bucket='test')
+    store.write_many({f'items/{i:03}.txt': str(i) for i in range(25)})
+    keys = []
+    page = store.list_page('items', limit=10)
+    while page:
+        keys.extend(page)
+        page = store.list_page('items', start_after=page[-1], limit=10)
+    assert keys == [f'items/{i:03}.txt' for i in range(25)]
+    assert store.read_many(['items/000.txt', 'items/999.txt']) == {'items/000.txt': '0'}
+
+
+def test_s3_event_stream_restore():
+    client = FakeMinio()
+    store = S3FileStore(client=client, bucket='test')
+    event_stream = EventStream('abc', store)
+    for i in range(300):
+        event_stream.add_event(NullObservation(f'obs{i}'), EventSource.AGENT)
+
+    client.lists = 0
+    client.gets = 0
+    restored = EventStream('abc', store)
+    events = list(restored.get_events())
+    assert [event.content for event in events] == [f'obs{i}' for i in range(300)]
+    # one listing, a read of the (missing) segmented log manifest, and one per event
+    assert client.lists == 1
+    assert client.gets == 301
@@ -0,0 +1,86 @@
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from opendevin.core.config import AppConfig
+from opendevin.runtime.client import warm_pool
+from opendevin.runtime.client.warm_pool import WarmContainerPool
+
+
+@pytest.fixture
+def containers():
+    """The containers started by the pool, with whether each one is alive."""
+    started: dict[int, MagicMock] = {}
+
+    def start(docker_client, config, image, name, port, *args, **kwargs):
+        container = MagicMock()
+        container.name = name
+        container.alive = True
+        started[port] = container
+        return container
+
+    ports = iter(range(10000, 10100))
+    with patch.object(
+        warm_pool, 'start_runtime_container', side_effect=start
+    ), patch.object(
+        warm_pool, 'build_runtime_image', return_value='runtime:abc'
+    ) as build, patch.object(
+        warm_pool, 'find_available_tcp_port', side_effect=lambda: next(ports)
+    ), patch.object(
+        warm_pool, 'is_alive', side_effect=lambda port: started[port].alive
+    ), patch.object(warm_pool.docker, 'from_env'):
+        yield started, build
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'Timed out'
+        time.sleep(0.01)
+
+
+def test_acquire_and_refill(containers):
+    started, build = containers
+    pool = WarmContainerPool(2, AppConfig(), 'base:latest')
+    try:
+        wait_for(lambda: pool.stats()['ready'] == 2)
+
+        warm = pool.acquire()
+        assert warm is not None
+        assert warm.image == 'runtime:abc'
+        # a new container takes the place of the one handed out
+        wait_for(lambda: pool.stats()['ready'] == 2)
+        assert len(started) == 3
+        assert build.call_count == 1
+
+        # a container that died meanwhile is discarded
+        for container in started.values():
+            if container is not warm.container:
+                container.alive = False
+        another = pool.acquire()
+        assert another is not None
+        assert another.container.alive
+        assert pool.stats()['hits'] == 2
+    finally:
+        pool.close()
+
+    # the containers that weren't handed out are removed
+    assert not warm.container.remove.called
+    assert not another.container.remove.called
+    assert all(
+        container.remove.called
+        for container in started.values()
+        if container not in (warm.container, another.container)
+    )
+
+
+def test_acquire_without_containers(containers):
+    started, build = containers
+    build.side_effect = RuntimeError('build failed')
+    pool = WarmContainerPool(1, AppConfig(), 'base:latest')
+    try:
+        assert pool.acquire(timeout=5) is None
+        assert pool.stats()['misses'] == 1
+    finally:
+        pool.close()
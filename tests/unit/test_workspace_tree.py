@@ -0,0 +1,74 @@
+import os
+import time
+
+from opendevin.server.session.workspace import WorkspaceTree, get_etag
+
+
+def age(path: str) -> None:
+    """Sets the mtime of path in the past, out of the racy window."""
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+
+def make_workspace(root) -> None:
+    for path in ['src/app.py', 'src/lib/util.py', 'README.md', 'node_modules/x.js']:
+        os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+        with open(os.path.join(root, path), 'w') as f:
+            f.write('')
+    for path in ['src/lib', 'src', 'node_modules', '']:
+        age(os.path.join(root, path))
+
+
+def test_list_paths(tmp_path):
+    make_workspace(tmp_path)
+    tree = WorkspaceTree(str(tmp_path))
+    # without .gitignore, the default excludes apply
+    assert tree.list_paths('/') == ['/src/', '/README.md']
+    assert tree.list_paths('/src/') == ['/src/lib/', '/src/app.py']
+    assert tree.list_paths('/', depth=3) == [
+        '/src/',
+        '/src/lib/',
+        '/src/lib/util.py',
+        '/src/app.py',
+        '/README.md',
+    ]
+    assert tree.list_paths('/missing') is None
+    assert tree.list_paths('/../') is None
+
+
+def test_gitignore(tmp_path):
+    make_workspace(tmp_path)
+    with open(tmp_path / '.gitignore', 'w') as f:
+        f.write('*.md\n')
+    with open(tmp_path / 'src' / '.gitignore', 'w') as f:
+        f.write('lib/\n')
+    age(str(tmp_path))
+    age(str(tmp_path / 'src'))
+    tree = WorkspaceTree(str(tmp_path))
+    assert tree.list_paths('/') == ['/node_modules/', '/src/', '/.gitignore']
+    assert tree.list_paths('/src') == ['/src/.gitignore', '/src/app.py']
+
+    # an edited .gitignore applies to the cached listings
+    with open(tmp_path / 'src' / '.gitignore', 'w') as f:
+        f.write('app.py\n')
+    assert tree.list_paths('/src') == ['/src/lib/', '/src/.gitignore']
+
+
+def test_cache_invalidation(tmp_path):
+    make_workspace(tmp_path)
+    tree = WorkspaceTree(str(tmp_path))
+    paths = tree.list_paths('/')
+    assert tree.list_paths('/') == paths
+    assert tree.stats()['hits'] == 1
+    assert tree.stats()['misses'] == 1
+
+    # a new file changes the mtime of its directory
+    with open(tmp_path / 'CHANGELOG.md', 'w') as f:
+        f.write('')
+    new_paths = tree.list_paths('/')
+    assert new_paths == ['/src/', '/CHANGELOG.md', '/README.md']
+    assert get_etag(new_paths) != get_etag(paths)
+
+    # a directory changed within the racy window is listed again
+    assert tree.list_paths('/') == new_paths
+    assert tree.stats()['misses'] == 3